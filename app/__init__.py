@@ -10,6 +10,8 @@ from flask_wtf.csrf import CSRFProtect
 import json
 from config import Config
 from app.utilities.jinja_filters import format_sales_margin
+from app.utilities.db_routing import RoutingSession, replica_binds, init_db_routing, check_replica_schemas
+from app.utilities.db_pool import configure_pools
 
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -29,7 +31,7 @@ class CustomJSONEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})     # reads of GET requests may go to read replicas
 migration = Migrate()
 csrf = CSRFProtect()  # Initialize CSRFProtect object
 
@@ -40,19 +42,43 @@ login_manager.login_message = "Please identify yourself."
 def create_app(config_class=Config):
             
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
     csrf.init_app(app)
     app.json_encoder = CustomJSONEncoder
     app.add_template_filter(format_sales_margin)
+    app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}),
+                                      **replica_binds(app.config.get('SQLALCHEMY_REPLICA_URIS') or [])}
+    configure_pools(app.config)
     db.init_app(app)
+    init_db_routing(app)
+    with app.app_context():
+        from app.utilities.sqlite_profile import init_sqlite_profile
+        for engine in db.engines.values():
+            init_sqlite_profile(app, engine)
     migration.init_app(app, db)
 
     login_manager.init_app(app)
+
+    from app.utilities.token_utilities import validated_token_cache, token_usage_recorder
+    validated_token_cache.configure(max_entries=app.config.get('TOKEN_CACHE_MAX_ENTRIES', 256),
+                                    ttl_seconds=app.config.get('TOKEN_CACHE_TTL_SECONDS', 60))
+    token_usage_recorder.flush_interval_seconds = app.config.get('TOKEN_USAGE_FLUSH_SECONDS', 30)
     
+    from app.utilities.user_cache import user_cache
+    user_cache.init_app(app)
+
+    from app.utilities.catalog_cache import catalog_cache
+    catalog_cache.init_app(app)
+
+    from app.utilities.purchase_queue import purchase_queue
+    purchase_queue.init_app(app)
+
+    from app.utilities.pagination import row_count_cache
+    row_count_cache.configure(ttl_seconds=app.config.get('PAGINATION_COUNT_TTL_SECONDS', 60))
+
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User  # Import here to avoid circular dependencies
-        return User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
 
     # import blueprints
     from app.main import bp_main
@@ -69,9 +95,17 @@ def create_app(config_class=Config):
     app.register_blueprint(bp_api)      # API endpoints
 
     with app.app_context():
-        db.create_all()
+        db.create_all(bind_key=None)    # the primary; replicas get the schema by replication
+        from app.utilities.catalog_search import catalog_search
+        catalog_search.init_app(app)    # search index of the catalog, after the tables exist
+        from app.utilities.catalog_facets import catalog_facets
+        catalog_facets.init_app(app)    # facet counts of the catalog
+        check_replica_schemas(app, db.engines)    # read replicas without the complete schema are not used
 
     csrf.exempt(bp_api)                 # API blueprint will be exempt from CSRF protection, it has no forms with user interaction.
+
+    from app.utilities.scheduler import init_scheduler
+    init_scheduler(app)                 # background jobs, e.g. release of expired stock reservations
   
     if not os.path.exists('logs'):
         os.mkdir('logs')
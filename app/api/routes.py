@@ -1,14 +1,32 @@
-from flask import jsonify, request, Response, current_app
+from flask import jsonify, request, Response, current_app, stream_with_context
 import json
+import os
 import jwt
+from itsdangerous import URLSafeSerializer, BadSignature
 from datetime import datetime, timedelta, timezone # UTC
 
-from app.models import SalesItem, APIToken, UserRole, User, Purchases, SyncHistory, ConnectionType
+from sqlalchemy import select, func
+from app.models import SalesItem, APIToken, UserRole, User, Purchases, SyncHistory, ConnectionType, StockReservation
 from app import db
 from . import bp_api
 from app.decorators import token_required
 from app import CustomJSONEncoder
-from app.utilities.sync_utilities import set_single_value, delete_items, update_items, OperationResult
+from app.utilities.sync_utilities import delete_items, update_items, OperationResult, ColumnarData, acknowledge_purchases, extend_id_ranges
+from app.utilities.catalog_cache import catalog_cache
+from app.utilities.catalog_facets import catalog_facets
+from app.utilities.catalog_search import catalog_search
+from app.utilities.db_pool import pool_metrics
+from app.utilities.db_routing import use_primary
+from app.utilities.token_utilities import validated_token_cache
+from app.utilities.user_cache import user_cache
+from app.utilities.json_stream import iter_json_object, ARRAY_START, ARRAY_ITEM, ARRAY_END
+from app.utilities.http_compression import decompress_request, compress_response, InvalidContentEncoding, \
+    DecompressedBodyTooLarge
+
+try:
+    import msgpack              # optional: MessagePack payloads for /api/bulk_update
+except ImportError:
+    msgpack = None
 
 # constants for dictionary keys used in warehouse sync.
 # the dictionary keys identify sub-datasets, each of which needs to be treated differently
@@ -17,21 +35,151 @@ NOT_FOR_SALE_KEY = 'not_for_sale'
 OUT_OF_STOCK_KEY = 'out_of_stock'
 STOCK_UPDATES_KEY = 'stock_updates'
 
+# name of the remote system, used in SyncHistory
+WAREHOUSE_REMOTE_NAME = "Warehouse"
+
+# response formats of the purchase export
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# request formats of the bulk update, besides JSON
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# sub-dataset names used in log messages
+DATASET_DESCRIPTIONS = {DELETED_KEY: "Deleted items",
+                        NOT_FOR_SALE_KEY: "Not-for-sale items",
+                        OUT_OF_STOCK_KEY: "Out-of-stock items",
+                        STOCK_UPDATES_KEY: "Stock item update",
+                        }
+
+# mapping of warehouse item fields to SalesItem fields, used for 'stock_updates'
+STOCK_UPDATES_FIELD_MAPPING = {'code': 'code',
+                               'name': 'name',
+                               'description': 'description',
+                               'vendor.name': 'vendor_name',
+                               'price_per_unit': 'price_per_unit',
+                               'units_in_stock': 'units_in_stock',
+                               }
+
+
+# compressed request bodies (Content-Encoding) are decoded transparently, responses are compressed as negotiated
+bp_api.before_request(decompress_request)
+bp_api.after_request(compress_response)
+
+
+@bp_api.errorhandler(InvalidContentEncoding)
+@bp_api.errorhandler(DecompressedBodyTooLarge)
+def compressed_body_error(e):
+    """
+    Errors detected while decompressing a request body. Batches of a streamed bulk update applied before the
+    error remain applied.
+    """
+    current_app.logger.error(f"Compressed request body rejected: {e.description}")
+    return jsonify({'error': e.description}), e.code
+
 
 @bp_api.route('/purchases/', methods=['GET'])
 @token_required
+@use_primary()      # the pending purchases must be read where they are acknowledged
 def get_available_items():
     """
     API endpoint that returns data on all purchases made since the previous sync or since store reset.
 
+    The export covers the purchases not yet delivered (flagged requires_sync), up to the newest purchase at the
+    start of the request; purchases made while the export runs are left for the next sync. Delivered purchases
+    are acknowledged by id (see acknowledge_purchases), so a purchase that commits after purchases with higher
+    ids were delivered is not skipped, it is delivered by the next export.
+
+    The response is streamed: purchases are read from the database in batches of PURCHASES_EXPORT_BATCH_SIZE
+    and serialized incrementally, so memory use does not depend on the number of pending purchases.
+    The format is a JSON array by default, or newline-delimited JSON (one purchase per line) if the client
+    sends 'Accept: application/x-ndjson'.
+
+    Paged mode: with the 'limit' query parameter, at most 'limit' purchases are returned per request, and the
+    response carries an opaque continuation token in the X-Next-Cursor header (X-Has-More tells whether more
+    purchases are pending). Passing the token back as 'cursor' acknowledges the purchases of the page it came
+    with and fetches the next page. A failed page can be retried with the same token. The last page
+    (X-Has-More: false) is acknowledged when it is sent, like the full export; its token can be passed later
+    to fetch the purchases made in the meantime.
     """
     current_app.extensions['csrf'].exempt(get_available_items)      # CSRF exemption
     current_app.logger.info("Purchase data requested.")
 
     connection_start_time = datetime.now(timezone.utc)
+    use_ndjson = request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    mimetype = NDJSON_MIMETYPE if use_ndjson else JSON_MIMETYPE
+
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return Response(stream_with_context(_stream_purchases(connection_start_time, use_ndjson)), mimetype=mimetype)
+
+    max_page_size = current_app.config.get('PURCHASES_EXPORT_MAX_PAGE_SIZE', 5000)
+    limit = request.args.get('limit', type=int) if 'limit' in request.args else max_page_size
+    if limit is None or limit < 1:
+        return jsonify({'error': 'Invalid limit'}), 400
+    limit = min(limit, max_page_size)
+
+    continuation_token = request.args.get('cursor')
+    if continuation_token:
+        try:
+            delivered_id_ranges = _decode_id_ranges(_continuation_serializer().loads(continuation_token)['ack'])
+        except (BadSignature, KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        # presenting the token confirms that the previous page was received
+        acknowledge_purchases(delivered_id_ranges)
+
+    purchases = Purchases.query.filter(Purchases.requires_sync == True) \
+                               .order_by(Purchases.id).limit(limit + 1).all()
+    has_more = len(purchases) > limit
+    purchases = purchases[:limit]
+
+    response = Response(''.join(_encode_purchases(purchases, use_ndjson)), mimetype=mimetype)
+    if purchases:
+        page_id_ranges = []
+        for purchase in purchases:
+            extend_id_ranges(page_id_ranges, purchase.id)
+        response.headers['X-Next-Cursor'] = _continuation_serializer().dumps({'ack': page_id_ranges})
+        if not has_more:
+            acknowledge_purchases(page_id_ranges)
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+
+    sync_record = SyncHistory(remote_name=WAREHOUSE_REMOTE_NAME,
+                              timestamp_start=connection_start_time,
+                              timestamp_end=datetime.now(timezone.utc),
+                              connection_type=ConnectionType.SYNC,
+                              updates_received=0,
+                              updates_sent=len(purchases))
+    db.session.add(sync_record)
+    db.session.commit()
+
+    return response
+
+
+def _continuation_serializer():
+    """
+    Signs and verifies the continuation tokens of the paged purchase export, so that they are opaque to clients.
+    """
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='purchase-export-cursor')
+
+
+def _decode_id_ranges(id_ranges):
+    """
+    Validates the purchase id ranges of a continuation token, [[first id, last id], ...].
 
-    purchases = Purchases.query.filter_by(requires_sync=True).all()
-    purchase_data = [{
+    Raises:
+        ValueError: if the ranges are malformed.
+    """
+    if not isinstance(id_ranges, list) or not all(isinstance(id_range, list) and len(id_range) == 2
+                                                  and all(type(purchase_id) is int for purchase_id in id_range)
+                                                  for id_range in id_ranges):
+        raise ValueError("Invalid purchase id ranges")
+    return id_ranges
+
+
+def _purchase_to_dict(purchase):
+    """
+    Purchase data in the format expected by the warehouse.
+    """
+    return {
         'purchase_code': purchase.purchase_code,
         'code': purchase.salesitem_code,
         'name': purchase.salesitem_name,
@@ -41,24 +189,80 @@ def get_available_items():
         # 'sales_margin': purchase.salesitem_sales_margin,
         'total_price': purchase.total_price,
         'purchase_time': purchase.purchase_time
-    } for purchase in purchases]
-    
-    response_json = json.dumps(purchase_data, cls=CustomJSONEncoder)
+    }
+
+
+def _encode_purchases(purchases, use_ndjson):
+    """
+    Generator serializing purchases as a JSON array or as newline-delimited JSON,
+    producing one chunk of text per PURCHASES_EXPORT_BATCH_SIZE purchases.
+    """
+    batch_size = current_app.config.get('PURCHASES_EXPORT_BATCH_SIZE', 500)
+    encoder = CustomJSONEncoder()
+
+    def format_chunk(encoded_purchases, first_chunk):
+        if use_ndjson:
+            return ''.join(encoded + '\n' for encoded in encoded_purchases)
+        return ('' if first_chunk else ', ') + ', '.join(encoded_purchases)
+
+    first_chunk = True
+    chunk = []
+    if not use_ndjson:
+        yield '['
+    for purchase in purchases:
+        chunk.append(encoder.encode(_purchase_to_dict(purchase)))
+        if len(chunk) >= batch_size:
+            yield format_chunk(chunk, first_chunk)
+            first_chunk = False
+            chunk = []
+    if chunk:
+        yield format_chunk(chunk, first_chunk)
+    if not use_ndjson:
+        yield ']'
+
+
+def _stream_purchases(connection_start_time, use_ndjson):
+    """
+    Generator producing the full purchase export in chunks of PURCHASES_EXPORT_BATCH_SIZE purchases.
+    Once the last chunk has been produced, the purchases sent are acknowledged and the session is recorded.
+    If the client disconnects before that, nothing is acknowledged.
+    Runs after the view has returned, so it reads from the primary itself.
+    """
+    with use_primary():
+        yield from _stream_pending_purchases(connection_start_time, use_ndjson)
+
+
+def _stream_pending_purchases(connection_start_time, use_ndjson):
+    batch_size = current_app.config.get('PURCHASES_EXPORT_BATCH_SIZE', 500)
+    last_purchase_id = db.session.scalar(select(func.max(Purchases.id))) or 0
+    purchases = Purchases.query.filter(Purchases.requires_sync == True,
+                                       Purchases.id <= last_purchase_id).order_by(Purchases.id).yield_per(batch_size)
+
+    number_sent = 0
+    sent_id_ranges = []     # the ids sent, as ranges: constant memory unless many ids are missing
+
+    def counted(purchases):
+        nonlocal number_sent
+        for purchase in purchases:
+            number_sent += 1
+            extend_id_ranges(sent_id_ranges, purchase.id)
+            yield purchase
+
+    yield from _encode_purchases(counted(purchases), use_ndjson)
+
     connection_end_time = datetime.now(timezone.utc)
-    
-    set_single_value(model=Purchases, field_to_update='requires_sync', new_value=False)
 
-    sync_record = SyncHistory(remote_name="Warehouse",
+    acknowledge_purchases(sent_id_ranges)
+
+    sync_record = SyncHistory(remote_name=WAREHOUSE_REMOTE_NAME,
                               timestamp_start=connection_start_time,
                               timestamp_end=connection_end_time,
                               connection_type=ConnectionType.SYNC,
                               updates_received=0,
-                              updates_sent=len(purchase_data))
+                              updates_sent=number_sent)
     db.session.add(sync_record)
     db.session.commit()
 
-    return Response(response_json, mimetype='application/json')
-
 
 @bp_api.route('/items/delete_all', methods=['POST'])
 @token_required
@@ -75,12 +279,16 @@ def clear_stock():
 
     try:
         connection_start_time=datetime.now(timezone.utc)
+        db.session.query(StockReservation).delete()
         db.session.query(SalesItem).delete()
         db.session.query(Purchases).delete()
         db.session.commit()
+        catalog_cache.invalidate_all()
+        catalog_facets.invalidate()
+        catalog_search.invalidate()
         connection_end_time=datetime.now(timezone.utc)
         current_app.logger.info("Sales items and purchase history removed from the store.")
-        sync_record = SyncHistory(remote_name="Warehouse",
+        sync_record = SyncHistory(remote_name=WAREHOUSE_REMOTE_NAME,
                             timestamp_start=connection_start_time,
                             timestamp_end=connection_end_time,
                             connection_type=ConnectionType.RESET)
@@ -105,16 +313,27 @@ def bulk_update():
     'not_for_sale' - identifies items flagged as not for sale and thus to be removed from the store
     'out_of_stock' - identifies items flagged as out of stock and thus to be removed from the store
     'stock_updates' - data that shall be applied to stock items in the store
-    
+
+    Stock updates are applied as deltas: a record of an item already in the store may carry only 'code' and the
+    fields that changed, and records that change nothing are skipped (counted in 'unchanged_count').
+    New items must come with all fields of STOCK_UPDATES_FIELD_MAPPING.
+
+    Each dataset is either a list of records (one object per item) or columnar: an object mapping each field
+    to the list of its values, e.g. {'code': [...], 'units_in_stock': [...]}, all lists of the same length.
+    Columnar datasets are much cheaper to parse and are applied without a dictionary per record.
+    The payload may also be sent as MessagePack (Content-Type application/msgpack), if msgpack is installed;
+    it is then decoded at once, whatever BULK_UPDATE_STREAMING says.
+
+    If BULK_UPDATE_STREAMING is set, the request body is parsed incrementally and the sub-datasets are
+    applied in batches of BULK_UPDATE_BATCH_SIZE items as they arrive, so memory use does not depend on
+    the size of the payload (a columnar dataset is held in memory as a whole, and applied in batches).
+    Sub-datasets are then processed in the order they appear in the payload, and
+    batches applied before a malformed part of the payload is detected remain applied.
     """
     current_app.extensions['csrf'].exempt(bulk_update)
 
     connection_start_time=datetime.now(timezone.utc)
     current_app.logger.info(f"Incoming request to UPDATE store contents: {request.remote_addr}, {request.user_agent}")
-               
-    data_in = request.get_json()
-  
-    connection_end_time=datetime.now(timezone.utc)
 
     # keys for the various sub-datasets in the data_in. 
     # the keys define what to do with each sub-dataset.  
@@ -124,87 +343,26 @@ def bulk_update():
                          OUT_OF_STOCK_KEY: OperationResult(),
                          STOCK_UPDATES_KEY: OperationResult()
                          }
-        
-    # NB, there is a difference as to any of sub-datasets is empty, or entirely missing from the incoming batch.
-    # In both cases, there could be legit reasons, so they are not treated as errors.
-    if DELETED_KEY in data_in:
-        items_delete = data_in[DELETED_KEY]
-        print(items_delete)
-        if items_delete:
-            deletion_result = delete_items(target_model=SalesItem, 
-                         key_col_target='code',
-                         incoming_data=items_delete,
-                         key_col_incoming='code'
-                         )
-            bulk_update_results[DELETED_KEY] = deletion_result
-        else:
-            current_app.logger.info("Deleted items dataset empty in the incoming batch.")
-            print(">>> no deleted items from the warehouse")
-    else:
-        current_app.logger.warning("Deleted items dataset missing.")
- 
-    if NOT_FOR_SALE_KEY in data_in:
-        items_not_for_sale = data_in[NOT_FOR_SALE_KEY]
-        print(items_not_for_sale)
-        if items_not_for_sale:
-            not_for_sale_result = delete_items(target_model=SalesItem, 
-                         key_col_target='code',
-                         incoming_data=items_not_for_sale,
-                         key_col_incoming='code'
-                         )
-            bulk_update_results[NOT_FOR_SALE_KEY] = not_for_sale_result
 
+    use_msgpack = request.mimetype in MSGPACK_MIMETYPES
+    if use_msgpack and msgpack is None:
+        current_app.logger.error("MessagePack bulk update received, but msgpack is not installed.")
+        return jsonify({'error': "MessagePack is not supported, send JSON"}), 415
+
+    try:
+        if use_msgpack:
+            _bulk_update_in_memory(bulk_update_results, _unpack_msgpack())
+        elif current_app.config.get('BULK_UPDATE_STREAMING', False):
+            _bulk_update_streamed(bulk_update_results)
         else:
-            current_app.logger.info("Not-for-sale dataset empty in the incoming batch.")
-            print(">>> no Not For Sale items from the warehouse")
-    else:
-        current_app.logger.warning("Not-For-Sale items dataset missing.")
-        print("!!!! Not For Sale item data missing from the delivery")
-
-    if OUT_OF_STOCK_KEY in data_in:
-        out_of_stock_items = data_in[OUT_OF_STOCK_KEY]
-        print(items_not_for_sale)
-        if out_of_stock_items:
-            out_of_stock_result = delete_items(target_model=SalesItem, 
-                         key_col_target='code',
-                         incoming_data=out_of_stock_items,
-                         key_col_incoming='code'
-                         )
-            bulk_update_results[OUT_OF_STOCK_KEY] = out_of_stock_result
-        else:
-            current_app.logger.info("Out-of-stock dataset empty in the incoming batch.")
-            print(">>> no Out-of-stock items from the warehouse")
-    else:
-        current_app.logger.warning("Out-of-stock items dataset missing.")
-        print("!!!! Not For Sale item data missing from the delivery")
-
-    if STOCK_UPDATES_KEY in data_in:
-        stock_updates = data_in[STOCK_UPDATES_KEY]
-        print(stock_updates)
-        if stock_updates:
-            field_mapping = {'code':'code',
-                    'name': 'name',
-                    'description': 'description',
-                    'vendor.name': 'vendor_name',
-                    'price_per_unit': 'price_per_unit',
-                    'units_in_stock': 'units_in_stock',
-            }
-                    # 'sales_margin': 'sales_margin'}
-
-            stock_update_result = update_items(target_model=SalesItem,
-                         key_col_target='code',
-                         incoming_data=stock_updates,
-                         key_col_incoming='code',
-                         field_mapping=field_mapping,
-                         timestamp_col='last_updated'
-                         )
-            bulk_update_results[STOCK_UPDATES_KEY] = stock_update_result
-        else:
-            current_app.logger.info("Stock item update dataset empty in the incoming batch.")
-            print(">>> no item updates from the warehouse")
-    else:
-        current_app.logger.warning("Stock item update dataset missing.")
-        print("!!!! Item updates missing from the delivery")
+            _bulk_update_in_memory(bulk_update_results, request.get_json())
+    except ValueError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Malformed bulk update payload: {e}")
+        return jsonify({'error': f"Malformed bulk update payload: {e}",
+                        'results': {key: result.to_dict() for key, result in bulk_update_results.items()}}), 400
+
+    connection_end_time=datetime.now(timezone.utc)
 
     records_received = 0
     
@@ -217,7 +375,7 @@ def bulk_update():
         if isinstance(result, OperationResult):
             bulk_update_results[key] = result.to_dict()
 
-    sync_record = SyncHistory(remote_name="Warehouse",
+    sync_record = SyncHistory(remote_name=WAREHOUSE_REMOTE_NAME,
                               timestamp_start=connection_start_time,
                               timestamp_end=connection_end_time,
                               connection_type=ConnectionType.SYNC,
@@ -228,3 +386,142 @@ def bulk_update():
 
     return jsonify(bulk_update_results)
 
+
+def _apply_dataset(key, items):
+    """
+    Apply (a batch of) one sub-dataset of the bulk update to the store.
+    Items listed under 'deleted', 'not_for_sale' and 'out_of_stock' are removed, 'stock_updates' are added or updated.
+
+    Returns:
+        OperationResult of the underlying sync utility.
+    """
+    if key == STOCK_UPDATES_KEY:
+        return update_items(target_model=SalesItem,
+                            key_col_target='code',
+                            incoming_data=items,
+                            key_col_incoming='code',
+                            field_mapping=STOCK_UPDATES_FIELD_MAPPING,
+                            timestamp_col='last_updated'
+                            )
+
+    return delete_items(target_model=SalesItem,
+                        key_col_target='code',
+                        incoming_data=items,
+                        key_col_incoming='code'
+                        )
+
+
+def _unpack_msgpack():
+    """
+    Decode the whole MessagePack request body.
+
+    Raises:
+        ValueError: if the request body is not a well-formed MessagePack map.
+    """
+    data_in = msgpack.unpackb(request.get_data(), raw=False)
+    if not isinstance(data_in, dict):
+        raise ValueError("The payload is not a map of datasets")
+    return data_in
+
+
+def _incoming_data(dataset):
+    """
+    Returns the records of a dataset: a list of records as is, columns (a dictionary of lists) as ColumnarData.
+
+    Raises:
+        ValueError: if the columns are malformed.
+    """
+    if isinstance(dataset, dict):
+        return ColumnarData(dataset)
+    return dataset
+
+
+def _bulk_update_in_memory(bulk_update_results, data_in):
+    """
+    Apply each sub-dataset of the decoded request body in one go.
+
+    Raises:
+        ValueError: if a columnar dataset is malformed.
+    """
+    # NB, there is a difference as to any of sub-datasets is empty, or entirely missing from the incoming batch.
+    # In both cases, there could be legit reasons, so they are not treated as errors.
+    for key in bulk_update_results:
+        if key not in data_in:
+            current_app.logger.warning(f"{DATASET_DESCRIPTIONS[key]} dataset missing.")
+            continue
+
+        incoming_data = _incoming_data(data_in[key])
+        if not incoming_data:
+            current_app.logger.info(f"{DATASET_DESCRIPTIONS[key]} dataset empty in the incoming batch.")
+        else:
+            bulk_update_results[key] = _apply_dataset(key, incoming_data)
+
+
+def _bulk_update_streamed(bulk_update_results):
+    """
+    Parse the request body incrementally and apply each sub-dataset in batches of BULK_UPDATE_BATCH_SIZE items.
+    The results of the batches are merged into bulk_update_results.
+
+    Raises:
+        ValueError: if the request body is not a well-formed JSON object, a columnar dataset is malformed,
+            or a record or columnar dataset exceeds BULK_UPDATE_MAX_VALUE_CHARS.
+    """
+    batch_size = current_app.config.get('BULK_UPDATE_BATCH_SIZE', 1000)
+    datasets_received = set()
+    batch = []
+
+    for event, key, value in iter_json_object(request.stream,
+                                              max_value_size=current_app.config.get('BULK_UPDATE_MAX_VALUE_CHARS')):
+        if key not in bulk_update_results:
+            continue
+
+        if event == ARRAY_START:
+            datasets_received.add(key)
+        elif event == ARRAY_ITEM:
+            batch.append(value)
+            if len(batch) >= batch_size:
+                bulk_update_results[key].merge(_apply_dataset(key, batch))
+                batch = []
+        elif event == ARRAY_END:
+            if batch:
+                bulk_update_results[key].merge(_apply_dataset(key, batch))
+                batch = []
+            if not value:
+                current_app.logger.info(f"{DATASET_DESCRIPTIONS[key]} dataset empty in the incoming batch.")
+        else:
+            datasets_received.add(key)
+            if isinstance(value, dict):
+                value = ColumnarData(value)         # columnar dataset, applied in batches as well
+                for columnar_batch in value.batches(batch_size):
+                    bulk_update_results[key].merge(_apply_dataset(key, columnar_batch))
+            elif value:
+                current_app.logger.error(f"{DATASET_DESCRIPTIONS[key]} dataset is not a list, ignored.")
+            if not value:
+                current_app.logger.info(f"{DATASET_DESCRIPTIONS[key]} dataset empty in the incoming batch.")
+
+    for key in bulk_update_results:
+        if key not in datasets_received:
+            current_app.logger.warning(f"{DATASET_DESCRIPTIONS[key]} dataset missing.")
+
+
+@bp_api.route('/metrics', methods=['GET'])
+@token_required
+def get_metrics():
+    """
+    Internal API endpoint returning runtime metrics of the worker process serving the request: connection pool
+    state and checkout wait times per database, and cache counters.
+
+    The metrics are per process. Under a multi-process server, each request is answered by one of the workers
+    (identified by 'pid'), and the counters cover that worker since its start.
+
+    High pool wait times, timeouts or frequent overflow point to pool starvation (too few connections for the
+    concurrency); low wait times with slow responses point to slow queries.
+    """
+    caches = {'catalog_pages': catalog_cache.stats(),
+              'validated_tokens': validated_token_cache.stats()}
+    if hasattr(user_cache.backend, 'stats'):
+        caches['users'] = user_cache.backend.stats()
+
+    return jsonify({'pid': os.getpid(),
+                    'pools': pool_metrics(db.engines),
+                    'caches': caches}), 200
@@ -7,6 +7,7 @@ from app import db
 from app.auth import bp_auth
 from app.auth.forms import LoginForm
 from app.models import User
+from app.utilities.user_cache import user_cache
 
 
 @bp_auth.route('/login', methods=['GET', 'POST'])
@@ -27,6 +28,7 @@ def login():
        
         # Commit the update to the database
         db.session.commit()
+        user_cache.invalidate(user.id)
 
         next_page = request.args.get('next')
         if not next_page or urlsplit(next_page).netloc != '':
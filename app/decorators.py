@@ -2,7 +2,7 @@ from flask import abort, request, jsonify
 from flask_login import current_user
 from functools import wraps
 from .models import APIToken
-from app.utilities.token_utilities import validate_token
+from app.utilities.token_utilities import get_valid_token_id, token_usage_recorder
 from flask_wtf.csrf import CSRFProtect
 
 
@@ -33,12 +33,16 @@ def token_required(f):
         if not token:
             return jsonify({'error': 'Missing token'}), 401
 
-        is_valid = validate_token(token)
-        if not is_valid:
+        token_id = get_valid_token_id(token)
+        if token_id is None:
             print("INVALID TOKEN")
             return jsonify({'error': 'Invalid or expired token'}), 401
 
-        print("VALID TOKEN")
-        return f(*args, **kwargs)
+        # last_used_at is written behind, in batches
+        token_usage_recorder.record(token_id)
+        response = f(*args, **kwargs)
+        if token_usage_recorder.flush_due():
+            token_usage_recorder.flush()
+        return response
     return decorated_function
 
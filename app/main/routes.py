@@ -1,24 +1,78 @@
-from flask import Blueprint, redirect, url_for, render_template, request, flash
+from flask import Blueprint, redirect, url_for, render_template, request, flash, make_response, abort, session
 from flask import current_app
 from flask_login import current_user, login_required
+from markupsafe import Markup
 from datetime import datetime, timezone # UTC
 from app import db
 from .forms import SupportForm, PurchaseForm, PurchaseVerificationForm
 from app.models import SalesItem, Purchases, UserRole
 from app.decorators import role_required
+from app.utilities.catalog_cache import catalog_cache, viewer_class, response_etag, VIEWER_ANONYMOUS
+from app.utilities.catalog_search import catalog_search
+from app.utilities.catalog_facets import catalog_facets, catalog_filters, filter_args, filter_query, sort_columns
+from app.utilities.pagination import paginate, pagination_key
+from app.utilities.purchase_utilities import checkout, reserve_stock, ItemNotFound, SoldOut, InsufficientStock, DuplicateRequest
+from app.utilities.idempotency import new_idempotency_key, request_idempotency_key
+from app.utilities.purchase_queue import purchase_queue, PurchaseTimeout
+from app.utilities.cart_utilities import get_cart, add_to_cart, set_cart_quantity, clear_cart
 from app.main import bp_main
 
 @bp_main.route('/')
 def index():
     """
     Main view, showing list of items available for sale. Login is not required.
+
+    The catalog can be filtered by vendor, price range and in-stock status, and sorted by price, name or stock
+    (see catalog_filters), with facet counts per vendor and price bucket.
+
+    The item table is served from the catalog cache when possible. Anonymous visitors get ETag/Last-Modified
+    validators, so a revalidation of an unchanged page is answered with 304 without touching the database.
+    The ETag covers the item table and the facet counts; no validators are sent while a flashed message is pending.
     """
     items_per_page = current_app.config['ITEMS_PER_PAGE']
+    filters = catalog_filters(request.args)
+    page_key = pagination_key() + tuple(filters) + (items_per_page,)
+    viewer = viewer_class(current_user)
+
+    catalog_page = catalog_cache.get(page_key, viewer)
+    if catalog_page is None:
+        count_key = 'sales_items' if not any(filters) else ('sales_items',) + tuple(filters)
+        sales_items_pagination = paginate(filter_query(SalesItem.query, filters), sort_columns(filters), items_per_page,
+                                          descending=filters.order == 'desc', count_key=count_key)
+        sales_items = sales_items_pagination.items
+        html = render_template("main/items_table.html", items=sales_items, pagination=sales_items_pagination,
+                               filter_args=filter_args(filters))
+        catalog_page = catalog_cache.set(page_key, viewer, html, sales_items,
+                                         stock_dependent=bool(filters.in_stock) or filters.sort == 'stock')
+
+    # the rest of the page only depends on the viewer class and the facet counts for anonymous visitors
+    vendors, price_ranges = catalog_facets.counts(in_stock=bool(filters.in_stock))
+    use_validators = viewer == VIEWER_ANONYMOUS and '_flashes' not in session
+    etag = response_etag(catalog_page, vendors, price_ranges)
+    if use_validators and etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template("main/items_list.html", items_table=Markup(catalog_page.html),
+                                                 filters=filters, filter_args=filter_args(filters),
+                                                 vendors=vendors, price_ranges=price_ranges))
+
+    if use_validators:
+        response.set_etag(etag)
+        if catalog_page.last_modified:
+            response.last_modified = catalog_page.last_modified
+    response.vary.add('Cookie')
+    return response
+
+@bp_main.route('/search')
+def search():
+    """
+    Catalog search over item code, name, description and vendor name, best match first. Login is not required.
+    Each word of the query matches as a prefix, and all words must match.
+    """
+    query_text = request.args.get('q', '').strip()[:200]
     page = request.args.get('page', 1, type=int)
-
-    sales_items_pagination = SalesItem.query.paginate(page=page, per_page=items_per_page, error_out=False)
-    sales_items = sales_items_pagination.items
-    return render_template("main/items_list.html", items=sales_items, pagination=sales_items_pagination)
+    items, has_more = catalog_search.search(query_text, page, current_app.config['ITEMS_PER_PAGE'])
+    return render_template('main/search_results.html', items=items, query_text=query_text, page=page, has_more=has_more)
 
 @bp_main.route('/view_item/<int:item_id>')
 @login_required
@@ -39,18 +93,18 @@ def item_details(item_id):
     form = PurchaseForm()
 
     # Limit the max quantity to purchase
-    max_units = min(item.units_in_stock, current_app.config['MAX_UNITS_PER_PURCHASE'])
+    max_units = min(item.units_available, current_app.config['MAX_UNITS_PER_PURCHASE'])
     form.quantity.validators[1].max = max_units
 
     return render_template('main/item_details_purchase.html', item=item, form=form)
 
 # purchase form, specify the amount of units
-@bp_main.route('/purchase/<int:item_id>', methods=['GET', 'POST'])
+@bp_main.route('/purchase/<int:item_id>', methods=['GET'])
 @login_required
 def purchase_item(item_id):
     """
     View item details for non-customers
-    Purchase item for customers
+    Purchase item for customers: the form is posted to purchase_verification
     """
 
     if not current_user.is_customer():
@@ -59,24 +113,39 @@ def purchase_item(item_id):
     item = SalesItem.query.get_or_404(item_id)
     form = PurchaseForm()
 
-    if form.validate_on_submit():
-        quantity_to_purchase = form.quantity.data
-
-        if quantity_to_purchase > item.units_in_stock:
-            flash('Insufficient stock available.', 'danger')
-            return redirect(url_for('main.purchase_item', form=form, item_id=item_id))
-
-        return redirect(url_for('main.purchase_verification', item_id=item_id, quantity=quantity_to_purchase))
-
     return render_template('main/item_details_purchase.html', form=form, item=item)
 
 
-@bp_main.route('/purchase_verification/<int:item_id>', methods=['GET'])
+@bp_main.route('/purchase_verification/<int:item_id>', methods=['POST'])
 @login_required
 def purchase_verification(item_id):
+    """
+    Reserves the quantity posted by the purchase form and shows the purchase for confirmation. The units are held
+    for the customer until the purchase is finalized, or the reservation expires after RESERVATION_TTL_SECONDS.
+    A repeated post replaces the reservation.
+    """
+    if not current_user.is_customer():
+        return redirect(url_for('main.index'))
+
     item = SalesItem.query.get_or_404(item_id)
-    
-    quantity = request.args.get('quantity', type=int)
+    form = PurchaseForm()
+
+    if not form.validate_on_submit():
+        flash('Invalid quantity.', 'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+    quantity = form.quantity.data
+
+    try:
+        reservation = reserve_stock(item.id, current_user.id, quantity, current_app.config['RESERVATION_TTL_SECONDS'])
+    except ValueError:
+        flash('Invalid quantity.', 'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+    except SoldOut as e:
+        flash(f'Sorry, only {e.units_available} units available.' if e.units_available > 0 else 'Sorry, this item is sold out.', 'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+    finally:
+        catalog_cache.invalidate_items([item_id])
+        catalog_facets.invalidate()
 
     verification_form = PurchaseVerificationForm()
     verification_form.item_code.data = item.code
@@ -90,7 +159,9 @@ def purchase_verification(item_id):
     return render_template('main/purchase_verification.html', 
                            item=item, 
                            quantity=quantity, 
-                           total_price=total_price)
+                           total_price=total_price,
+                           reservation=reservation,
+                           idempotency_key=new_idempotency_key())
 
 
 # def purchase_verification(item_id):
@@ -116,36 +187,120 @@ def finalize_purchase(item_id):
     if not current_user.is_customer():
         return redirect(url_for('main.index'))
 
-    item = SalesItem.query.get_or_404(item_id)
-    
     quantity_str = request.form.get('quantity')
     if quantity_str is None:
         flash('No quantity provided.', 'danger')
         return redirect(url_for('main.item_details', item_id=item_id))
 
-    quantity_to_purchase = int(quantity_str)
+    try:
+        quantity_to_purchase = int(quantity_str)
+        purchase_queue.submit(item_id, current_user.id, quantity_to_purchase,
+                              reservation_id=request.form.get('reservation_id', type=int),
+                              idempotency_key=request_idempotency_key())
+    except DuplicateRequest:
+        # repeated submission (double click, retry): the purchase was made by the first one
+        pass
+    except ValueError:
+        flash('Invalid quantity.', 'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+    except ItemNotFound:
+        abort(404)
+    except SoldOut as e:
+        if e.units_available > 0:
+            flash(f'Sorry, only {e.units_available} units available.', 'danger')
+            return redirect(url_for('main.purchase_item', item_id=item_id))
+        flash('Sorry, this item is sold out.', 'danger')
+        return redirect(url_for('main.index'))
+    except PurchaseTimeout as e:
+        if e.made is False:
+            flash('The purchase could not be completed in time, please try again.', 'danger')
+        else:
+            flash('The purchase is taking longer than expected, please check your purchases before trying again.',
+                  'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+    finally:
+        catalog_cache.invalidate_items([item_id])
+        catalog_facets.invalidate()
 
-    item.units_in_stock -= quantity_to_purchase
-    item.units_purchased += quantity_to_purchase
-    item_purchase_price = item.price_per_unit       #
-    purchase_total_price = item_purchase_price * quantity_to_purchase
+    flash('Purchase successful!', 'success')
+    return redirect(url_for('main.index'))
 
-    purchase = Purchases(salesitem_id=item.id,
-                         purchase_code=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")+"_"+item.code, 
-                         salesitem_code=item.code,
-                         salesitem_name=item.name,
-                         salesitem_vendor_name=item.vendor_name,
-                         user_id=current_user.id,
-                         quantity=quantity_to_purchase,
-                         salesitem_item_base_price=item.price_per_unit,
-                        #  salesitem_sales_margin=item.sales_margin,
-                         salesitem_purchase_price=item_purchase_price,
-                         total_price=purchase_total_price)
 
-    db.session.add(purchase)
-    db.session.commit()
+# shopping cart: customers collect items and purchase them with one checkout
+@bp_main.route('/cart/add/<int:item_id>', methods=['POST'])
+@login_required
+@role_required(UserRole.CUSTOMER)
+def add_item_to_cart(item_id):
+    item = SalesItem.query.get_or_404(item_id)
+    form = PurchaseForm()
 
-    flash('Purchase successful!', 'success')
+    if not form.validate_on_submit():
+        flash('Invalid quantity.', 'danger')
+        return redirect(url_for('main.purchase_item', item_id=item_id))
+
+    quantity_in_cart = add_to_cart(item.id, form.quantity.data, max_quantity=current_app.config['MAX_UNITS_PER_PURCHASE'])
+    flash(f'{item.name}: {quantity_in_cart} units in cart.', 'success')
+    return redirect(url_for('main.view_cart'))
+
+
+@bp_main.route('/cart')
+@login_required
+@role_required(UserRole.CUSTOMER)
+def view_cart():
+    cart = get_cart()
+    items = SalesItem.query.filter(SalesItem.id.in_(cart)).order_by(SalesItem.id).all() if cart else []
+    cart_lines = [(item, cart[item.id], item.price_per_unit * cart[item.id]) for item in items]
+    total_price = sum(line_price for _, _, line_price in cart_lines)
+    return render_template('main/cart.html', cart_lines=cart_lines, total_price=total_price,
+                           idempotency_key=new_idempotency_key())
+
+
+@bp_main.route('/cart/update/<int:item_id>', methods=['POST'])
+@login_required
+@role_required(UserRole.CUSTOMER)
+def update_cart(item_id):
+    quantity = request.form.get('quantity', 0, type=int)
+    set_cart_quantity(item_id, min(quantity, current_app.config['MAX_UNITS_PER_PURCHASE']))
+    return redirect(url_for('main.view_cart'))
+
+
+@bp_main.route('/cart/checkout', methods=['POST'])
+@login_required
+@role_required(UserRole.CUSTOMER)
+def checkout_cart():
+    """
+    Purchases all items in the cart in one transaction: all or nothing.
+    """
+    cart = get_cart()
+
+    try:
+        result = checkout(current_user.id, cart, idempotency_key=request_idempotency_key())
+    except DuplicateRequest as e:
+        # repeated submission (double click, retry): report the result of the first one
+        result = e.result
+    except InsufficientStock as e:
+        catalog_cache.invalidate_items(e.shortages)
+        catalog_facets.invalidate()
+        items = {item.id: item for item in SalesItem.query.filter(SalesItem.id.in_(e.shortages))}
+        for item_id, units_available in e.shortages.items():
+            if item_id not in items:
+                set_cart_quantity(item_id, 0)
+                flash('An item in your cart is no longer available and was removed.', 'danger')
+            else:
+                flash(f'Sorry, only {units_available} units of {items[item_id].name} available.', 'danger')
+        return redirect(url_for('main.view_cart'))
+    except ValueError:
+        if not cart:
+            flash('Your cart is empty.', 'danger')
+        else:
+            clear_cart()
+            flash('Invalid cart contents, the cart was emptied.', 'danger')
+        return redirect(url_for('main.view_cart'))
+
+    catalog_cache.invalidate_items(cart)
+    catalog_facets.invalidate()
+    clear_cart()
+    flash(f"Purchase successful! {result['purchases']} items, total {result['total_price']:.2f}.", 'success')
     return redirect(url_for('main.index'))
 
 
@@ -164,9 +319,8 @@ def support():
 @role_required(UserRole.SALES_MANAGER, UserRole.READ_ONLY)
 def purchase_view():
     items_per_page = current_app.config['ITEMS_PER_PAGE']
-    page = request.args.get('page', 1, type=int)
 
-    purchases_pagination = Purchases.query.paginate(page=page, per_page=items_per_page, error_out=False)
+    purchases_pagination = paginate(Purchases.query, [Purchases.id], items_per_page, count_key='purchase_history')
     purchases_items = purchases_pagination.items
     return render_template("main/purchases_list.html", purchases=purchases_items, pagination=purchases_pagination)
 
@@ -3,6 +3,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from flask_login import UserMixin
 from enum import Enum
+from sqlalchemy.orm import validates
+import hashlib
 from app import db
 
 
@@ -71,11 +73,11 @@ class Purchases(db.Model):
     id = db.Column(db.Integer, primary_key=True)        # unique purchase id
     purchase_code = db.Column(db.String(50))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # customer who made the purchase
-    salesitem_id = db.Column(db.Integer, db.ForeignKey('sales_items.id')) #
+    salesitem_id = db.Column(db.Integer, db.ForeignKey('sales_items.id'), index=True) #
     salesitem_code = db.Column(db.String(32), nullable=False)    # unique code of the item
     salesitem_name = db.Column(db.String(128), nullable=False)    # item name
     salesitem_vendor_name = db.Column(db.String(128), nullable=False)    # name of the vendor
-    purchase_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    purchase_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     salesitem_item_base_price = db.Column(db.Float)
     # salesitem_sales_margin =db.Column(db.Float)
     salesitem_purchase_price=db.Column(db.Float)
@@ -89,6 +91,14 @@ class Purchases(db.Model):
     customer = db.relationship('User', backref='purchase_history')
     sales_item = db.relationship('SalesItem', backref='purchase_history')
 
+    __table_args__ = (
+        # a customer's purchases (User.purchase_history), optionally by time
+        db.Index('ix_purchase_history_user_time', 'user_id', 'purchase_time'),
+        # purchases pending sync; partial, so it only holds the few unsynced rows
+        db.Index('ix_purchase_history_requires_sync', 'id',
+                 sqlite_where=db.text('requires_sync = 1'), postgresql_where=db.text('requires_sync')),
+    )
+
 
 class SalesItem(db.Model):
     __tablename__ = 'sales_items'
@@ -104,11 +114,52 @@ class SalesItem(db.Model):
     # sales_margin = db.Column(db.Float)      # sales margin added
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     units_purchased = db.Column(db.Integer, default=0)              # number of units purchased so far
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    units_reserved = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # units held by active StockReservations
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    content_hash = db.Column(db.String(32))    # hash of the synced fields, to skip unchanged records in a sync
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # incremented by each sync change
     # vendor = db.relationship('Vendor')
 
+    __table_args__ = (
+        # catalog sort orders and filters (see app/utilities/catalog_facets.py); the id tie-breaker is implicit
+        db.Index('ix_sales_items_price', 'price_per_unit'),
+        db.Index('ix_sales_items_name', 'name'),
+        db.Index('ix_sales_items_stock', 'units_in_stock'),
+        db.Index('ix_sales_items_vendor', 'vendor_name'),
+        db.Index('ix_sales_items_vendor_price', 'vendor_name', 'price_per_unit'),
+        db.Index('ix_sales_items_vendor_name', 'vendor_name', 'name'),
+    )
+
+    @property
+    def units_available(self):
+        # units in stock that are not held for customers; a sync may lower the stock below the units reserved
+        return max((self.units_in_stock or 0) - (self.units_reserved or 0), 0)
+
 
 # API client privileges
+class CatalogFacet(db.Model):
+    """
+    Number of catalog items per facet value - per vendor and per price bucket - in total and in stock.
+    Maintained incrementally by triggers on sales_items (see app/utilities/catalog_facets.py), not by the app.
+    """
+    __tablename__ = "catalog_facets"
+
+    facet = db.Column(db.String(16), primary_key=True)      # 'vendor' or 'price'
+    value = db.Column(db.String(128), primary_key=True)     # vendor name, or price bucket number
+    item_count = db.Column(db.Integer, default=0, nullable=False)
+    in_stock_count = db.Column(db.Integer, default=0, nullable=False)   # items with units available
+
+
+class CatalogFacetSettings(db.Model):
+    """
+    The price bucket boundaries the catalog_facets triggers and counts were built with; a single row (id 1).
+    """
+    __tablename__ = "catalog_facet_settings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    price_buckets = db.Column(db.String(1024), nullable=False)     # JSON list of the boundaries
+
+
 class APIRole(Enum):
     READ_ONLY = "Read-only"
     READ_WRITE = "Read-write"
@@ -125,6 +176,7 @@ class APIToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     connection_name = db.Column(db.String(50))                      # just some name for the API token for the convenience of browsing
     token = db.Column(db.String(255), unique=True, nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, index=True)     # SHA-256 of the token, used for lookups. Set automatically.
     # system_id = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
@@ -133,6 +185,16 @@ class APIToken(db.Model):
     last_used_at = db.Column(db.DateTime)
     # user_id = db.Column(db.Integer, db.ForeignKey('users.id'))      # user who created or updated the token
 
+    @staticmethod
+    def digest(token):
+        # fixed-size digest of a token, lookups are done on this rather than on the full token
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @validates('token')
+    def _set_token_hash(self, key, token):
+        self.token_hash = APIToken.digest(token) if token else None
+        return token
+
     def is_token_valid(self):
         # Check if the token is expired or revoked
         return not self.revoked and (self.expires_at is None or self.expires_at > datetime.utcnow())
@@ -155,10 +217,43 @@ class SyncHistory(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     remote_name = db.Column(db.String(50))                  # name of the remote system, based on system_id field in API token.
-    timestamp_start = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp_start = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     timestamp_end = db.Column(db.DateTime, default=datetime.utcnow)
     error_code = db.Column(db.Integer, default=0)                   # 0 means a successful session
     connection_type = db.Column(db.Enum(ConnectionType), default=ConnectionType.RESET)
     updates_received = db.Column(db.Integer, default=0)
     updates_sent = db.Column(db.Integer, default=0)
-    
\ No newline at end of file
+    
+
+class StockReservation(db.Model):
+    """
+    Units of a sales item held for a customer between purchase verification and finalization.
+    The held units are counted in SalesItem.units_reserved; expired holds are released by the reservation sweeper.
+    """
+    __tablename__ = "stock_reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    salesitem_id = db.Column(db.Integer, db.ForeignKey('sales_items.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (db.Index('ix_stock_reservations_user_item', 'user_id', 'salesitem_id'),)
+
+
+class IdempotencyKey(db.Model):
+    """
+    Result of a purchase request, stored under the idempotency key supplied by the client (hidden form field or
+    Idempotency-Key header). A retried or repeated submission with the same key returns the stored result instead
+    of purchasing again. Written in the transaction of the purchase; purged after IDEMPOTENCY_KEY_TTL_SECONDS.
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    key = db.Column(db.String(64), nullable=False)     # client-generated, unique per user
+    result = db.Column(db.Text)                         # JSON encoded result of the original request
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),)
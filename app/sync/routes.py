@@ -7,7 +7,9 @@ from app import db
 from app.decorators import role_required
 from app.models import UserRole, APIToken, APIRole, SyncHistory
 from app.sync import bp_sync
-from app.utilities.token_utilities import generate_token, get_claim_from_token
+from app.utilities.token_utilities import generate_token, get_claim_from_token, invalidate_token
+from app.utilities.pagination import paginate
+from app.utilities.db_routing import use_primary
 
 
 # browse session history
@@ -19,8 +21,7 @@ def browse_session_history():
 
     """
     items_per_page = current_app.config['ITEMS_PER_PAGE']
-    page = request.args.get('page', 1, type=int)
-    sync_history_pagination = SyncHistory.query.paginate(page=page, per_page=items_per_page, error_out=False)
+    sync_history_pagination = paginate(SyncHistory.query, [SyncHistory.id], items_per_page, count_key='sync_history')
     sync_history_items = sync_history_pagination.items
     
     return render_template("sync/sync_history.html", sync_history=sync_history_items, pagination=sync_history_pagination)
@@ -83,15 +84,14 @@ def view_edit_tokens_view():
     View, Edit and Delete remote connections (same as token management).
     """
     items_per_page = current_app.config['ITEMS_PER_PAGE']
-    page = request.args.get('page', 1, type=int)
-    # items = Item.query.paginate(page=page, per_page=ITEMS_PER_PAGE, error_out=False)
-    token_pagination = APIToken.query.paginate(page=page, per_page=items_per_page, error_out=False)
+    token_pagination = paginate(APIToken.query, [APIToken.id], items_per_page, count_key='api_tokens')
     token_items = token_pagination.items
     
     return render_template("sync/view_tokens.html", tokens=token_items, pagination=token_pagination)
 
 @bp_sync.route('/token_status_togle/<int:token_id>')
 @role_required(UserRole.ADMIN)
+@use_primary()      # GET request that writes
 def toggle_token_status_view(token_id):
     """
     Flip token status from Active to Revoked and back.
@@ -101,6 +101,7 @@ def toggle_token_status_view(token_id):
     new_token_status = token.toggle_token_status()
     try:
         db.session.commit()
+        invalidate_token(token.token)
         status_changed = True
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -118,10 +119,12 @@ def delete_token_view(token_id):
     """
     token_deleted = False
     token = APIToken.query.get_or_404(token_id)
+    token_value = token.token
     
     try:
         db.session.delete(token)
         db.session.commit()
+        invalidate_token(token_value)
         token_deleted = True
     except:
         db.session.rollback()
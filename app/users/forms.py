@@ -7,6 +7,7 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, PasswordField, SelectField, HiddenField, ValidationError
 from wtforms_sqlalchemy.fields import QuerySelectField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, Regexp
+from app import db
 from app.models import User, UserRole  # Import the UserRole enum
 
 # Custom Validator Function
@@ -16,7 +17,8 @@ def validate_password_length(form, field):
         raise ValidationError(f'Password must be at least {min_length} characters long.')
 
 def validate_current_password(self, field):
-    if not current_user.check_password(field.data):
+    # current_user may be served from the user cache, which has no password hash: check against the row
+    if not db.session.get(User, current_user.id).check_password(field.data):
         raise ValidationError('Incorrect current password.')
 
 def role_query():
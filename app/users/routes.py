@@ -8,6 +8,9 @@ from sqlalchemy.exc import SQLAlchemyError
 from app.models import User, UserRole
 from app.decorators import role_required
 from app import db
+from app.utilities.user_cache import user_cache
+from app.utilities.pagination import paginate
+from app.utilities.db_routing import use_primary
 
 # User related forms are:
 # view users, add user, edit user - access for ADMIN role only
@@ -17,8 +20,7 @@ from app import db
 @role_required(UserRole.ADMIN)
 def view_users():
     items_per_page = current_app.config['ITEMS_PER_PAGE']
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(page=page, per_page=items_per_page, error_out=False)
+    users = paginate(User.query, [User.id], items_per_page, count_key='users')
     return render_template('users/view_users.html', users=users.items, pagination=users)
 
 
@@ -82,6 +84,7 @@ def edit_user(user_id):
             user.set_password(form.new_password.data)
         print(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
 
         return redirect(url_for('users.view_users'))
     print('invalid form')
@@ -90,6 +93,7 @@ def edit_user(user_id):
 # Delete user route
 @bp_users.route('/delete/<int:user_id>', methods=['GET', 'POST'])
 @role_required(UserRole.ADMIN)
+@use_primary()      # deletes on GET as well
 def delete_user(user_id):
     print("deleting user", user_id)
     user = User.query.get_or_404(user_id)
@@ -106,6 +110,7 @@ def delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         # Redirect to view_users with a flag to trigger the JavaScript success popup
         return redirect(url_for('users.view_users', user_deleted=True))
     except Exception as e:
@@ -122,12 +127,15 @@ def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
         
-        if not current_user.check_password(form.old_password.data):
+        # current_user may be served from the user cache and is then not tracked by the session, load the row
+        user = db.session.get(User, current_user.id)
+        if not user.check_password(form.old_password.data):
             flash('Incorrect current password.')
             return render_template('users/change_password.html', form=form)
         
-        current_user.set_password(form.new_password.data)  # Set the new password
+        user.set_password(form.new_password.data)  # Set the new password
         db.session.commit()  # Commit the changes to the database
+        user_cache.invalidate(user.id)
         # flash('Password changed successfully.')
         return render_template('users/change_password.html', form=form, password_changed=True)
         # return redirect(url_for('main.dashboard'))
@@ -0,0 +1,106 @@
+# in-process caching helpers
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with least-recently-used eviction and an expiry time per entry.
+    Keeps hit/miss counters for monitoring.
+
+    The cache is local to the worker process: entries deleted in one process stay in the caches of
+    other processes until they expire, so the TTL bounds how stale a cached value can get.
+
+    Usage:
+        cache = TTLCache(max_entries=1000, ttl_seconds=60)
+        cache.set(key, value)
+        value = cache.get(key)      # None if missing or expired
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()       # key -> (expiry timestamp, value), least recently used first
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries=None, ttl_seconds=None):
+        """
+        Change the size limit and/or default TTL, e.g. from the app config. Empties the cache.
+        """
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            self._entries.clear()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value of key, or default if the key is not cached or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds=None, expires_at=None):
+        """
+        Caches value under key for ttl_seconds (default: the cache TTL), but not beyond expires_at
+        (a UNIX timestamp) if given. Values that would already be expired are not cached.
+        """
+        expiry = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        if expires_at is not None:
+            expiry = min(expiry, expires_at)
+        if expiry <= time.time():
+            return
+
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Removes key from the cache, if present.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        """
+        Removes all entries for which predicate(key, value) is true. Scans the whole cache.
+
+        Returns:
+            int: number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns cache counters as a dictionary.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'entries': len(self._entries),
+                    'max_entries': self.max_entries,
+                    'ttl_seconds': self.ttl_seconds}
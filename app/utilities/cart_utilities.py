@@ -0,0 +1,48 @@
+# shopping cart of the logged-in customer, kept in the session
+
+from flask import session
+
+CART_SESSION_KEY = 'cart'
+
+
+def get_cart():
+    """
+    Returns the cart as a dictionary {item id: quantity}.
+    """
+    return {int(item_id): quantity for item_id, quantity in session.get(CART_SESSION_KEY, {}).items()}
+
+
+def _save_cart(cart):
+    # session data is serialized as JSON, so item ids are stored as strings
+    session[CART_SESSION_KEY] = {str(item_id): quantity for item_id, quantity in cart.items()}
+
+
+def add_to_cart(item_id, quantity, max_quantity=None):
+    """
+    Adds units of an item to the cart, capped at max_quantity units per item if given.
+
+    Returns:
+        int: quantity of the item in the cart.
+    """
+    cart = get_cart()
+    cart[item_id] = cart.get(item_id, 0) + quantity
+    if max_quantity is not None:
+        cart[item_id] = min(cart[item_id], max_quantity)
+    _save_cart(cart)
+    return cart[item_id]
+
+
+def set_cart_quantity(item_id, quantity):
+    """
+    Sets the quantity of an item in the cart, a quantity of 0 removes the item.
+    """
+    cart = get_cart()
+    if quantity > 0:
+        cart[item_id] = quantity
+    else:
+        cart.pop(item_id, None)
+    _save_cart(cart)
+
+
+def clear_cart():
+    session.pop(CART_SESSION_KEY, None)
@@ -0,0 +1,94 @@
+# cache of rendered store catalog pages
+
+import hashlib
+from collections import namedtuple
+from app.utilities.cache_utilities import TTLCache
+
+# viewer classes - the catalog looks the same for all viewers of a class
+VIEWER_ANONYMOUS = 'anonymous'
+VIEWER_CUSTOMER = 'customer'
+VIEWER_STAFF = 'staff'
+
+# a rendered catalog page fragment with the ids of the items shown and its validators for conditional requests;
+# stock_dependent: which items the page shows depends on their stock (in-stock filter, sorted by stock)
+CatalogPage = namedtuple('CatalogPage', ['html', 'item_ids', 'etag', 'last_modified', 'stock_dependent'])
+
+
+def viewer_class(user):
+    """
+    Returns the viewer class of a user (e.g. flask_login.current_user).
+    """
+    if not user.is_authenticated:
+        return VIEWER_ANONYMOUS
+    return VIEWER_CUSTOMER if user.is_customer() else VIEWER_STAFF
+
+
+class CatalogCache:
+    """
+    Caches the rendered item table of the catalog (main.index), keyed by page and viewer class.
+
+    Entries are invalidated when the items change: a purchase drops the pages showing the purchased item and
+    the pages whose selection or order depends on the stock, sync updates and deletions drop all pages. Invalidation only reaches the cache of the current worker process,
+    in other workers pages expire after CATALOG_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._pages = TTLCache()
+
+    def init_app(self, app):
+        self._pages.configure(max_entries=app.config.get('CATALOG_CACHE_MAX_ENTRIES', 512),
+                              ttl_seconds=app.config.get('CATALOG_CACHE_TTL_SECONDS', 30))
+
+    def get(self, page_key, viewer):
+        """
+        Returns the cached CatalogPage, or None.
+        page_key identifies the page within the catalog, e.g. (page number, items per page).
+        """
+        return self._pages.get((page_key, viewer))
+
+    def set(self, page_key, viewer, html, items, stock_dependent=False):
+        """
+        Caches the rendered fragment html showing items, and returns it as a CatalogPage.
+        stock_dependent tells that a change of stock may add items to the page, remove them or reorder them.
+        """
+        last_updates = [item.last_updated for item in items if item.last_updated]
+        catalog_page = CatalogPage(html=html,
+                                   item_ids=frozenset(item.id for item in items),
+                                   etag=hashlib.sha1(html.encode('utf-8')).hexdigest(),
+                                   last_modified=max(last_updates) if last_updates else None,
+                                   stock_dependent=stock_dependent)
+        self._pages.set((page_key, viewer), catalog_page)
+        return catalog_page
+
+    def invalidate_items(self, item_ids):
+        """
+        Drops the pages showing any of the items, and the stock dependent pages. To be used when items change
+        without being added or removed, e.g. by purchases and reservations.
+        """
+        item_ids = frozenset(item_ids)
+        self._pages.delete_where(lambda key, catalog_page: catalog_page.stock_dependent
+                                 or not catalog_page.item_ids.isdisjoint(item_ids))
+
+    def invalidate_all(self):
+        """
+        Drops all pages. To be used when items are added or removed, as that shifts the pagination.
+        """
+        self._pages.clear()
+
+    def stats(self):
+        return self._pages.stats()
+
+
+def response_etag(catalog_page, *contents):
+    """
+    Returns the ETag of a response showing the catalog page together with other contents that change
+    independently of it (e.g. facet counts), given as values with a stable repr.
+    """
+    digest = hashlib.sha1(catalog_page.etag.encode('ascii'))
+    for content in contents:
+        digest.update(repr(content).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# rendered catalog pages; configured from the app config in create_app
+catalog_cache = CatalogCache()
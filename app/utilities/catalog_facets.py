@@ -0,0 +1,273 @@
+# catalog filters, sort orders and facet counts (items per vendor and per price bucket)
+
+import json
+from collections import namedtuple
+from sqlalchemy import case, func, select, text
+from app import db
+from app.models import SalesItem, CatalogFacet, CatalogFacetSettings
+from app.utilities.cache_utilities import TTLCache
+from app.utilities.db_routing import use_primary
+
+FACET_VENDOR = 'vendor'
+FACET_PRICE = 'price'
+
+# sort orders of the catalog: name -> sort column; the id is added as tie-breaker for keyset pagination
+SORT_COLUMNS = {'price': SalesItem.price_per_unit,
+                'name': SalesItem.name,
+                'stock': SalesItem.units_in_stock}
+
+# catalog filter and sort parameters of a request; None where not set
+CatalogFilters = namedtuple('CatalogFilters', ['vendor', 'min_price', 'max_price', 'in_stock', 'sort', 'order'])
+
+# a price bucket: number (facet value), bounds (upper bound excluded, None if open) and label
+PriceBucket = namedtuple('PriceBucket', ['number', 'low', 'high', 'label'])
+
+FacetValue = namedtuple('FacetValue', ['value', 'label', 'count', 'low', 'high'])
+
+FACET_TRIGGERS = ('catalog_facets_after_insert', 'catalog_facets_after_delete', 'catalog_facets_after_update')
+
+
+def _price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price >= 0 else None
+
+
+def catalog_filters(args):
+    """
+    Returns the CatalogFilters of the request arguments (e.g. request.args):
+    vendor, min_price, max_price (price_per_unit, max excluded), in_stock ('1': units available only),
+    sort (price, name or stock; default: item id) and order ('asc' or 'desc').
+    Invalid values are ignored.
+    """
+    sort = args.get('sort')
+    return CatalogFilters(vendor=args.get('vendor') or None,
+                          min_price=_price(args.get('min_price')),
+                          max_price=_price(args.get('max_price')),
+                          in_stock=args.get('in_stock') == '1' or None,
+                          sort=sort if sort in SORT_COLUMNS else None,
+                          order='desc' if args.get('order') == 'desc' else None)
+
+
+def filter_args(filters):
+    """
+    Returns the filter and sort parameters as a dictionary of request arguments, for url_for.
+    """
+    return {key: ('1' if value is True else value) for key, value in filters._asdict().items() if value is not None}
+
+
+def filter_query(query, filters):
+    """
+    Applies the filters to a SalesItem query.
+    """
+    if filters.vendor is not None:
+        query = query.filter(SalesItem.vendor_name == filters.vendor)
+    if filters.min_price is not None:
+        query = query.filter(SalesItem.price_per_unit >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(SalesItem.price_per_unit < filters.max_price)
+    if filters.in_stock:
+        query = query.filter(SalesItem.units_in_stock - SalesItem.units_reserved > 0)
+    if filters.sort is not None:
+        # keyset pagination cannot seek past NULLs; items without a price/stock are left out of sorted views
+        query = query.filter(SORT_COLUMNS[filters.sort].isnot(None))
+    return query
+
+
+def sort_columns(filters):
+    """
+    Returns the columns the filtered catalog is sorted by, unique in combination (for keyset pagination).
+    """
+    if filters.sort is None:
+        return [SalesItem.id]
+    return [SORT_COLUMNS[filters.sort], SalesItem.id]
+
+
+def price_buckets(boundaries):
+    """
+    Returns the PriceBuckets defined by ascending bucket boundaries, e.g. [10, 50] -> under 10, 10 to 50, 50 and up.
+    """
+    boundaries = sorted(float(boundary) for boundary in boundaries)
+    bounds = [None] + boundaries + [None]
+    buckets = []
+    for number, (low, high) in enumerate(zip(bounds, bounds[1:])):
+        if low is None and high is None:
+            label = "any price"
+        elif low is None:
+            label = f"under {high:g}"
+        elif high is None:
+            label = f"{low:g} and up"
+        else:
+            label = f"{low:g} to {high:g}"
+        buckets.append(PriceBucket(number=number, low=low, high=high, label=label))
+    return buckets
+
+
+def _bucket_sql(row, boundaries):
+    # price bucket number of a row (new/old) as text; '' if the item has no price
+    cases = ' '.join(f"WHEN {row}.price_per_unit < {boundary!r} THEN '{number}'"
+                     for number, boundary in enumerate(boundaries))
+    return f"CASE WHEN {row}.price_per_unit IS NULL THEN '' {cases} ELSE '{len(boundaries)}' END"
+
+
+def _in_stock_sql(row):
+    return f"(coalesce({row}.units_in_stock, 0) - coalesce({row}.units_reserved, 0) > 0)"
+
+
+def _add_sql(row, sign, boundaries):
+    # adds (sign '+') or removes (sign '-') the row to/from the counts of its vendor and price bucket
+    statements = []
+    for facet, value in ((FACET_VENDOR, f"coalesce({row}.vendor_name, '')"), (FACET_PRICE, _bucket_sql(row, boundaries))):
+        statements.append(f"""INSERT INTO catalog_facets(facet, value, item_count, in_stock_count)
+            VALUES ('{facet}', {value}, {sign}1, {sign}{_in_stock_sql(row)})
+            ON CONFLICT(facet, value) DO UPDATE SET item_count = item_count + excluded.item_count,
+                                                    in_stock_count = in_stock_count + excluded.in_stock_count;""")
+    return '\n'.join(statements)
+
+
+def facet_schema(boundaries):
+    """
+    Returns the statements creating the triggers that maintain catalog_facets, for the given price bucket
+    boundaries. An update only touches the counts if it moves the item to another vendor or price bucket,
+    or in or out of stock - most purchases leave them alone.
+    """
+    changed = (f"old.vendor_name IS NOT new.vendor_name "
+               f"OR ({_bucket_sql('old', boundaries)}) IS NOT ({_bucket_sql('new', boundaries)}) "
+               f"OR {_in_stock_sql('old')} IS NOT {_in_stock_sql('new')}")
+    return [
+        f"""CREATE TRIGGER catalog_facets_after_insert AFTER INSERT ON sales_items BEGIN
+            {_add_sql('new', '+', boundaries)}
+        END""",
+        f"""CREATE TRIGGER catalog_facets_after_delete AFTER DELETE ON sales_items BEGIN
+            {_add_sql('old', '-', boundaries)}
+        END""",
+        f"""CREATE TRIGGER catalog_facets_after_update
+            AFTER UPDATE OF vendor_name, price_per_unit, units_in_stock, units_reserved ON sales_items
+            WHEN {changed} BEGIN
+            {_add_sql('old', '-', boundaries)}
+            {_add_sql('new', '+', boundaries)}
+        END""",
+    ]
+
+
+def facet_rebuild(boundaries):
+    """
+    Returns the statements (re)building the facets for the given price bucket boundaries: the triggers, the counts
+    computed from sales_items, and the boundaries in catalog_facet_settings. Used by migration f3b7d92a6c15 and,
+    when CATALOG_PRICE_BUCKETS changes, at startup.
+    """
+    boundaries = sorted(float(boundary) for boundary in boundaries)
+    statements = [f"DROP TRIGGER IF EXISTS {trigger}" for trigger in FACET_TRIGGERS]
+    statements += facet_schema(boundaries)
+    statements.append("DELETE FROM catalog_facets")
+    for facet, value in ((FACET_VENDOR, "coalesce(sales_items.vendor_name, '')"),
+                         (FACET_PRICE, _bucket_sql('sales_items', boundaries))):
+        statements.append(f"""INSERT INTO catalog_facets(facet, value, item_count, in_stock_count)
+            SELECT '{facet}', {value}, count(*), coalesce(sum({_in_stock_sql('sales_items')}), 0)
+            FROM sales_items GROUP BY 2""")
+    statements.append(f"""INSERT INTO catalog_facet_settings(id, price_buckets) VALUES (1, '{json.dumps(boundaries)}')
+        ON CONFLICT(id) DO UPDATE SET price_buckets = excluded.price_buckets""")
+    return statements
+
+
+class CatalogFacets:
+    """
+    Facet counts of the catalog: number of items per vendor and per price bucket (CATALOG_PRICE_BUCKETS),
+    in total and in stock.
+
+    On SQLite the counts are kept in the catalog_facets table and maintained incrementally by triggers on
+    sales_items, so they follow sync updates, deletions and purchases (including set-based statements) without
+    a GROUP BY per request. The triggers and initial counts are created by migration f3b7d92a6c15; they are only
+    rebuilt at startup when CATALOG_PRICE_BUCKETS differs from the boundaries they were built with (or were never
+    built, e.g. after create_all).
+
+    On other databases the counts are computed with GROUP BY.
+
+    Either way the counts are cached for PAGINATION_COUNT_TTL_SECONDS, and dropped by invalidate() when items
+    change (sync updates, deletions, purchases), alongside the catalog cache. Like the catalog cache, invalidation
+    only reaches the current worker process.
+
+    Usage:
+        vendors, prices = catalog_facets.counts(in_stock=True)
+    """
+
+    def __init__(self):
+        self.boundaries = []
+        self.buckets = price_buckets([])
+        self.use_triggers = False
+        self._counts = TTLCache(max_entries=4)
+
+    def init_app(self, app):
+        """
+        Rebuilds the triggers and counts if the bucket boundaries changed. To be called within an app context,
+        after the tables exist.
+        """
+        self.boundaries = sorted(float(boundary) for boundary in app.config.get('CATALOG_PRICE_BUCKETS', []))
+        self.buckets = price_buckets(self.boundaries)
+        self._counts.configure(ttl_seconds=app.config.get('PAGINATION_COUNT_TTL_SECONDS', 60))
+        self._counts.clear()
+        self.use_triggers = db.engine.dialect.name == 'sqlite'
+        if self.use_triggers and self._built_boundaries() != self.boundaries:
+            app.logger.info(f"Rebuilding the catalog facets for price buckets {self.boundaries}")
+            for statement in facet_rebuild(self.boundaries):
+                db.session.execute(text(statement))
+            db.session.commit()
+
+    def _built_boundaries(self):
+        # the boundaries the triggers and counts were built with; None if not built
+        with use_primary():
+            settings = db.session.get(CatalogFacetSettings, 1)
+        return json.loads(settings.price_buckets) if settings else None
+
+    def _grouped_counts(self):
+        # the counts computed from sales_items, as [(facet, value, item count, in stock count)]
+        in_stock = case((SalesItem.units_in_stock - SalesItem.units_reserved > 0, 1), else_=0)
+        price_bucket = case(*((SalesItem.price_per_unit < boundary, str(number))
+                              for number, boundary in enumerate(self.boundaries)),
+                            else_=str(len(self.boundaries)))
+        price_bucket = case((SalesItem.price_per_unit.is_(None), ''), else_=price_bucket)
+        counts = []
+        for facet, value in ((FACET_VENDOR, func.coalesce(SalesItem.vendor_name, '')), (FACET_PRICE, price_bucket)):
+            counts += [(facet, row[0], row[1], row[2] or 0) for row in
+                       db.session.execute(select(value, func.count(), func.sum(in_stock)).group_by(value))]
+        return counts
+
+    def counts(self, in_stock=False):
+        """
+        Returns the facet values with their item counts (in stock only, if in_stock), as two lists of FacetValues:
+        vendors (by name) and price buckets (ascending). Values without items are left out.
+        """
+        rows = self._counts.get('counts')
+        if rows is None:
+            if self.use_triggers:
+                with use_primary():     # maintained by triggers of the primary
+                    rows = [(facet.facet, facet.value, facet.item_count, facet.in_stock_count)
+                            for facet in CatalogFacet.query]
+            else:
+                rows = self._grouped_counts()
+            self._counts.set('counts', rows)
+
+        vendors, prices = [], {}
+        for facet, value, item_count, in_stock_count in rows:
+            count = in_stock_count if in_stock else item_count
+            if count <= 0 or value == '':
+                continue
+            if facet == FACET_VENDOR:
+                vendors.append(FacetValue(value=value, label=value, count=count, low=None, high=None))
+            elif facet == FACET_PRICE and value.isdigit() and int(value) < len(self.buckets):
+                bucket = self.buckets[int(value)]
+                prices[bucket.number] = FacetValue(value=value, label=bucket.label, count=count,
+                                                   low=bucket.low, high=bucket.high)
+        return sorted(vendors, key=lambda vendor: vendor.value.lower()), [prices[number] for number in sorted(prices)]
+
+    def invalidate(self):
+        """
+        Drops the cached counts. To be used when items are added, removed or change price, vendor or stock.
+        """
+        self._counts.clear()
+
+
+# facet counts of the catalog; configured from the app config in create_app
+catalog_facets = CatalogFacets()
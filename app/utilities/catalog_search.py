@@ -0,0 +1,211 @@
+# full-text search over the catalog (SalesItem code, name, description and vendor name)
+
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from sqlalchemy import select, text
+from app import db
+from app.models import SalesItem
+
+FTS_TABLE = 'sales_items_fts'
+SEARCH_FIELDS = ('code', 'name', 'description', 'vendor_name')
+FIELD_WEIGHTS = {'code': 10.0, 'name': 5.0, 'description': 1.0, 'vendor_name': 2.0}    # relevance of a match per field
+MAX_QUERY_TERMS = 8
+FTS_OPERATORS = ('AND', 'OR', 'NOT', 'NEAR')     # FTS5 query syntax; not search terms when written in upper case
+
+# FTS5 external-content table over sales_items, kept in sync by triggers: the index follows every INSERT, DELETE
+# and UPDATE of the searchable columns, including set-based statements that bypass the ORM.
+# Stock updates (purchases) do not touch the searchable columns and leave the index alone.
+# Applied by migration e5a90c7d31b8 (for migrated databases) and in create_app (for create_all).
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        code, name, description, vendor_name,
+        content='sales_items', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_after_insert AFTER INSERT ON sales_items BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, code, name, description, vendor_name)
+        VALUES (new.id, new.code, new.name, new.description, new.vendor_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_after_delete AFTER DELETE ON sales_items BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, name, description, vendor_name)
+        VALUES ('delete', old.id, old.code, old.name, old.description, old.vendor_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_after_update AFTER UPDATE OF code, name, description, vendor_name
+        ON sales_items BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, name, description, vendor_name)
+        VALUES ('delete', old.id, old.code, old.name, old.description, old.vendor_name);
+        INSERT INTO {FTS_TABLE}(rowid, code, name, description, vendor_name)
+        VALUES (new.id, new.code, new.name, new.description, new.vendor_name);
+    END""",
+]
+
+
+def search_terms(query_text):
+    """
+    Splits a search query into lower-case terms without diacritics; punctuation separates terms.
+    Query syntax is not interpreted: quotes, brackets and the like are ignored, and so are FTS_OPERATORS in upper case
+    and column filters ('name:'), so 'NEAR(blue mug)' searches for blue and mug. At most MAX_QUERY_TERMS terms are used.
+    """
+    query_text = re.sub(r'\b(?:' + '|'.join(SEARCH_FIELDS) + r')\s*:', ' ', str(query_text or ''))
+    words = re.findall(r'\w+', query_text)
+    return [term for word in words if word not in FTS_OPERATORS for term in tokenize(word)][:MAX_QUERY_TERMS]
+
+
+def tokenize(value):
+    # same folding as the unicode61 tokenizer with remove_diacritics
+    value = unicodedata.normalize('NFKD', str(value or '').lower())
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return re.findall(r'\w+', value)
+
+
+class _InvertedIndex:
+    """
+    In-process inverted index of the catalog: term -> {item id: weight}, with the terms kept sorted for prefix
+    lookups. Built from the database in one pass.
+    """
+
+    def __init__(self, rows):
+        postings = {}
+        for row in rows:
+            for field in SEARCH_FIELDS:
+                for term in tokenize(getattr(row, field)):
+                    item_weights = postings.setdefault(term, {})
+                    item_weights[row.id] = item_weights.get(row.id, 0.0) + FIELD_WEIGHTS[field]
+        self.postings = postings
+        self.terms = sorted(postings)
+        self.number_of_items = len({item_id for item_weights in postings.values() for item_id in item_weights})
+
+    def _prefix_matches(self, prefix):
+        # {item id: weight} of all terms starting with the prefix, the best weight per item
+        matches = {}
+        position = bisect.bisect_left(self.terms, prefix)
+        while position < len(self.terms) and self.terms[position].startswith(prefix):
+            for item_id, weight in self.postings[self.terms[position]].items():
+                if weight > matches.get(item_id, 0.0):
+                    matches[item_id] = weight
+            position += 1
+        return matches
+
+    def search(self, terms):
+        """
+        Returns the ids of the items matching all terms (as prefixes), best match first.
+        """
+        scores = None
+        for term in terms:
+            matches = self._prefix_matches(term)
+            idf = math.log(1 + self.number_of_items / (1 + len(matches)))
+            if scores is None:
+                scores = {item_id: weight * idf for item_id, weight in matches.items()}
+            else:
+                scores = {item_id: score + matches[item_id] * idf for item_id, score in scores.items()
+                          if item_id in matches}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda item_id: (-scores[item_id], item_id))
+
+
+class CatalogSearch:
+    """
+    Ranked full-text search over the catalog, with prefix matching of each term; all terms must match.
+
+    On SQLite with FTS5 (SEARCH_BACKEND 'auto' or 'fts5'), the search runs on the FTS5 table sales_items_fts,
+    kept in sync with sales_items by triggers, and results are ranked with bm25 weighted by FIELD_WEIGHTS.
+
+    Otherwise (SEARCH_BACKEND 'memory', or no FTS5), an in-process inverted index is used. It is built on the first
+    search and rebuilt after invalidate(), which must be called whenever items are added, changed or deleted.
+    Each worker process has its own index; SEARCH_INDEX_TTL_SECONDS bounds how stale the index of other workers
+    can get.
+
+    Usage:
+        items, has_more = catalog_search.search("blue mug", page=1, per_page=10)
+    """
+
+    def __init__(self):
+        self.backend = 'memory'
+        self.ttl_seconds = 300
+        self._index = None
+        self._index_built_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Chooses the search backend and, for FTS5, creates the search table and its triggers if missing.
+        To be called within an app context, after the tables are created.
+        """
+        self.ttl_seconds = app.config.get('SEARCH_INDEX_TTL_SECONDS', 300)
+        self.invalidate()
+
+        backend = app.config.get('SEARCH_BACKEND', 'auto')
+        if backend not in ('auto', 'fts5', 'memory'):
+            raise ValueError(f"SEARCH_BACKEND must be one of auto, fts5, memory, not {backend!r}")
+        self.backend = 'memory'
+        if backend != 'memory' and db.engine.dialect.name == 'sqlite':
+            try:
+                self._create_fts_schema()
+                self.backend = 'fts5'
+            except Exception as e:
+                db.session.rollback()
+                if backend == 'fts5':
+                    raise
+                app.logger.warning(f"FTS5 not available, catalog search uses an in-process index: {e}")
+        app.logger.info(f"Catalog search backend: {self.backend}")
+
+    def _create_fts_schema(self):
+        exists = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                    {'name': FTS_TABLE}).first() is not None
+        for statement in FTS_SCHEMA:
+            db.session.execute(text(statement))
+        if not exists:
+            # index the items already in the table
+            db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        db.session.commit()
+
+    def invalidate(self):
+        """
+        Drops the in-process index; it is rebuilt on the next search. Not needed with FTS5.
+        """
+        with self._lock:
+            self._index = None
+
+    def search(self, query_text, page=1, per_page=10):
+        """
+        Returns the SalesItems of a page of search results, best match first, and whether there are more results.
+        A query without terms returns no results.
+        """
+        terms = search_terms(query_text)
+        if not terms or page < 1:
+            return [], False
+
+        offset = (page - 1) * per_page
+        if self.backend == 'fts5':
+            item_ids = self._search_fts(terms, per_page + 1, offset)
+        else:
+            item_ids = self._memory_index().search(terms)[offset:offset + per_page + 1]
+
+        has_more = len(item_ids) > per_page
+        item_ids = item_ids[:per_page]
+        items = {item.id: item for item in SalesItem.query.filter(SalesItem.id.in_(item_ids))} if item_ids else {}
+        return [items[item_id] for item_id in item_ids if item_id in items], has_more
+
+    def _search_fts(self, terms, limit, offset):
+        # each term is quoted (no FTS5 query syntax from user input) and matched as a prefix; terms are ANDed
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in SEARCH_FIELDS)
+        return db.session.execute(text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+                                       f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT :limit OFFSET :offset"),
+                                  {'match': match, 'limit': limit, 'offset': offset}).scalars().all()
+
+    def _memory_index(self):
+        with self._lock:
+            if self._index is None or time.monotonic() - self._index_built_at > self.ttl_seconds:
+                rows = db.session.execute(select(SalesItem.id, *(getattr(SalesItem, field) for field in SEARCH_FIELDS))
+                                          .execution_options(yield_per=5000))
+                self._index = _InvertedIndex(rows)
+                self._index_built_at = time.monotonic()
+            return self._index
+
+
+# catalog full-text search; configured from the app config in create_app
+catalog_search = CatalogSearch()
@@ -0,0 +1,145 @@
+# database connection pool: sizing from the app config and checkout metrics
+
+import collections
+import statistics
+import threading
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+WAIT_SAMPLE_SIZE = 1000      # number of recent checkout waits kept for the percentiles
+
+
+class PoolStats:
+    """
+    Thread-safe checkout counters of a connection pool, local to the worker process.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.overflow_events = 0        # checkouts that opened a connection beyond the pool size
+        self.peak_checked_out = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._recent_waits = collections.deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait_seconds, checked_out, overflowed):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self._recent_waits.append(wait_seconds)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, wait_seconds):
+        with self._lock:
+            self.timeouts += 1
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def as_dict(self):
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            return {'checkouts': self.checkouts,
+                    'timeouts': self.timeouts,
+                    'overflow_events': self.overflow_events,
+                    'peak_checked_out': self.peak_checked_out,
+                    'wait_ms_avg': round(self.total_wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    'wait_ms_p50': round(statistics.median(waits) * 1000, 3) if waits else 0.0,
+                    'wait_ms_p99': round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 3) if waits else 0.0,
+                    'wait_ms_max': round(self.max_wait_seconds * 1000, 3)}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording the time each checkout waits for a connection - either for a free pooled connection,
+    or for a new connection to be opened - plus timeouts and checkouts that opened an overflow connection.
+    The time of pre-ping and of the queries themselves is not included, so the wait times show pool starvation.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        self.stats.record_checkout(time.perf_counter() - start, self.checkedout(),
+                                   overflowed=self._overflow > max(overflow_before, 0))
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; the counters carry over
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _uses_queue_pool(url):
+    # in-memory SQLite databases use a StaticPool (see flask_sqlalchemy), which takes no sizing options
+    url = make_url(url)
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+
+def pool_options(config, url):
+    """
+    Returns the engine options for the connection pool of a database URL, from the SQLALCHEMY_POOL_* keys
+    of the app config. Keys set to None are left at the SQLAlchemy default.
+    """
+    if not _uses_queue_pool(url):
+        return {}
+
+    options = {'poolclass': InstrumentedQueuePool if config.get('SQLALCHEMY_POOL_METRICS', True) else QueuePool}
+    for key, option in (('SQLALCHEMY_POOL_SIZE', 'pool_size'),
+                        ('SQLALCHEMY_MAX_OVERFLOW', 'max_overflow'),
+                        ('SQLALCHEMY_POOL_TIMEOUT', 'pool_timeout'),
+                        ('SQLALCHEMY_POOL_RECYCLE', 'pool_recycle'),
+                        ('SQLALCHEMY_POOL_PRE_PING', 'pool_pre_ping')):
+        if config.get(key) is not None:
+            options[option] = config[key]
+    return options
+
+
+def configure_pools(config):
+    """
+    Adds the pool options (see pool_options) to the engine options of the database and of all binds.
+    Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS or in a bind take precedence.
+    To be called before db.init_app.
+    """
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**pool_options(config, config['SQLALCHEMY_DATABASE_URI']),
+                                           **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})}
+    binds = {}
+    for key, bind in (config.get('SQLALCHEMY_BINDS') or {}).items():
+        bind = bind if isinstance(bind, dict) else {'url': bind}
+        binds[key] = {**pool_options(config, bind['url']), **bind}
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def pool_metrics(engines):
+    """
+    Returns the state and checkout metrics of the connection pools, by bind key ('default' for the database).
+    """
+    metrics = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        pool_state = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            pool_state.update({'size': pool.size(),
+                                 'checked_out': pool.checkedout(),
+                                 'checked_in': pool.checkedin(),
+                                 'overflow': max(pool.overflow(), 0),
+                                 'max_overflow': pool._max_overflow,
+                                 'timeout_seconds': pool.timeout()})
+        if isinstance(pool, InstrumentedQueuePool):
+            pool_state.update(pool.stats.as_dict())
+        metrics[key or 'default'] = pool_state
+    return metrics
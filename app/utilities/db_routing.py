@@ -0,0 +1,171 @@
+# read/write routing of database sessions between the primary database and read replicas
+
+import random
+import time
+from contextlib import ContextDecorator
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND_PREFIX = 'replica_'
+REPLICA_KEYS_EXTENSION = 'db_replica_keys'      # app.extensions entry: bind keys of the replicas in use
+PRIMARY_UNTIL_SESSION_KEY = 'db_primary_until'
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_binds(replica_uris):
+    """
+    Returns the SQLALCHEMY_BINDS entries of the read replicas: {'replica_0': uri, ...}.
+    """
+    return {f"{REPLICA_BIND_PREFIX}{number}": uri for number, uri in enumerate(replica_uris)}
+
+
+class use_primary(ContextDecorator):
+    """
+    Sends all queries of the block (or decorated view) to the primary database, e.g. in GET views that write
+    or that must see the latest committed data.
+
+    Usage:
+        @bp.route(...)
+        @use_primary()
+        def view(): ...
+
+        with use_primary():
+            purchases = Purchases.query.filter(...)
+    """
+
+    def __enter__(self):
+        if has_app_context():
+            self._previous = g.get('db_use_primary', False)
+            g.db_use_primary = True
+        return self
+
+    def __exit__(self, *exc_info):
+        if has_app_context():
+            g.db_use_primary = self._previous
+        return False
+
+
+def _note_write():
+    # the request has written to the primary: its further reads go there as well
+    if has_app_context():
+        g.db_wrote = True
+
+
+def _replica_key():
+    """
+    Returns the bind key of the replica to read from in the current request, or None if the primary must be used:
+    outside requests, in requests that may write (POST etc.), after a write and within use_primary().
+    The replica is chosen at random once per request, among the replicas in use (see check_replica_schemas).
+    """
+    if not has_request_context() or request.method not in READ_ONLY_METHODS:
+        return None
+    if g.get('db_use_primary') or g.get('db_wrote'):
+        return None
+    replica_keys = current_app.extensions.get(REPLICA_KEYS_EXTENSION)
+    if not replica_keys:
+        return None
+    if 'db_replica_key' not in g:
+        g.db_replica_key = random.choice(replica_keys)
+    return g.db_replica_key
+
+
+class RoutingSession(Session):
+    """
+    Session routing reads of read-only requests (GET, HEAD, OPTIONS) to a read replica, and everything else -
+    writes (flushes and INSERT/UPDATE/DELETE statements), reads of other requests, and background work outside
+    requests - to the primary database. Replicas are the binds named replica_<n> (see replica_binds).
+
+    Read-your-writes: once a request has written, its further reads go to the primary, and init_db_routing
+    keeps the following requests of the same browser session on the primary for REPLICA_STICKY_SECONDS.
+
+    Textual SQL (text() statements, e.g. FTS5 MATCH queries and statements on tables maintained by triggers)
+    always goes to the primary: its tables may not exist on the replicas, and other than a query it may write.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        if bind is not None or engine is not engines.get(None):
+            # explicit bind, or a model of another bind key
+            return engine
+
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            _note_write()
+            return engine
+        if isinstance(clause, TextClause):
+            if not clause.text.lstrip().upper().startswith(('SELECT', 'WITH')):
+                _note_write()
+            return engine
+
+        replica_key = _replica_key()
+        return engines[replica_key] if replica_key else engine
+
+
+def _schema_version(engine):
+    # tables of a database and its migration revision (None if not managed by migrations)
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+        revision = None
+        if 'alembic_version' in tables:
+            revision = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    return tables, revision
+
+
+def check_replica_schemas(app, engines):
+    """
+    Compares the schema of each read replica with the primary database, and takes the replicas that differ out
+    of routing: replicas missing tables of the primary (e.g. the search or facet tables created at startup) or at
+    another migration revision would fail or misanswer the reads sent to them. Replicas get their schema by
+    replication from the primary, migrations are run on the primary only (flask db upgrade).
+    To be called within an app context, once the schema of the primary is complete.
+
+    Args:
+        app: the Flask app.
+        engines: the engines by bind key (db.engines).
+    """
+    replica_keys = app.extensions.get(REPLICA_KEYS_EXTENSION)
+    if not replica_keys:
+        return
+
+    primary_tables, primary_revision = _schema_version(engines[None])
+    replicas_in_use = []
+    for replica_key in replica_keys:
+        try:
+            tables, revision = _schema_version(engines[replica_key])
+        except SQLAlchemyError as e:
+            app.logger.error(f"Read replica {replica_key} is not used, its schema could not be read: {e}")
+            continue
+        missing_tables = primary_tables - tables
+        if missing_tables or revision != primary_revision:
+            app.logger.error(f"Read replica {replica_key} is not used, its schema differs from the primary: "
+                             f"revision {revision} instead of {primary_revision}, "
+                             f"missing tables: {', '.join(sorted(missing_tables)) or 'none'}")
+            continue
+        replicas_in_use.append(replica_key)
+    app.extensions[REPLICA_KEYS_EXTENSION] = replicas_in_use
+
+
+def init_db_routing(app):
+    """
+    Sets up read-your-writes stickiness for the browser session if read replicas are configured.
+    """
+    app.extensions[REPLICA_KEYS_EXTENSION] = [key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                                              if key and key.startswith(REPLICA_BIND_PREFIX)]
+    if not app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        return
+
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+    @app.before_request
+    def route_recent_writers_to_primary():
+        if session.get(PRIMARY_UNTIL_SESSION_KEY, 0) > time.time():
+            g.db_use_primary = True
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote'):
+            session[PRIMARY_UNTIL_SESSION_KEY] = time.time() + sticky_seconds
+        return response
@@ -0,0 +1,204 @@
+# compression of API request and response bodies (Content-Encoding / Accept-Encoding)
+# warehouse sync payloads are large JSON documents with repeated keys, they shrink 5-20 times with gzip or zstd.
+
+import io
+import zlib
+from flask import current_app, request, jsonify
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+try:
+    import zstandard            # optional: adds the 'zstd' content coding
+except ImportError:
+    zstandard = None
+
+READ_SIZE = 64 * 1024
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_ZLIB_WBITS = zlib.MAX_WBITS
+
+
+class InvalidContentEncoding(BadRequest):
+    """
+    Raised while reading a compressed request body that cannot be decompressed.
+    """
+    description = "The request body is not valid for its Content-Encoding."
+
+
+class DecompressedBodyTooLarge(RequestEntityTooLarge):
+    """
+    Raised while reading a compressed request body that expands beyond API_MAX_DECOMPRESSED_BYTES.
+    """
+    description = "The decompressed request body exceeds the size limit."
+
+
+def supported_encodings():
+    """
+    Returns the content codings understood in both directions, in order of preference.
+    """
+    return ['zstd', 'gzip', 'deflate'] if zstandard is not None else ['gzip', 'deflate']
+
+
+class _ZlibReader(io.RawIOBase):
+    """
+    Decompresses a gzip or deflate stream incrementally; a read never expands more than the bytes asked for,
+    so a small body cannot blow up in memory. 'deflate' is zlib-wrapped per RFC 9110, raw deflate is accepted too.
+    """
+
+    def __init__(self, stream, wbits):
+        self._stream = stream
+        self._wbits = wbits
+        self._decompressor = zlib.decompressobj(wbits)
+        self._started = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = b''
+        while not data:
+            if self._decompressor.unconsumed_tail:
+                compressed = self._decompressor.unconsumed_tail
+            elif self._decompressor.eof:
+                return 0
+            else:
+                compressed = self._stream.read(READ_SIZE)
+                if not compressed:
+                    raise InvalidContentEncoding("The compressed request body is truncated.")
+            data = self._decompress(compressed, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _decompress(self, compressed, max_length):
+        try:
+            data = self._decompressor.decompress(compressed, max_length)
+        except zlib.error:
+            if self._started or self._wbits != _ZLIB_WBITS:
+                raise
+            # no zlib header: raw deflate, as sent by some clients
+            self._wbits = -zlib.MAX_WBITS
+            self._decompressor = zlib.decompressobj(self._wbits)
+            data = self._decompressor.decompress(compressed, max_length)
+        self._started = True
+        return data
+
+
+class _CheckedStream(io.RawIOBase):
+    """
+    Reads from a decompressing reader, enforcing the size limit of the decompressed body and reporting
+    corrupt data as 400 Bad Request.
+    """
+
+    def __init__(self, reader, max_size):
+        self._reader = reader
+        self._max_size = max_size
+        self.size = 0
+        self._errors = (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            number_read = self._reader.readinto(buffer)
+        except self._errors as e:
+            raise InvalidContentEncoding(f"The request body could not be decompressed: {e}")
+        self.size += number_read
+        if self._max_size is not None and self.size > self._max_size:
+            raise DecompressedBodyTooLarge()
+        return number_read
+
+
+def _decompressing_reader(stream, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_size=READ_SIZE)
+    return _ZlibReader(stream, _GZIP_WBITS if encoding in ('gzip', 'x-gzip') else _ZLIB_WBITS)
+
+
+def decompress_request():
+    """
+    before_request hook: if the request body has a Content-Encoding (gzip, deflate, zstd if available), replaces
+    the input stream with one decompressing on the fly, so request.stream, request.get_data() and request.get_json()
+    return the decoded body. Streaming consumers keep their constant memory use.
+    The decompressed size is limited to API_MAX_DECOMPRESSED_BYTES (413 Request Entity Too Large when exceeded,
+    detected while the body is read).
+
+    Returns:
+        None, or an error response (415 Unsupported Media Type) for a content coding that is not supported.
+    """
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if not encoding or encoding == 'identity' or not current_app.config.get('API_COMPRESSION', True):
+        return None
+
+    if encoding not in supported_encodings() + ['x-gzip']:
+        current_app.logger.error(f"Unsupported Content-Encoding of request body: {encoding}")
+        response = jsonify({'error': f"Unsupported Content-Encoding: {encoding}"})
+        response.headers['Accept-Encoding'] = ', '.join(supported_encodings())
+        return response, 415
+
+    source = request.stream         # the raw body, bounded by Content-Length
+    checked_stream = _CheckedStream(_decompressing_reader(source, encoding),
+                                    current_app.config.get('API_MAX_DECOMPRESSED_BYTES'))
+    environ = request.environ
+    environ['wsgi.input'] = io.BufferedReader(checked_stream, buffer_size=READ_SIZE)
+    environ['wsgi.input_terminated'] = True         # read to the end of the decompressed stream
+    environ.pop('CONTENT_LENGTH', None)
+    environ.pop('HTTP_CONTENT_ENCODING', None)
+    request.__dict__.pop('stream', None)            # drop the cached raw stream
+    return None
+
+
+def _compressor(encoding):
+    config = current_app.config
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=config.get('API_ZSTD_LEVEL', 3)).compressobj()
+    return zlib.compressobj(config.get('API_GZIP_LEVEL', 6), zlib.DEFLATED,
+                            _GZIP_WBITS if encoding == 'gzip' else _ZLIB_WBITS)
+
+
+def _flush_block(compressor, encoding):
+    # emits everything compressed so far, so that a streaming client can decode each chunk as it arrives
+    if encoding == 'zstd':
+        return compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _compressed_chunks(chunks, compressor, encoding):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + _flush_block(compressor, encoding)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    after_request hook: compresses the response body with the best content coding the client accepts
+    (Accept-Encoding; zstd, gzip or deflate), if it is at least API_COMPRESSION_MIN_BYTES long.
+    Streamed responses are compressed chunk by chunk and stay streamed.
+    """
+    if not current_app.config.get('API_COMPRESSION', True) or request.method == 'HEAD' \
+            or response.status_code < 200 or response.status_code in (204, 206, 304) \
+            or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return response
+
+    compressor = _compressor(encoding)
+    if response.is_streamed:
+        response.response = _compressed_chunks(response.response, compressor, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get('API_COMPRESSION_MIN_BYTES', 1024):
+            return response
+        response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,67 @@
+# idempotency keys: repeated submissions of a request return the result of the first one
+
+import json
+import re
+import uuid
+from datetime import datetime, timedelta
+from flask import request
+from sqlalchemy import delete, select
+from app import db
+from app.models import IdempotencyKey
+
+IDEMPOTENCY_KEY_FIELD = 'idempotency_key'       # name of the hidden form field
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+VALID_KEY = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def new_idempotency_key():
+    """
+    Returns a new key, to be rendered into a form that submits a non-repeatable request.
+    """
+    return uuid.uuid4().hex
+
+
+def request_idempotency_key():
+    """
+    Returns the idempotency key of the current request (form field or header), or None if there is no valid key.
+    """
+    key = request.form.get(IDEMPOTENCY_KEY_FIELD) or request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key and VALID_KEY.match(key):
+        return key
+    return None
+
+
+def find_result(user_id, key):
+    """
+    Returns the stored result (a dictionary) of the request of user_id with the given key, or None.
+    """
+    result = db.session.execute(select(IdempotencyKey.result)
+                                .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)).scalar_one_or_none()
+    return json.loads(result) if result is not None else None
+
+
+def record_result(user_id, key, result):
+    """
+    Stores the result (a JSON serializable dictionary) of a request under its key. Adds the record to the session
+    without committing, so it is written in the transaction of the request's changes. A concurrent request with
+    the same key makes that commit fail with an IntegrityError on the unique (user_id, key) constraint.
+    """
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, result=json.dumps(result)))
+
+
+def purge_expired_keys(max_age_seconds):
+    """
+    Deletes the keys older than max_age_seconds.
+
+    Returns:
+        int: number of keys deleted.
+    """
+    try:
+        purged = db.session.execute(delete(IdempotencyKey)
+                                    .where(IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=max_age_seconds))
+                                    .execution_options(synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return purged.rowcount
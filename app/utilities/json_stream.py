@@ -0,0 +1,161 @@
+# incremental JSON reader used by data sync
+# parses a top-level JSON object from a byte stream, array values are returned element by element,
+# so that large warehouse payloads never have to be held in memory all at once.
+
+import codecs
+import json
+import re
+
+# event types produced by iter_json_object()
+ARRAY_START = 'array_start'     # (ARRAY_START, key, None) - the value of key is an array, elements follow
+ARRAY_ITEM = 'array_item'       # (ARRAY_ITEM, key, element) - one element of the array under key
+ARRAY_END = 'array_end'         # (ARRAY_END, key, number of elements) - the array under key is complete
+VALUE = 'value'                 # (VALUE, key, value) - the value of key is not an array, returned in full
+
+DEFAULT_READ_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_TAIL = re.compile(r'[0-9eE.+-]*\Z')    # rest of the buffer could still be part of a number
+
+
+class JSONStreamError(ValueError):
+    """
+    Raised when the stream does not contain the expected JSON structure.
+    """
+    pass
+
+
+class _StreamBuffer:
+    """
+    Holds the not yet parsed part of the stream as text and reads more from the stream on demand.
+    """
+    def __init__(self, stream, read_size, max_value_size=None):
+        self._stream = stream
+        self._read_size = read_size
+        self._max_value_size = max_value_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, read_size=None):
+        """
+        Append the next chunk of the stream (read_size bytes, default: the read size of the buffer) to the buffer,
+        dropping the part already parsed.
+        Returns False if the stream is exhausted.
+        """
+        if self.eof:
+            return False
+        chunk = self._stream.read(read_size or self._read_size)
+        if not chunk:
+            self.eof = True
+        self.text = self.text[self.pos:] + self._decoder.decode(chunk or b'', final=self.eof)
+        self.pos = 0
+        return not self.eof or bool(self.text)
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character without consuming it, '' at the end of the stream.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, *characters):
+        """
+        Consume the next non-whitespace character, which must be one of the characters given.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise JSONStreamError(f"Expected one of {characters} at offset {self.pos}, found {character!r}")
+        self.pos += 1
+        return character
+
+    def _check_value_size(self, length):
+        # the value at the current position is at least length characters long
+        if self._max_value_size and length > self._max_value_size:
+            raise JSONStreamError(f"JSON value at offset {self.pos} exceeds {self._max_value_size} characters")
+
+    def decode_value(self):
+        """
+        Decode one complete JSON value (object, array, string, number, literal) at the current position.
+        Raises JSONStreamError if the value is longer than the max value size (in characters).
+        """
+        self.peek()
+        read_size = self._read_size
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # the value may continue in the part of the stream not read yet; the chunks read grow, so that
+                # a large value (e.g. a columnar dataset) is not decoded again for every read_size bytes
+                self._check_value_size(len(self.text) - self.pos)
+                if not self.eof and self.fill(read_size):
+                    read_size = min(read_size * 2, self._max_value_size or read_size * 2)
+                    continue
+                raise
+            if isinstance(value, (int, float)) and not self.eof and _NUMBER_TAIL.match(self.text, end) and self.fill():
+                # a number at the end of the buffer may continue in the next chunk
+                continue
+            self._check_value_size(end - self.pos)
+            self.pos = end
+            return value
+
+
+def iter_json_object(stream, read_size=DEFAULT_READ_SIZE, max_value_size=None):
+    """
+    Incrementally parse a JSON object from a binary stream (e.g. flask.request.stream).
+
+    Args:
+        stream: file-like object returning UTF-8 encoded bytes from read(size).
+        read_size: number of bytes to read from the stream at once.
+        max_value_size: max length (characters) of a value returned in one piece (array element or other value),
+            None for no limit. Bounds the memory used by the parser.
+
+    Yields:
+        tuples (event, key, value), see ARRAY_START, ARRAY_ITEM, ARRAY_END and VALUE.
+        Only one array element (plus at most one read chunk) is held in memory at any time.
+
+    Raises:
+        JSONStreamError, json.JSONDecodeError: if the stream is not a well-formed JSON object,
+            or JSONStreamError if a value exceeds max_value_size.
+
+    Usage: for event, key, value in iter_json_object(request.stream): ...
+    """
+    buffer = _StreamBuffer(stream, read_size, max_value_size)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        buffer.pos += 1
+        return
+
+    while True:
+        key = buffer.decode_value()
+        if not isinstance(key, str):
+            raise JSONStreamError(f"Object key expected, found {key!r}")
+        buffer.expect(':')
+
+        if buffer.peek() == '[':
+            buffer.pos += 1
+            yield ARRAY_START, key, None
+            number_of_elements = 0
+            if buffer.peek() == ']':
+                buffer.pos += 1
+            else:
+                while True:
+                    yield ARRAY_ITEM, key, buffer.decode_value()
+                    number_of_elements += 1
+                    if buffer.expect(',', ']') == ']':
+                        break
+            yield ARRAY_END, key, number_of_elements
+        else:
+            yield VALUE, key, buffer.decode_value()
+
+        if buffer.expect(',', '}') == '}':
+            break
+
+    if buffer.peek():
+        raise JSONStreamError(f"Unexpected data after the end of the JSON object at offset {buffer.pos}")
@@ -0,0 +1,170 @@
+# pagination helpers for list views
+# keyset (seek) pagination: pages are located by the sort key of their first/last row instead of an OFFSET,
+# so every page costs the same, and totals come from a cached count instead of a COUNT(*) per request.
+
+import base64
+import json
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import tuple_
+from app.utilities.cache_utilities import TTLCache
+
+PAGINATION_MODE_KEYSET = 'keyset'
+PAGINATION_MODE_OFFSET = 'offset'
+
+# approximate row counts shown with keyset pagination, keyed by count_key; configured from the app config in create_app
+row_count_cache = TTLCache(max_entries=256)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort key values of a row as an opaque URL-safe string.
+    """
+    encoded_values = [{'$dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded_values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor back to the list of sort key values.
+    Each value must be a scalar (string, number, boolean or null) or a {'$dt': ISO timestamp} object.
+
+    Raises:
+        InvalidCursor: if the cursor is malformed, e.g. tampered with.
+    """
+    try:
+        encoded_values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(encoded_values, list):
+            raise InvalidCursor("Invalid cursor")
+        return [_decode_value(value) for value in encoded_values]
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+
+def _decode_value(value):
+    # one sort key value of a cursor; anything else than what encode_cursor produces is rejected
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict) and list(value) == ['$dt'] and isinstance(value['$dt'], str):
+        return datetime.fromisoformat(value['$dt'])
+    raise InvalidCursor(f"Invalid cursor value: {value!r}")
+
+
+class KeysetPagination:
+    """
+    One page of a keyset-paginated query, with the attributes used by the pagination controls:
+    items, has_prev, has_next, prev_cursor, next_cursor and total (approximate, may be None).
+    """
+    keyset = True
+
+    def __init__(self, items, per_page, has_prev, has_next, prev_cursor, next_cursor, total):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+
+def keyset_paginate(query, order_by, per_page, after=None, before=None, descending=False, count_key=None):
+    """
+    Keyset (seek) pagination of a query.
+
+    Args:
+        query: SQLAlchemy query to paginate, without ORDER BY.
+        order_by: list of columns (or column expressions) the rows are sorted by. The combination must be unique,
+                  e.g. [SalesItem.price_per_unit, SalesItem.id], and should be covered by an index.
+        per_page: number of rows per page.
+        after: cursor of the last row of the previous page - returns the page following it.
+        before: cursor of the first row of the next page - returns the page preceding it.
+        descending: sort in descending order.
+        count_key: if given, the approximate total number of rows is taken from a count cached under this key
+                   for PAGINATION_COUNT_TTL_SECONDS.
+
+    Returns:
+        KeysetPagination object.
+
+    Raises:
+        InvalidCursor: if after/before cannot be decoded.
+    """
+    base_query = query
+    sort_key = tuple_(*order_by) if len(order_by) > 1 else order_by[0]
+
+    def key_values(row):
+        return [getattr(row, column.key) for column in order_by]
+
+    def position(cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(order_by):
+            raise InvalidCursor("Invalid cursor")
+        return tuple_(*values) if len(values) > 1 else values[0]
+
+    backwards = before is not None and after is None
+    if backwards:
+        rows = query.filter(sort_key > position(before) if descending else sort_key < position(before)) \
+                    .order_by(*[column.asc() if descending else column.desc() for column in order_by]) \
+                    .limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(sort_key < position(after) if descending else sort_key > position(after))
+        rows = query.order_by(*[column.desc() if descending else column.asc() for column in order_by]) \
+                    .limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    total = None
+    if count_key is not None:
+        total = row_count_cache.get(count_key)
+        if total is None:
+            total = base_query.order_by(None).count()
+            row_count_cache.set(count_key, total)
+
+    return KeysetPagination(items=items,
+                            per_page=per_page,
+                            has_prev=has_prev and bool(items),
+                            has_next=has_next and bool(items),
+                            prev_cursor=encode_cursor(key_values(items[0])) if items else None,
+                            next_cursor=encode_cursor(key_values(items[-1])) if items else None,
+                            total=total)
+
+
+def paginate(query, order_by, per_page, descending=False, count_key=None):
+    """
+    Paginates a query for a list view, using the pagination parameters of the current request and the
+    pagination mode set by PAGINATION_MODE ('keyset' or 'offset').
+
+    In keyset mode the request parameters are 'after' and 'before' (cursors), in offset mode 'page'.
+    With descending, the rows are sorted by order_by in descending order.
+    Both kinds of pagination objects are rendered by the render_pagination macro (pagination.html).
+    """
+    if current_app.config.get('PAGINATION_MODE', PAGINATION_MODE_OFFSET) == PAGINATION_MODE_KEYSET:
+        try:
+            return keyset_paginate(query, order_by, per_page,
+                                   after=request.args.get('after'),
+                                   before=request.args.get('before'),
+                                   descending=descending,
+                                   count_key=count_key)
+        except InvalidCursor:
+            return keyset_paginate(query, order_by, per_page, descending=descending, count_key=count_key)
+
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(*[column.desc() if descending else column for column in order_by]) \
+                .paginate(page=page, per_page=per_page, error_out=False)
+
+
+def pagination_key():
+    """
+    Identifies the requested page (pagination parameters of the current request), e.g. for caching.
+    """
+    return tuple(request.args.get(arg) for arg in ('page', 'after', 'before'))
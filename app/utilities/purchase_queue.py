@@ -0,0 +1,162 @@
+# group commit of purchases: purchases of concurrent requests are committed together in one transaction
+
+import queue
+import threading
+import time
+from app import db
+from app.utilities.purchase_utilities import apply_purchase, make_purchase, PurchaseError
+
+
+class PurchaseTimeout(PurchaseError):
+    """
+    Raised by PurchaseQueue.submit when a purchase is not committed within PURCHASE_QUEUE_TIMEOUT_SECONDS.
+    If made is False, the purchase was withdrawn from the queue and nothing was purchased. If made is None, its
+    batch was being committed: the purchase may still be made, a retry with the same idempotency key is safe.
+    """
+    def __init__(self, made):
+        super().__init__("Purchase not committed in time" + (", withdrawn" if made is False else ""))
+        self.made = made
+
+
+class _PendingPurchase:
+    """
+    A purchase waiting in the queue, with its outcome once its batch is committed.
+    The worker claims it before applying it, unless the waiting request gave up on it before (withdrawn).
+    """
+    def __init__(self, args):
+        self.args = args
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.claimed = False
+        self.withdrawn = False
+        self._lock = threading.Lock()
+
+    def claim(self):
+        # by the worker: True if the purchase is to be applied
+        with self._lock:
+            self.claimed = not self.withdrawn
+            return self.claimed
+
+    def withdraw(self):
+        # by the waiting request: True if the purchase will not be applied
+        with self._lock:
+            self.withdrawn = not self.claimed
+            return self.withdrawn
+
+
+class PurchaseQueue:
+    """
+    Optional group commit of purchases (PURCHASE_GROUP_COMMIT).
+
+    Request threads put their purchase into an in-process queue and wait. A worker thread collects the purchases
+    arriving within PURCHASE_BATCH_WINDOW_MS (up to PURCHASE_BATCH_MAX_SIZE), applies them one after the other
+    in a single transaction and commits once, so a batch costs one commit (one fsync on SQLite) and one write lock
+    instead of one per purchase. The requests are released when their batch is committed, with the result or
+    error of their own purchase - the same as make_purchase returns or raises.
+
+    A purchase that fails (e.g. sold out) writes nothing and does not affect the other purchases of its batch.
+    If the commit of a batch fails, its purchases are retried one transaction each.
+
+    A request waits at most PURCHASE_QUEUE_TIMEOUT_SECONDS for its batch (PurchaseTimeout), and restarts the worker
+    if it has died meanwhile.
+
+    When group commit is disabled, submit() calls make_purchase directly.
+
+    Usage:
+        result = purchase_queue.submit(item_id, user_id, quantity, reservation_id=..., idempotency_key=...)
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.batch_window_seconds = 0.005
+        self.max_batch_size = 100
+        self.timeout_seconds = 30
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PURCHASE_GROUP_COMMIT', False)
+        self.batch_window_seconds = app.config.get('PURCHASE_BATCH_WINDOW_MS', 5) / 1000
+        self.max_batch_size = app.config.get('PURCHASE_BATCH_MAX_SIZE', 100)
+        self.timeout_seconds = app.config.get('PURCHASE_QUEUE_TIMEOUT_SECONDS', 30)
+
+    def submit(self, item_id, user_id, quantity, reservation_id=None, idempotency_key=None):
+        """
+        Purchases units of an item, see make_purchase for arguments, result and exceptions.
+        Blocks until the purchase is committed; raises PurchaseTimeout if this takes longer than timeout_seconds.
+        """
+        if not self.enabled:
+            return make_purchase(item_id, user_id, quantity, reservation_id, idempotency_key)
+
+        pending = _PendingPurchase((item_id, user_id, quantity, reservation_id, idempotency_key))
+        self._start_worker()
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout_seconds):
+            worker_alive = self._worker.is_alive()
+            made = False if pending.withdraw() else None
+            self.app.logger.error(f"Purchase of item {item_id} not committed within {self.timeout_seconds} s "
+                                  f"({'withdrawn' if made is False else 'outcome unknown'}), "
+                                  f"purchase queue worker {'alive' if worker_alive else 'dead, restarting'}")
+            if not worker_alive:
+                self._start_worker()
+            raise PurchaseTimeout(made)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='purchase-queue', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        batch = [pending for pending in batch if pending.claim()]
+        if not batch:
+            return
+        with self.app.app_context():
+            try:
+                for pending in batch:
+                    try:
+                        pending.result = apply_purchase(*pending.args)
+                    except (PurchaseError, ValueError) as e:
+                        pending.error = e
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Group commit of {len(batch)} purchases failed, retrying one by one: {e}")
+                self._commit_one_by_one(batch)
+            finally:
+                db.session.remove()
+                for pending in batch:
+                    pending.done.set()
+
+    def _commit_one_by_one(self, batch):
+        for pending in batch:
+            pending.result, pending.error = None, None
+            try:
+                pending.result = make_purchase(*pending.args)
+            except Exception as e:
+                pending.error = e
+
+
+# purchase group commit; configured from the app config in create_app
+purchase_queue = PurchaseQueue()
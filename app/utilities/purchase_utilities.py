@@ -0,0 +1,365 @@
+# store purchase handling
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import SalesItem, Purchases, StockReservation
+from app.utilities.idempotency import find_result, record_result
+
+
+class PurchaseError(Exception):
+    pass
+
+
+class ItemNotFound(PurchaseError):
+    pass
+
+
+class SoldOut(PurchaseError):
+    """
+    Raised when the available stock of an item (units in stock not held by reservations of other customers)
+    does not cover the requested quantity. units_available holds the available stock at the time of the attempt.
+    """
+    def __init__(self, item_id, quantity, units_available):
+        super().__init__(f"Item {item_id}: {quantity} units requested, {units_available} available")
+        self.item_id = item_id
+        self.quantity = quantity
+        self.units_available = units_available
+
+
+class InsufficientStock(PurchaseError):
+    """
+    Raised by checkout when the stock of some items does not cover the order.
+    shortages maps the ids of these items to their available units (None for items that no longer exist).
+    """
+    def __init__(self, shortages):
+        super().__init__(f"Insufficient stock of items {sorted(shortages)}")
+        self.shortages = shortages
+
+
+class DuplicateRequest(PurchaseError):
+    """
+    Raised when a purchase request repeats an idempotency key that was already used by the user.
+    result holds the result of the original request; nothing is changed.
+    """
+    def __init__(self, result):
+        super().__init__("Duplicate request")
+        self.result = result
+
+
+def _check_duplicate(user_id, idempotency_key):
+    # raises DuplicateRequest if the key was used before
+    if idempotency_key is not None:
+        result = find_result(user_id, idempotency_key)
+        if result is not None:
+            raise DuplicateRequest(result)
+
+
+def _commit_purchase(user_id, idempotency_key):
+    """
+    Commits the purchase in the session, together with its result recorded under the idempotency key (if any).
+    If a concurrent request with the same key committed first, the unique key constraint fails the commit:
+    the purchase is rolled back and DuplicateRequest is raised with the result of the other request.
+    """
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        _check_duplicate(user_id, idempotency_key)
+        raise
+
+
+def _purchase_record(item, user_id, quantity):
+    """
+    Column values of the purchase record of quantity units of item (a SalesItem or a row with its columns).
+    """
+    return dict(salesitem_id=item.id,
+                purchase_code=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S%f")+"_"+item.code,
+                salesitem_code=item.code,
+                salesitem_name=item.name,
+                salesitem_vendor_name=item.vendor_name,
+                user_id=user_id,
+                quantity=quantity,
+                salesitem_item_base_price=item.price_per_unit,
+                salesitem_purchase_price=item.price_per_unit,
+                total_price=item.price_per_unit * quantity)
+
+
+def _units_available(item_id):
+    # available units of an item, None if there is no such item
+    return db.session.execute(select(SalesItem.units_in_stock - SalesItem.units_reserved)
+                              .where(SalesItem.id == item_id)).scalar_one_or_none()
+
+
+def make_purchase(item_id, user_id, quantity, reservation_id=None, idempotency_key=None):
+    """
+    Purchases units of a sales item and records the purchase, in one transaction.
+
+    The stock is decremented with a conditional UPDATE (... WHERE id = :id AND units_in_stock - units_reserved >= :quantity),
+    so concurrent purchases of the same item are serialized by the database and can not oversell: the UPDATE
+    of a purchase that is no longer covered by the available stock matches no row.
+
+    If the customer holds an active reservation of the item for the same quantity (see reserve_stock), it is
+    consumed, so the purchase is covered by the held units. An expired or unknown reservation is ignored and the
+    purchase is made from the available stock.
+
+    Args:
+        item_id: id of the SalesItem.
+        user_id: id of the purchasing user.
+        quantity: number of units, a positive integer.
+        reservation_id: id of the StockReservation made at purchase verification, optional.
+        idempotency_key: key of the request supplied by the client, optional. A repeated request with the same
+                         key is not executed again.
+
+    Returns:
+        dict: result of the purchase - purchase code, number of purchases (1) and total price.
+
+    Raises:
+        ValueError: if quantity is not a positive integer.
+        ItemNotFound: if there is no such item.
+        SoldOut: if the item does not have enough units available. Nothing is changed.
+        DuplicateRequest: if idempotency_key was used before. Nothing is changed.
+    """
+    try:
+        result = apply_purchase(item_id, user_id, quantity, reservation_id, idempotency_key)
+        _commit_purchase(user_id, idempotency_key)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+def apply_purchase(item_id, user_id, quantity, reservation_id=None, idempotency_key=None):
+    """
+    Executes a purchase (see make_purchase) in the current transaction, without committing it.
+    Used to commit several purchases in one transaction (see purchase_queue).
+
+    If the purchase fails with a PurchaseError or ValueError nothing has been written, so the transaction
+    can go on with other purchases.
+    """
+    _check_duplicate(user_id, idempotency_key)
+    if not isinstance(quantity, int) or quantity <= 0:
+        raise ValueError(f"Invalid quantity: {quantity}")
+
+    units_held = 0
+    if reservation_id is not None:
+        # no-op update: locks the reservation, so it can not expire before the purchase is committed
+        held = db.session.execute(update(StockReservation)
+                                  .where(StockReservation.id == reservation_id,
+                                         StockReservation.user_id == user_id,
+                                         StockReservation.salesitem_id == item_id,
+                                         StockReservation.quantity == quantity,
+                                         StockReservation.expires_at > datetime.utcnow())
+                                  .values(quantity=StockReservation.quantity)
+                                  .execution_options(synchronize_session=False))
+        units_held = quantity if held.rowcount == 1 else 0
+
+    decrement = db.session.execute(update(SalesItem)
+                                   .where(SalesItem.id == item_id,
+                                          SalesItem.units_in_stock - SalesItem.units_reserved + units_held >= quantity)
+                                   .values(units_in_stock=SalesItem.units_in_stock - quantity,
+                                           units_reserved=SalesItem.units_reserved - units_held,
+                                           units_purchased=func.coalesce(SalesItem.units_purchased, 0) + quantity)
+                                   .execution_options(synchronize_session=False))
+
+    if decrement.rowcount != 1:
+        units_available = _units_available(item_id)
+        if units_available is None:
+            raise ItemNotFound(f"Item {item_id} not found")
+        raise SoldOut(item_id, quantity, units_available)
+
+    if units_held:
+        db.session.execute(delete(StockReservation)
+                           .where(StockReservation.id == reservation_id)
+                           .execution_options(synchronize_session=False))
+
+    # the row is locked by the UPDATE until commit, so the item details read here are the ones purchased
+    item = db.session.execute(select(SalesItem.id, SalesItem.code, SalesItem.name, SalesItem.vendor_name,
+                                     SalesItem.price_per_unit)
+                              .where(SalesItem.id == item_id)).one()
+
+    purchase = Purchases(**_purchase_record(item, user_id, quantity))
+    db.session.add(purchase)
+    result = {'purchase_code': purchase.purchase_code, 'purchases': 1, 'total_price': purchase.total_price}
+    if idempotency_key is not None:
+        record_result(user_id, idempotency_key, result)
+    return result
+
+
+def checkout(user_id, order, idempotency_key=None):
+    """
+    Purchases several items in one transaction, e.g. the contents of a shopping cart.
+
+    The stock of all items is decremented by one batched conditional UPDATE (executemany, in item id order) and
+    the purchase records are written by one bulk INSERT. Either all items are purchased or none.
+    Units held by reservations of other customers are not available to checkout. The customer's own reservations
+    of the ordered items end with the checkout: their units are available to the order, and no longer held.
+
+    Args:
+        user_id: id of the purchasing user.
+        order: dictionary {item id: quantity}, quantities are positive integers.
+        idempotency_key: key of the request supplied by the client, optional. A repeated request with the same
+                         key is not executed again.
+
+    Returns:
+        dict: result of the checkout - number of purchases (items) and total price.
+
+    Raises:
+        ValueError: if the order is empty or a quantity is not a positive integer.
+        InsufficientStock: if some items are missing or do not have enough units available. Nothing is changed.
+        DuplicateRequest: if idempotency_key was used before. Nothing is changed.
+    """
+    _check_duplicate(user_id, idempotency_key)
+    if not order:
+        raise ValueError("Empty order")
+    for item_id, quantity in order.items():
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError(f"Invalid quantity of item {item_id}: {quantity}")
+
+    sales_items = SalesItem.__table__
+    decrement_stmt = update(sales_items) \
+        .where(sales_items.c.id == bindparam('b_id'),
+               sales_items.c.units_in_stock - sales_items.c.units_reserved + bindparam('b_held') >= bindparam('b_quantity')) \
+        .values(units_in_stock=sales_items.c.units_in_stock - bindparam('b_quantity'),
+                units_reserved=sales_items.c.units_reserved - bindparam('b_held'),
+                units_purchased=func.coalesce(sales_items.c.units_purchased, 0) + bindparam('b_quantity'))
+    # a fixed lock order keeps concurrent checkouts of overlapping carts from deadlocking
+    item_ids = sorted(order)
+
+    try:
+        # the customer's own reservations of the ordered items are released, like in reserve_stock
+        released = db.session.execute(delete(StockReservation)
+                                      .where(StockReservation.user_id == user_id,
+                                             StockReservation.salesitem_id.in_(item_ids))
+                                      .returning(StockReservation.salesitem_id, StockReservation.quantity)
+                                      .execution_options(synchronize_session=False)).all()
+        units_held = defaultdict(int)
+        for item_id, quantity in released:
+            units_held[item_id] += quantity
+
+        decrement = db.session.execute(decrement_stmt,
+                                       [{'b_id': item_id, 'b_quantity': order[item_id], 'b_held': units_held[item_id]}
+                                        for item_id in item_ids])
+
+        if decrement.rowcount != len(item_ids):
+            db.session.rollback()
+            raise InsufficientStock(_find_shortages(order, units_held))
+
+        items = db.session.execute(select(SalesItem.id, SalesItem.code, SalesItem.name, SalesItem.vendor_name,
+                                          SalesItem.price_per_unit)
+                                   .where(SalesItem.id.in_(item_ids))).all()
+        purchase_records = [_purchase_record(item, user_id, order[item.id]) for item in items]
+        db.session.execute(insert(Purchases), purchase_records)
+        result = {'purchases': len(purchase_records),
+                  'total_price': sum(purchase_record['total_price'] for purchase_record in purchase_records)}
+        if idempotency_key is not None:
+            record_result(user_id, idempotency_key, result)
+        _commit_purchase(user_id, idempotency_key)
+    except PurchaseError:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+def _find_shortages(order, units_held):
+    # items of the order with fewer units available than ordered (counting the units held for the customer), or missing;
+    # read after the failed decrement was rolled back
+    units_available = {item_id: units + units_held.get(item_id, 0) for item_id, units in
+                       db.session.execute(select(SalesItem.id, SalesItem.units_in_stock - SalesItem.units_reserved)
+                                          .where(SalesItem.id.in_(order))).all()}
+    return {item_id: units_available.get(item_id) for item_id, quantity in order.items()
+            if units_available.get(item_id) is None or units_available[item_id] < quantity}
+
+
+def reserve_stock(item_id, user_id, quantity, ttl_seconds):
+    """
+    Holds units of a sales item for a customer, e.g. between purchase verification and finalization.
+
+    The held units are added to SalesItem.units_reserved with a conditional UPDATE, so they are no longer
+    available to other customers, and a StockReservation expiring after ttl_seconds is recorded. A previous
+    reservation of the same item by the customer is replaced. The hold ends when the reservation is consumed
+    by make_purchase or checkout, or released by release_expired_reservations.
+
+    Returns:
+        StockReservation: the committed reservation.
+
+    Raises:
+        ValueError: if quantity is not a positive integer.
+        ItemNotFound: if there is no such item.
+        SoldOut: if the item does not have enough units available. Nothing is changed.
+    """
+    if not isinstance(quantity, int) or quantity <= 0:
+        raise ValueError(f"Invalid quantity: {quantity}")
+
+    now = datetime.utcnow()
+    try:
+        replaced = db.session.execute(delete(StockReservation)
+                                      .where(StockReservation.user_id == user_id, StockReservation.salesitem_id == item_id)
+                                      .returning(StockReservation.quantity)
+                                      .execution_options(synchronize_session=False)).scalars().all()
+        units_held = sum(replaced)
+
+        hold = db.session.execute(update(SalesItem)
+                                  .where(SalesItem.id == item_id,
+                                         SalesItem.units_in_stock - SalesItem.units_reserved + units_held >= quantity)
+                                  .values(units_reserved=SalesItem.units_reserved - units_held + quantity)
+                                  .execution_options(synchronize_session=False))
+
+        if hold.rowcount != 1:
+            db.session.rollback()
+            units_available = _units_available(item_id)
+            if units_available is None:
+                raise ItemNotFound(f"Item {item_id} not found")
+            raise SoldOut(item_id, quantity, units_available)
+
+        reservation = StockReservation(salesitem_id=item_id,
+                                       user_id=user_id,
+                                       quantity=quantity,
+                                       created_at=now,
+                                       expires_at=now + timedelta(seconds=ttl_seconds))
+        db.session.add(reservation)
+        db.session.commit()
+    except PurchaseError:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return reservation
+
+
+def release_expired_reservations(now=None):
+    """
+    Deletes the expired reservations and returns their units to the available stock, in one transaction.
+
+    Returns:
+        dict: {item id: units released} of the items with released reservations.
+    """
+    now = now or datetime.utcnow()
+    try:
+        expired = db.session.execute(delete(StockReservation)
+                                     .where(StockReservation.expires_at <= now)
+                                     .returning(StockReservation.salesitem_id, StockReservation.quantity)
+                                     .execution_options(synchronize_session=False)).all()
+        units_released = defaultdict(int)
+        for item_id, quantity in expired:
+            units_released[item_id] += quantity
+
+        if units_released:
+            sales_items = SalesItem.__table__
+            db.session.execute(update(sales_items)
+                               .where(sales_items.c.id == bindparam('b_id'))
+                               .values(units_reserved=sales_items.c.units_reserved - bindparam('b_quantity')),
+                               [{'b_id': item_id, 'b_quantity': quantity} for item_id, quantity in sorted(units_released.items())])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return dict(units_released)
@@ -0,0 +1,68 @@
+# background jobs of the storefront, run by APScheduler in a thread of each worker process
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+# started by init_scheduler when the first job is added
+scheduler = BackgroundScheduler(daemon=True)
+
+
+def sweep_reservations(app):
+    """
+    Job: release expired stock reservations (see purchase_utilities.release_expired_reservations).
+    """
+    from app import db  # Import here to avoid circular dependencies
+    from app.utilities.purchase_utilities import release_expired_reservations
+    from app.utilities.catalog_cache import catalog_cache
+    from app.utilities.catalog_facets import catalog_facets
+
+    with app.app_context():
+        try:
+            units_released = release_expired_reservations()
+        except Exception as e:
+            app.logger.error(f"Releasing expired stock reservations failed: {e}")
+            return
+        finally:
+            db.session.remove()
+
+        if units_released:
+            catalog_cache.invalidate_items(units_released)
+            catalog_facets.invalidate()
+            app.logger.info(f"Released expired stock reservations of {len(units_released)} items.")
+
+
+def purge_idempotency_keys(app):
+    """
+    Job: delete idempotency keys older than IDEMPOTENCY_KEY_TTL_SECONDS.
+    """
+    from app import db  # Import here to avoid circular dependencies
+    from app.utilities.idempotency import purge_expired_keys
+
+    with app.app_context():
+        try:
+            purge_expired_keys(app.config.get('IDEMPOTENCY_KEY_TTL_SECONDS', 86400))
+        except Exception as e:
+            app.logger.error(f"Purging expired idempotency keys failed: {e}")
+        finally:
+            db.session.remove()
+
+
+def init_scheduler(app):
+    """
+    Schedules the background jobs configured for the app and starts the scheduler.
+    Jobs are not scheduled in testing mode, or if their interval is set to 0.
+    """
+    if app.testing:
+        return
+
+    sweep_seconds = app.config.get('RESERVATION_SWEEP_SECONDS', 60)
+    if sweep_seconds:
+        scheduler.add_job(sweep_reservations, 'interval', args=[app], seconds=sweep_seconds,
+                          id='sweep_reservations', replace_existing=True, coalesce=True, max_instances=1)
+
+    purge_seconds = app.config.get('IDEMPOTENCY_PURGE_SECONDS', 3600)
+    if purge_seconds:
+        scheduler.add_job(purge_idempotency_keys, 'interval', args=[app], seconds=purge_seconds,
+                          id='purge_idempotency_keys', replace_existing=True, coalesce=True, max_instances=1)
+
+    if scheduler.get_jobs() and not scheduler.running:
+        scheduler.start()
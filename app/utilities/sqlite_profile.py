@@ -0,0 +1,77 @@
+# SQLite tuning: pragmas applied to every new database connection
+
+from sqlalchemy import event
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+TEMP_STORE_MODES = ('DEFAULT', 'FILE', 'MEMORY')
+
+
+def _choice(config, key, choices):
+    value = config.get(key)
+    if value is None:
+        return None
+    if str(value).upper() not in choices:
+        raise ValueError(f"{key} must be one of {', '.join(choices)}, not {value!r}")
+    return str(value).upper()
+
+
+def _integer(config, key):
+    value = config.get(key)
+    return None if value is None else int(value)
+
+
+def sqlite_pragmas(config):
+    """
+    Returns the PRAGMA statements configured by the SQLITE_* keys of the app config.
+    Keys set to None are left at the SQLite default.
+
+    Raises:
+        ValueError: if a key has an invalid value.
+    """
+    pragmas = []
+    journal_mode = _choice(config, 'SQLITE_JOURNAL_MODE', JOURNAL_MODES)
+    if journal_mode:
+        pragmas.append(f"PRAGMA journal_mode={journal_mode}")
+    synchronous = _choice(config, 'SQLITE_SYNCHRONOUS', SYNCHRONOUS_MODES)
+    if synchronous:
+        pragmas.append(f"PRAGMA synchronous={synchronous}")
+    busy_timeout = _integer(config, 'SQLITE_BUSY_TIMEOUT_MS')
+    if busy_timeout is not None:
+        pragmas.append(f"PRAGMA busy_timeout={busy_timeout}")
+    cache_size = _integer(config, 'SQLITE_CACHE_SIZE_KIB')
+    if cache_size is not None:
+        pragmas.append(f"PRAGMA cache_size=-{cache_size}")      # negative: size in KiB instead of pages
+    mmap_size = _integer(config, 'SQLITE_MMAP_SIZE')
+    if mmap_size is not None:
+        pragmas.append(f"PRAGMA mmap_size={mmap_size}")
+    temp_store = _choice(config, 'SQLITE_TEMP_STORE', TEMP_STORE_MODES)
+    if temp_store:
+        pragmas.append(f"PRAGMA temp_store={temp_store}")
+    return pragmas
+
+
+def init_sqlite_profile(app, engine):
+    """
+    Applies the SQLite pragmas of the app config (see sqlite_pragmas) to each new connection of a SQLite engine.
+    Does nothing for other databases or if SQLITE_TUNING is disabled.
+
+    WAL journal mode lets readers proceed while a write transaction is open and turns commits into appends to
+    the write-ahead log; with synchronous=NORMAL a commit is not fsynced until checkpoint, which keeps the
+    database consistent but may lose the last transactions on power loss (not on an application crash).
+    """
+    if engine.dialect.name != 'sqlite' or not app.config.get('SQLITE_TUNING', True):
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    app.logger.info(f"SQLite connections use: {'; '.join(pragmas)}")
@@ -1,15 +1,29 @@
 # utility functions used by data sync
 # data preparation, filtering, upload, download
 
+import hashlib
+import json
 from flask import current_app
 from datetime import datetime, timezone # UTC
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import update, inspect
+from sqlalchemy import update, inspect, insert, select, delete
+from sqlalchemy.orm import ONETOMANY
 # import requests
 from app.models import SalesItem, Purchases
 from app import db
+from app.utilities.catalog_cache import catalog_cache
+from app.utilities.catalog_facets import catalog_facets
+from app.utilities.catalog_search import catalog_search
+from app.utilities.db_routing import use_primary
 from flask import current_app
 
+# columns of a synced model (if present) holding the hash of its synced fields and the number of changes
+CONTENT_HASH_COL = 'content_hash'
+VERSION_COL = 'version'
+# synced fields the store also changes itself (purchases, reservations) with plain UPDATE statements; they are left
+# out of the content hash, which would go stale, and compared with the stored values instead
+STORE_MUTATED_FIELDS = ('units_in_stock', 'units_purchased', 'units_reserved')
+
 class OperationResult:
     """
     Class to store the update/deletion statistics and error codes
@@ -26,6 +40,7 @@ class OperationResult:
         self.deleted_count = 0
         self.updated_count = 0
         self.added_count = 0
+        self.unchanged_count = 0
         self.erroneous_count = 0
         self.not_found_count = 0
 
@@ -47,6 +62,19 @@ class OperationResult:
             if hasattr(self, key):
                 setattr(self, key, value)
                 
+    # combine the result of another (partial) operation into this one, e.g. when a dataset is processed in batches.
+    # counts are added up, any failure makes the combined operation a failure.
+    def merge(self, other):
+        for key in ('deleted_count', 'updated_count', 'added_count', 'unchanged_count', 'erroneous_count',
+                    'not_found_count'):
+            setattr(self, key, getattr(self, key) + getattr(other, key))
+
+        if other.operation_failure() or self.operation_not_performed() or \
+                (other.operation_success() and not self.operation_failure()):
+            self.result_code = other.result_code
+            self.result_message = other.result_message
+            self.http_response = other.http_response
+
     # methods to check various states of the operation.
     def operation_success(self):
         return self.result_code == OperationResult.SUCCESS
@@ -58,14 +86,17 @@ class OperationResult:
         return self.result_code == OperationResult.NOT_PERFORMED
 
 
-def delete_items(target_model, key_col_target, incoming_data, key_col_incoming):
+def delete_items(target_model, key_col_target, incoming_data, key_col_incoming, bulk=None):
     """
     Args:
         target_model: Model where to remove items from
         key_col_target: The field name in the model used to identify items for deletion.
-        incoming_data: List of dictionaries, each containing the search key and value. 
+        incoming_data: List of dictionaries, each containing the search key and value, or ColumnarData. 
                        The value will be used to identify the records to be removed from the target
         key_col_incoming: The field name in the incoming data used to identify items for deletion. 
+        bulk: If True, the items are located with chunked SELECT ... WHERE key IN (...) queries and removed with
+              chunked DELETE ... WHERE key IN (...) statements instead of one query and one ORM delete per item.
+              Default is None, meaning the SYNC_BULK_OPERATIONS config parameter decides.
 
     Returns:
         OperationResult object including result status, result message, http response, as well as counts of
@@ -95,41 +126,65 @@ def delete_items(target_model, key_col_target, incoming_data, key_col_incoming):
                                 )
         return operation_result
 
-    # Dynamically get the column to be used for filtering
-    search_col = getattr(target_model, key_col_target)
+    if bulk is None:
+        bulk = current_app.config.get('SYNC_BULK_OPERATIONS', False)
+
+    if bulk:
+        try:
+            num_deleted_items, num_not_found_items, num_error_items = _delete_items_bulk(target_model=target_model,
+                                                                                         key_col_target=key_col_target,
+                                                                                         incoming_data=incoming_data,
+                                                                                         key_col_incoming=key_col_incoming)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            error_message = f"!!! Error {e} while deleting items"
+            current_app.logger.error(error_message)
+            operation_result.update(result_code=OperationResult.FAILURE,
+                                    result_message=error_message,
+                                    http_response=500,
+                                    deleted_count=0,                    # since no items were deleted due to roll-back
+                                    not_found_count=num_not_found_items,
+                                    erroneous_count=num_error_items
+                                    )
+            return operation_result
+    else:
+        # Dynamically get the column to be used for filtering
+        search_col = getattr(target_model, key_col_target)
     
-    for item_data in incoming_data:
-        # check if the items in incoming data lack the required field (key_col_incoming).
-        # if there is no such field, log an error, increase erroneous item count, and continue.
-        # No need to terminate, there may be good items in the incoming data.
-        if key_col_incoming not in item_data:
-            current_app.logger.error(f"'{key_col_incoming}' is not found in {item_data}")
-            num_error_items += 1
-            # num_error_items.append(item_data)
-            continue
-        search_value = item_data[key_col_incoming]
-        item = target_model.query.filter(search_col == search_value).first()
+        for item_data in incoming_data:
+            # check if the items in incoming data lack the required field (key_col_incoming).
+            # if there is no such field, log an error, increase erroneous item count, and continue.
+            # No need to terminate, there may be good items in the incoming data.
+            if key_col_incoming not in item_data:
+                current_app.logger.error(f"'{key_col_incoming}' is not found in {item_data}")
+                num_error_items += 1
+                # num_error_items.append(item_data)
+                continue
+            search_value = item_data[key_col_incoming]
+            item = target_model.query.filter(search_col == search_value).first()
 
-        if item:
-            try:
-                db.session.delete(item)
-                num_deleted_items += 1
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                error_message = f"!!! Error {e} while deleting item {search_value}"
-                current_app.logger.error(error_message)
-                operation_result.update(result_code=OperationResult.FAILURE,
-                                        result_message=error_message,
-                                        http_response=500,
-                                        deleted_count=0,                    # since no items were deleted due to roll-back
-                                        not_found_count=num_not_found_items,
-                                        erroneous_count=num_error_items
-                                        )
-                return operation_result
-        else:
-            num_not_found_items += 1
+            if item:
+                try:
+                    _delete_cascaded(target_model, list(inspect(item).identity))
+                    db.session.delete(item)
+                    num_deleted_items += 1
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    error_message = f"!!! Error {e} while deleting item {search_value}"
+                    current_app.logger.error(error_message)
+                    operation_result.update(result_code=OperationResult.FAILURE,
+                                            result_message=error_message,
+                                            http_response=500,
+                                            deleted_count=0,                    # since no items were deleted due to roll-back
+                                            not_found_count=num_not_found_items,
+                                            erroneous_count=num_error_items
+                                            )
+                    return operation_result
+            else:
+                num_not_found_items += 1
 
-    db.session.commit()
+        db.session.commit()
 
     operation_result.update(result_code=OperationResult.SUCCESS,
                             result_message="Operation successful.",
@@ -138,29 +193,78 @@ def delete_items(target_model, key_col_target, incoming_data, key_col_incoming):
                             not_found_count=num_not_found_items,
                             erroneous_count=num_error_items
                             )
+    if target_model is SalesItem and num_deleted_items:
+        catalog_cache.invalidate_all()
+        catalog_facets.invalidate()
+        catalog_search.invalidate()
     current_app.logger.info(f"Deletion complete: {operation_result.deleted_count} items deleted from {target_model.__name__}, {operation_result.not_found_count} items not located, {operation_result.erroneous_count} erroneous items in the input.")
     return operation_result
 
 
-def update_items(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping,timestamp_col=None):
+class ColumnarData:
+    """
+    Incoming records in column-oriented form: one list of values per field, all of the same length, e.g.
+    {'code': ['A-1', 'A-2'], 'units_in_stock': [5, 0]}. Accepted by update_items and delete_items in place of
+    a list of dictionaries; the bulk variants read the values column by column instead of record by record.
+    All records carry the same fields, a field missing from the columns is missing from every record.
+    """
+
+    def __init__(self, columns):
+        if not isinstance(columns, dict) or not all(isinstance(values, list) for values in columns.values()):
+            raise ValueError("Columnar data must map each field to a list of values")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of columnar data differ in length: {sorted(lengths)}")
+        self.columns = columns
+        self.length = lengths.pop() if lengths else 0
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # the records as dictionaries, for the row-by-row variants
+        fields = list(self.columns)
+        for values in zip(*self.columns.values()):
+            yield dict(zip(fields, values))
+
+    def batches(self, batch_size):
+        """
+        Splits the data into ColumnarData of at most batch_size records.
+        """
+        for start in range(0, self.length, batch_size):
+            yield ColumnarData({field: values[start:start + batch_size] for field, values in self.columns.items()})
+
+
+def update_items(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping,timestamp_col=None, bulk=None):
     """
     Updates or adds items to an SQLAlchemy model based on incoming data.
     Args:
         target_model: SQLAlchemy model class to update or add items to.
         key_col_target: The field name in the model used to identify items for update.
-        incoming_data: List of dictionaries, each dictionary represents a record. 
+        incoming_data: List of dictionaries, each dictionary represents a record, or ColumnarData.
+                        A record of an existing item may include only the key and the fields that changed (delta);
+                        a record of a new item must include all fields of field_mapping.
         key_col_incoming: The field in the incoming data with a unique item identifier.
                             If the identifier is found in key_col_target of target model, the item shall be updated,
                             otherwise it shall be added to the model.
         field_mapping: Dictionary mapping fields in the incoming data to the target model's fields.
         timestamp_col: The field name (optional) in the model where timestamp of the update/creation shall be recorded.
                         Default is None, meaning no timestamp will be added by default.
+        bulk: If True, existing keys are pre-fetched in chunked IN (...) queries and the changes are applied
+              with set-based INSERT/UPDATE executemany statements instead of one query and one ORM object per row.
+              Default is None, meaning the SYNC_BULK_OPERATIONS config parameter decides.
 
     Returns:
         OperationResult object including result status, result message, http response, as well as counts of
-        added items, updated items, and of erroneous items.
+        added items, updated items, unchanged items, and of erroneous items.
                 
-        An erroneous item is one that does not include field label specified in key_col_incoming
+        An erroneous item is one that does not include field label specified in key_col_incoming,
+        or a new item that does not include all fields of field_mapping.
+        An unchanged item is an existing item whose record does not change any field; it is not written.
+        Only the changed fields of updated items are written. If the model has content_hash and version columns
+        (CONTENT_HASH_COL, VERSION_COL), they are maintained: the hash of the synced fields lets the bulk variant
+        skip unchanged full records without reading them, and the version is incremented by each change.
+        Fields the store changes itself (STORE_MUTATED_FIELDS, e.g. the stock) are not hashed but compared.
         
     Usage example: update_items(SalesItems, 'code', data, 'code', salesitem_field_map)        
     """
@@ -169,6 +273,7 @@ def update_items(target_model, key_col_target, incoming_data, key_col_incoming,
     operation_result = OperationResult()
     number_updated = 0
     number_added = 0
+    number_unchanged = 0
     number_error_items = 0
     
     model_columns = inspect(target_model).attrs
@@ -203,37 +308,26 @@ def update_items(target_model, key_col_target, incoming_data, key_col_incoming,
         
         return operation_result
 
-    try:
-        for item_data in incoming_data:
-            # Ensure all field_mapping keys are in the item_data
-            if not all(key in item_data for key in field_mapping.keys()):
-                current_app.logger.error(f"Missing field(s) in item data: {item_data}")
-                number_error_items += 1
-                continue
+    if bulk is None:
+        bulk = current_app.config.get('SYNC_BULK_OPERATIONS', False)
 
-            # Lookup or initialize the item
-            search_value = item_data[key_col_incoming]
-            item = target_model.query.filter_by(**{key_col_target: search_value}).first()
-            if item:
-                operation = 'update'
-            else:
-                item = target_model()
-                operation = 'add'
-
-            # Apply field mapping and update/create item
-            for incoming_field, model_field in field_mapping.items():
-                setattr(item, model_field, item_data[incoming_field])
-
-            # Set timestamp if applicable
-            if timestamp_col and timestamp_col in model_columns:
-                setattr(item, timestamp_col, datetime.now(timezone.utc))
-
-            db.session.add(item)
-
-            if operation == 'update':
-                number_updated += 1
-            else:
-                number_added += 1
+    try:
+        if bulk:
+            number_updated, number_added, number_unchanged, number_error_items = \
+                _update_items_bulk(target_model=target_model,
+                                   key_col_target=key_col_target,
+                                   incoming_data=incoming_data,
+                                   key_col_incoming=key_col_incoming,
+                                   field_mapping=field_mapping,
+                                   timestamp_col=timestamp_col)
+        else:
+            number_updated, number_added, number_unchanged, number_error_items = \
+                _update_items_orm(target_model=target_model,
+                                  key_col_target=key_col_target,
+                                  incoming_data=incoming_data,
+                                  key_col_incoming=key_col_incoming,
+                                  field_mapping=field_mapping,
+                                  timestamp_col=timestamp_col)
 
         # Commit all changes after processing all items
         db.session.commit()
@@ -258,13 +352,427 @@ def update_items(target_model, key_col_target, incoming_data, key_col_incoming,
                             http_response=200,
                             updated_count=number_updated,
                             added_count=number_added,
+                            unchanged_count=number_unchanged,
                             erroneous_count=number_error_items
                             )
-    current_app.logger.info(f"Update complete: {operation_result.updated_count} items updated, {operation_result.added_count} items added in {target_model.__name__}, there were {operation_result.erroneous_count} erroneous items in the input.")
+    if target_model is SalesItem and (number_updated or number_added):
+        catalog_cache.invalidate_all()
+        catalog_facets.invalidate()
+        catalog_search.invalidate()
+    current_app.logger.info(f"Update complete: {operation_result.updated_count} items updated, {operation_result.added_count} items added, {operation_result.unchanged_count} items unchanged in {target_model.__name__}, there were {operation_result.erroneous_count} erroneous items in the input.")
 
     return operation_result
 
 
+def _chunked(values, chunk_size):
+    """
+    Split a list into consecutive slices of at most chunk_size elements.
+    """
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+def _fetch_existing_keys(target_model, key_col_target, keys, extra_cols=()):
+    """
+    Look up which of the keys are already present in the target model.
+    The keys are queried in chunks (SYNC_CHUNK_SIZE) to stay within the bound parameter limit of the database.
+
+    Returns:
+        dictionary mapping each key found in key_col_target to the primary key of its row,
+        or, if extra_cols (field names) are given, to a tuple (primary key, values of the extra_cols).
+    """
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    key_col = getattr(target_model, key_col_target)
+    pk_col = inspect(target_model).primary_key[0]
+    columns = [getattr(target_model, field) for field in extra_cols]
+
+    existing_keys = {}
+    for keys_chunk in _chunked(keys, chunk_size):
+        rows = db.session.execute(select(key_col, pk_col, *columns).where(key_col.in_(keys_chunk)))
+        if columns:
+            existing_keys.update((row[0], tuple(row[1:])) for row in rows)
+        else:
+            existing_keys.update(rows.all())
+    return existing_keys
+
+
+def _detach_dependents(target_model, pk_values):
+    """
+    Bulk DELETE statements bypass the ORM unit of work. Do what session.delete() would do for one-to-many
+    relationships without delete cascade (e.g. SalesItem.purchase_history): set the foreign key of the
+    dependent rows to NULL, so they do not point to removed rows.
+    """
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    for relationship in inspect(target_model).relationships:
+        if relationship.direction is not ONETOMANY or relationship.cascade.delete or relationship.passive_deletes:
+            continue
+        for _, remote_col in relationship.local_remote_pairs:
+            for pk_chunk in _chunked(pk_values, chunk_size):
+                db.session.execute(update(remote_col.table)
+                                   .where(remote_col.in_(pk_chunk))
+                                   .values({remote_col.name: None}))
+
+
+def _delete_cascaded(target_model, pk_values):
+    """
+    Deletes the rows that ON DELETE CASCADE foreign keys to the target model would delete (e.g. the
+    StockReservation rows of removed items): SQLite enforces foreign keys only with PRAGMA foreign_keys=ON.
+    """
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    for table in db.metadata.sorted_tables:
+        for foreign_key in table.foreign_keys:
+            if foreign_key.ondelete != 'CASCADE' or foreign_key.column.table is not target_model.__table__:
+                continue
+            for pk_chunk in _chunked(pk_values, chunk_size):
+                db.session.execute(delete(table).where(foreign_key.parent.in_(pk_chunk)))
+
+
+def _delete_items_bulk(target_model, key_col_target, incoming_data, key_col_incoming):
+    """
+    Set-based deletion: the keys found in the target model are determined with chunked IN (...) queries,
+    the rows are then removed with chunked DELETE ... WHERE key IN (...) statements.
+    Changes are left in the session, the caller commits.
+
+    Counts match the row-by-row variant: a key repeated in the incoming data is deleted once,
+    the repeated occurrences are counted as not found.
+
+    Returns:
+        tuple (number of deleted items, number of items not found, number of erroneous items)
+    """
+    num_error_items = 0
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    search_col = getattr(target_model, key_col_target)
+
+    search_values = []
+    if isinstance(incoming_data, ColumnarData):
+        if key_col_incoming in incoming_data.columns:
+            search_values = incoming_data.columns[key_col_incoming]
+        else:
+            current_app.logger.error(f"'{key_col_incoming}' is not found in columnar data: {list(incoming_data.columns)}")
+            num_error_items = len(incoming_data)
+    else:
+        for item_data in incoming_data:
+            if key_col_incoming not in item_data:
+                current_app.logger.error(f"'{key_col_incoming}' is not found in {item_data}")
+                num_error_items += 1
+                continue
+            search_values.append(item_data[key_col_incoming])
+
+    existing_keys = _fetch_existing_keys(target_model, key_col_target, list(dict.fromkeys(search_values)))
+
+    _detach_dependents(target_model, list(existing_keys.values()))
+    _delete_cascaded(target_model, list(existing_keys.values()))
+    for keys_chunk in _chunked(list(existing_keys), chunk_size):
+        db.session.execute(delete(target_model).where(search_col.in_(keys_chunk)),
+                           execution_options={'synchronize_session': False})
+
+    num_deleted_items = len(existing_keys)
+    num_not_found_items = len(search_values) - num_deleted_items
+    return num_deleted_items, num_not_found_items, num_error_items
+
+
+def _hashable(value):
+    # numbers are hashed by value, so 5 from the warehouse matches 5.0 read back from a Float column
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def content_hash(row, fields):
+    """
+    Returns a hash of the values of the synced fields of an item (row: dictionary of model field -> value),
+    except STORE_MUTATED_FIELDS. Stored in the CONTENT_HASH_COL column of the item, it tells whether an incoming
+    full record changes any of these fields without reading the item's values.
+    """
+    return _hash_values([row.get(field) for field in _hashed_fields(fields)])
+
+
+def _hashed_fields(fields):
+    # the fields covered by the content hash, sorted
+    return sorted(field for field in fields if field not in STORE_MUTATED_FIELDS)
+
+
+# encoder of the hashed values, created once: json.dumps with options builds a new encoder per call
+_HASH_ENCODER = json.JSONEncoder(default=str, separators=(',', ':'))
+
+
+def _hash_values(values):
+    # hash of the values of the synced fields, in the order of the sorted field names
+    encoded = _HASH_ENCODER.encode([_hashable(value) for value in values]).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def _same_values(row, fields, values):
+    # whether the row (model field -> value) holds the given values of the fields
+    return all(_hashable(row.get(field)) == _hashable(value) for field, value in zip(fields, values))
+
+
+def _changed_fields(current, incoming):
+    """
+    Returns the incoming field values that differ from the current values of an item.
+    """
+    return {field: value for field, value in incoming.items() if _hashable(current.get(field)) != _hashable(value)}
+
+
+def _update_items_orm(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping, timestamp_col):
+    """
+    Row-by-row update/add: one lookup query and one ORM object per incoming item.
+    Only the fields that changed are written; items without changes are left untouched.
+    If the same key appears several times in the incoming data, the occurrences are merged (later fields win)
+    and applied and counted once.
+    Changes are left in the session, the caller commits.
+
+    Returns:
+        tuple (number of updated items, number of added items, number of unchanged items, number of erroneous items)
+    """
+    number_updated = 0
+    number_added = 0
+    number_unchanged = 0
+    number_error_items = 0
+    model_columns = inspect(target_model).attrs
+    versioned = CONTENT_HASH_COL in model_columns and VERSION_COL in model_columns
+    fields = list(field_mapping.values())
+
+    records_by_key = {}
+    for item_data in incoming_data:
+        if key_col_incoming not in item_data:
+            current_app.logger.error(f"Missing field(s) in item data: {item_data}")
+            number_error_items += 1
+            continue
+        search_value = item_data[key_col_incoming]
+        if search_value in records_by_key:
+            records_by_key[search_value].update(item_data)
+        else:
+            records_by_key[search_value] = dict(item_data)
+
+    for search_value, item_data in records_by_key.items():
+        # Lookup the item; new items must come with all fields, updates may be partial (delta)
+        item = target_model.query.filter_by(**{key_col_target: search_value}).first()
+        if item is None and not all(key in item_data for key in field_mapping.keys()):
+            current_app.logger.error(f"Missing field(s) in item data: {item_data}")
+            number_error_items += 1
+            continue
+
+        incoming = {model_field: item_data[incoming_field] for incoming_field, model_field in field_mapping.items()
+                    if incoming_field in item_data}
+        if item:
+            current = {field: getattr(item, field) for field in fields}
+            changes = _changed_fields(current, incoming)
+            if not changes:
+                if versioned and item.content_hash != content_hash(current, fields):
+                    item.content_hash = content_hash(current, fields)      # e.g. items synced before hashing
+                number_unchanged += 1
+                continue
+            operation = 'update'
+        else:
+            item = target_model()
+            current = {}
+            changes = incoming
+            operation = 'add'
+
+        # Apply the changed fields
+        for model_field, value in changes.items():
+            setattr(item, model_field, value)
+        if versioned:
+            item.content_hash = content_hash({**current, **changes}, fields)
+            item.version = (item.version or 0) + 1 if operation == 'update' else 1
+
+        # Set timestamp if applicable
+        if timestamp_col and timestamp_col in model_columns:
+            setattr(item, timestamp_col, datetime.now(timezone.utc))
+
+        db.session.add(item)
+
+        if operation == 'update':
+            number_updated += 1
+        else:
+            number_added += 1
+
+    return number_updated, number_added, number_unchanged, number_error_items
+
+
+def _fetch_current_rows(target_model, pk_values, fields):
+    """
+    Reads the current values of the given fields (plus the version) of rows, by primary key, in chunks.
+
+    Returns:
+        dictionary mapping each primary key to a dictionary of field -> value.
+    """
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    pk_col = inspect(target_model).primary_key[0]
+    columns = [getattr(target_model, field) for field in fields]
+    current_rows = {}
+    for pk_chunk in _chunked(pk_values, chunk_size):
+        for row in db.session.execute(select(pk_col, *columns).where(pk_col.in_(pk_chunk))):
+            current_rows[row[0]] = dict(zip(fields, row[1:]))
+    return current_rows
+
+
+def _update_items_bulk(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping, timestamp_col):
+    """
+    Set-based update/add: existing keys are pre-fetched in chunked IN (...) queries, then all new rows are
+    inserted and all existing rows are updated (by primary key) with executemany statements.
+    Changes are left in the session, the caller commits.
+
+    Delta sync: an update may carry only some of the mapped fields (new items need all of them). Updates that
+    change nothing are skipped, and changed items are written with only the columns that changed, so unchanged
+    columns cause no index or trigger work. If the model has CONTENT_HASH_COL and VERSION_COL columns, a full
+    record whose hash equals the stored one, and whose STORE_MUTATED_FIELDS equal the stored values (fetched
+    together with the hash), is skipped without reading the item; each change increments the version.
+
+    Counts match the row-by-row variant: if the same key appears several times in the incoming data,
+    the occurrences are merged (later fields win) and applied and counted once.
+
+    Returns:
+        tuple (number of updated items, number of added items, number of unchanged items, number of erroneous items)
+    """
+    if isinstance(incoming_data, ColumnarData):
+        return _update_columns_bulk(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping,
+                                    timestamp_col)
+
+    number_error_items = 0
+    fields = list(field_mapping.values())
+
+    # collect the mapped values per key, dropping items without key
+    rows_by_key = {}
+    for item_data in incoming_data:
+        if key_col_incoming not in item_data:
+            current_app.logger.error(f"Missing field(s) in item data: {item_data}")
+            number_error_items += 1
+            continue
+
+        row = {model_field: item_data[incoming_field] for incoming_field, model_field in field_mapping.items()
+               if incoming_field in item_data}
+        search_value = item_data[key_col_incoming]
+        if search_value in rows_by_key:
+            rows_by_key[search_value].update(row)
+        else:
+            rows_by_key[search_value] = row
+
+    rows = list(rows_by_key.values())
+    number_updated, number_added, number_unchanged, number_incomplete = \
+        _apply_rows_bulk(target_model, key_col_target, list(rows_by_key), fields, timestamp_col,
+                         row_at=rows.__getitem__,
+                         complete_at=lambda position: len(rows[position]) == len(fields),
+                         hash_at=lambda position: content_hash(rows[position], fields))
+    return number_updated, number_added, number_unchanged, number_error_items + number_incomplete
+
+
+def _update_columns_bulk(target_model, key_col_target, incoming_data, key_col_incoming, field_mapping, timestamp_col):
+    """
+    Set-based update/add of ColumnarData, with the semantics and counts of _update_items_bulk.
+    The values are read column by column: a dictionary is built only for the records that are written,
+    as the executemany statements need them, or compared with the stored values.
+
+    Returns:
+        tuple (number of updated items, number of added items, number of unchanged items, number of erroneous items)
+    """
+    columns = incoming_data.columns
+    if key_col_incoming not in columns:
+        current_app.logger.error(f"Missing key column '{key_col_incoming}' in columnar data: {list(columns)}")
+        return 0, 0, 0, len(incoming_data)
+
+    fields = list(field_mapping.values())
+    mapped = [(model_field, columns[incoming_field]) for incoming_field, model_field in field_mapping.items()
+              if incoming_field in columns]
+    fields_sent = [model_field for model_field, _ in mapped]
+    value_columns = [values for _, values in mapped]
+    hash_columns = [values for model_field, values in sorted(mapped, key=lambda field_values: field_values[0])
+                    if model_field not in STORE_MUTATED_FIELDS]
+    complete = len(mapped) == len(fields)
+
+    # all records carry the same fields: of a repeated key, the last occurrence wins
+    keys = columns[key_col_incoming]
+    last_positions = {key: position for position, key in enumerate(keys)}
+    positions = list(last_positions.values())
+
+    return _apply_rows_bulk(target_model, key_col_target, list(last_positions), fields, timestamp_col,
+                            row_at=lambda index: dict(zip(fields_sent, (values[positions[index]]
+                                                                        for values in value_columns))),
+                            complete_at=lambda index: complete,
+                            hash_at=lambda index: _hash_values([values[positions[index]] for values in hash_columns]))
+
+
+def _apply_rows_bulk(target_model, key_col_target, keys, fields, timestamp_col, row_at, complete_at, hash_at):
+    """
+    Inserts and updates the incoming records of the unique keys, see _update_items_bulk.
+    The records are accessed by position in keys: row_at returns the mapped values (model field -> value),
+    complete_at whether all fields are included and hash_at the content hash of a complete record.
+
+    Returns:
+        tuple (number of updated items, number of added items, number of unchanged items,
+               number of incomplete new items)
+    """
+    number_updated = 0
+    number_unchanged = 0
+    number_incomplete = 0
+    chunk_size = current_app.config.get('SYNC_CHUNK_SIZE', 500)
+    mapper = inspect(target_model)
+    pk_attr = mapper.get_property_by_column(mapper.primary_key[0]).key
+    timestamp = datetime.now(timezone.utc) if timestamp_col and timestamp_col in mapper.attrs else None
+    versioned = CONTENT_HASH_COL in mapper.attrs and VERSION_COL in mapper.attrs
+
+    mutated_fields = [field for field in fields if field in STORE_MUTATED_FIELDS]
+    existing_keys = _fetch_existing_keys(target_model, key_col_target, keys,
+                                         extra_cols=[CONTENT_HASH_COL] + mutated_fields if versioned else [])
+
+    rows_to_add = []
+    candidates = {}         # pk -> incoming row of the updates that may change something
+    for position, search_value in enumerate(keys):
+        existing = existing_keys.get(search_value)
+        if existing is None:
+            if not complete_at(position):
+                current_app.logger.error(f"Missing field(s) in new item data: {search_value}")
+                number_incomplete += 1
+                continue
+            row = row_at(position)
+            if versioned:
+                row[CONTENT_HASH_COL] = hash_at(position)
+                row[VERSION_COL] = 1
+            if timestamp:
+                row[timestamp_col] = timestamp
+            rows_to_add.append(row)
+        elif versioned and complete_at(position) and hash_at(position) == existing[1] \
+                and _same_values(row_at(position), mutated_fields, existing[2:]):
+            number_unchanged += 1       # full record, same content
+        else:
+            candidates[existing[0] if versioned else existing] = row_at(position)
+
+    # read the current values of the candidates to find the columns that actually change
+    current_rows = _fetch_current_rows(target_model, list(candidates),
+                                       fields + ([CONTENT_HASH_COL, VERSION_COL] if versioned else []))
+    rows_to_update = []
+    for pk_value, row in candidates.items():
+        current = current_rows[pk_value]
+        changes = _changed_fields(current, row)
+        if versioned:
+            new_hash = content_hash({**current, **row}, fields)
+            if changes:
+                changes[VERSION_COL] = (current[VERSION_COL] or 0) + 1
+            if new_hash != current[CONTENT_HASH_COL]:
+                changes[CONTENT_HASH_COL] = new_hash      # also fills in the hash of items synced before hashing
+        if not changes or set(changes) == {CONTENT_HASH_COL}:
+            number_unchanged += 1
+            if not changes:
+                continue
+        else:
+            number_updated += 1
+            if timestamp:
+                changes[timestamp_col] = timestamp
+        changes[pk_attr] = pk_value
+        rows_to_update.append(changes)
+
+    for rows_chunk in _chunked(rows_to_add, chunk_size):
+        db.session.execute(insert(target_model), rows_chunk)
+    # rows with different sets of changed columns are grouped into separate executemany statements
+    rows_to_update.sort(key=lambda changes: sorted(changes))
+    for rows_chunk in _chunked(rows_to_update, chunk_size):
+        db.session.execute(update(target_model), rows_chunk)
+
+    return number_updated, len(rows_to_add), number_unchanged, number_incomplete
+
+
+
 # def add_item(target_model, data_item, field_mapping):
 #     pass
 
@@ -309,3 +817,55 @@ def set_single_value(model, field_to_update, new_value, **conditions):
         # Rollback in case of error
         db.session.rollback()
         return f"Error: {e}"
+
+
+@use_primary()
+def acknowledge_purchases(purchase_id_ranges):
+    """
+    Records that the purchases with ids in the given ranges have been delivered to the warehouse:
+    their requires_sync flag is cleared, with one UPDATE per range of consecutive ids (primary key range).
+
+    Only the purchases actually delivered are acknowledged. Purchase ids are assigned before commit, so a purchase
+    committing late may have a lower id than purchases already delivered; it keeps its flag until a later export
+    delivers it. This is why delivery is tracked per purchase rather than with a watermark (highest id delivered).
+
+    Args:
+        purchase_id_ranges: ranges of delivered purchase ids, as [(first id, last id), ...], see extend_id_ranges.
+
+    Returns:
+        int: number of purchases newly acknowledged (flag cleared).
+    """
+    if not purchase_id_ranges:
+        return 0
+
+    number_acknowledged = 0
+    try:
+        for first_id, last_id in purchase_id_ranges:
+            result = db.session.execute(update(Purchases)
+                                        .where(Purchases.id.between(first_id, last_id),
+                                               Purchases.requires_sync == True)
+                                        .values(requires_sync=False),
+                                        execution_options={'synchronize_session': False})
+            number_acknowledged += result.rowcount
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error acknowledging purchases {purchase_id_ranges[0][0]} to "
+                                 f"{purchase_id_ranges[-1][1]}: {e}")
+        raise
+
+    return number_acknowledged
+
+
+def extend_id_ranges(id_ranges, purchase_id):
+    """
+    Adds a purchase id to a list of ranges of consecutive ids [[first id, last id], ...], as used by
+    acknowledge_purchases. Ids must be added in ascending order; an export in id order makes a single range,
+    unless some ids are missing.
+    """
+    if id_ranges and purchase_id == id_ranges[-1][1] + 1:
+        id_ranges[-1][1] = purchase_id
+    else:
+        id_ranges.append([purchase_id, purchase_id])
+    return id_ranges
+
@@ -4,7 +4,13 @@ from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
 from app.models import APIToken
 from app import db
-import os
+from app.utilities.cache_utilities import TTLCache
+from sqlalchemy import update
+import threading
+import time
+
+# positive token validations, keyed by token digest; sized from the app config in create_app
+validated_token_cache = TTLCache()
 
 def generate_token(expiration_date: datetime, connection_name:str="Malldepot_central") -> str:
     """
@@ -47,6 +53,22 @@ def generate_token(expiration_date: datetime, connection_name:str="Malldepot_cen
     return token
 
 
+def token_digest(token):
+    """
+    Fixed-size digest of an API token (hex SHA-256), used for database lookups and as the cache key for validated tokens.
+    """
+    return APIToken.digest(token)
+
+
+def invalidate_token(token):
+    """
+    Drops a token from the validated token cache. To be called whenever a token is revoked or deleted.
+    NB, only the cache of the current worker process is affected, other workers keep a positive validation
+    until it expires (TOKEN_CACHE_TTL_SECONDS).
+    """
+    validated_token_cache.delete(token_digest(token))
+
+
 def validate_token(token):
     """
     Token validator checks:
@@ -63,54 +85,72 @@ def validate_token(token):
     Returns:
         bool: True if the token is valid (all conditions are met), False otherwise.
     """
-    os.environ['JWT_DECODE_DEBUG'] = 'False'
-    
-    print("*** TOKEN VALIDATOR ***")
-    print("token received:", token)
-    print("unverified header", jwt.get_unverified_header(token))
-    print("secret key:", current_app.config['SECRET_KEY'])
-    payload = jwt.decode(jwt=token, key=current_app.config['SECRET_KEY'], algorithms=['HS256'], options={"verify_signature": False})
-    print("decoded payload", payload)
-    print("----")
+    return get_valid_token_id(token) is not None
+
+
+def get_valid_token_id(token):
+    """
+    Validates an API token (see validate_token) and returns the id of its APIToken record.
+
+    Positive validations are cached in validated_token_cache, keyed by the token digest, for at most
+    TOKEN_CACHE_TTL_SECONDS and never beyond the expiration of the token (database expires_at and 'exp' claim).
+    Negative results are not cached.
+
+    Args:
+        token (str): API token to analyze.
+
+    Returns:
+        int: id of the APIToken record if the token is valid, None otherwise.
+    """
+    cache_key = token_digest(token)
+    token_id = validated_token_cache.get(cache_key)
+    if token_id is not None:
+        return token_id
+
     try:
         payload = jwt.decode(jwt=token, key=current_app.config['SECRET_KEY'], 
-                             algorithms=['HS256'], audience=current_app.config['APP_ID']) #, options={"verify_signature": False})
+                             algorithms=['HS256'], audience=current_app.config['APP_ID'])
 
-        api_token = APIToken.query.filter_by(token=token).first()
+        api_token = APIToken.query.filter_by(token_hash=cache_key).first()
+        if api_token and api_token.token != token:
+            api_token = None
         if not api_token:
             print("--- token not found!")
 
         if not api_token or api_token.revoked:
             print("--- token revoked!")
             # token not found in the database or has been revoked.
-            return False
+            return None
 
-        print("expires", api_token.expires_at)
         expires_at_utc = api_token.expires_at.replace(tzinfo=timezone.utc)
         if api_token.expires_at and expires_at_utc < datetime.now(timezone.utc):
             print("--- token expired!")
             # token has expired based on the records in the database
-            return False
+            return None
 
         app_id = current_app.config['APP_ID']
         if payload.get('iss') != app_id or payload.get('aud') != app_id:
             print("--- issued for a wrong app!")
             # token was not issued by or not issued for the current application
-            return False
+            return None
 
-        # Token is valid
-        return True
+        # Token is valid, remember it until the earliest of the expiration dates
+        expires_at = expires_at_utc.timestamp()
+        if 'exp' in payload:
+            expires_at = min(expires_at, payload['exp'])
+        validated_token_cache.set(cache_key, api_token.id, expires_at=expires_at)
+        return api_token.id
 
     except jwt.ExpiredSignatureError as e:
         print("-- expired signature exception!", e)
         # capture if the token has expired according to 'exp' claim
-        return False
+        return None
 
     except jwt.InvalidTokenError as e:
         print("--- invalid token exception!", e)
-        return False
+        return None
 
-    return False
+    return None
 
 def get_claim_from_token(token, claim):
     """
@@ -140,4 +180,59 @@ def get_claim_from_token(token, claim):
         print("exception when getting claim", e)
         # Return None if there are any issues with the token.
         return None
-    
\ No newline at end of file
+    
+
+
+class TokenUsageRecorder:
+    """
+    Write-behind buffer for APIToken.last_used_at.
+    API calls only record the time of use in memory, the buffered timestamps are written to the database
+    in a single batch at most once per flush interval, so the API hot path does not write per request.
+    Timestamps buffered in a worker that exits before the next flush are lost.
+    """
+
+    def __init__(self, flush_interval_seconds=30):
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending = {}                      # token id -> last time of use
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, token_id):
+        with self._lock:
+            self._pending[token_id] = datetime.now(timezone.utc)
+
+    def flush_due(self):
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval_seconds
+
+    def flush(self):
+        """
+        Writes the buffered timestamps to the database (one executemany UPDATE) and commits.
+
+        Returns:
+            int: number of tokens updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            db.session.execute(update(APIToken), [{'id': token_id, 'last_used_at': last_used_at}
+                                                  for token_id, last_used_at in pending.items()])
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f"Could not record API token usage: {e}")
+            # keep the timestamps for the next flush, unless newer ones were recorded meanwhile
+            with self._lock:
+                for token_id, last_used_at in pending.items():
+                    self._pending.setdefault(token_id, last_used_at)
+            return 0
+
+        return len(pending)
+
+
+# last-used timestamps of API tokens waiting to be written; interval set from the app config in create_app
+token_usage_recorder = TokenUsageRecorder()
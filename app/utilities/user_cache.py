@@ -0,0 +1,65 @@
+# cache of user identities for the Flask-Login user loader
+
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.utilities.cache_utilities import TTLCache
+
+# User columns kept in the cache: those of the user loader, views and templates; never the password hash
+CACHED_COLUMNS = ('id', 'username', 'given_name', 'surname', 'email', 'phone', 'last_logon', 'role')
+
+
+class UserCache:
+    """
+    Serves the logged-in user to Flask-Login without a database round-trip on every request.
+
+    The CACHED_COLUMNS values of User rows are cached as plain dictionaries (the role is kept by name), so any backend
+    with the get/set/delete interface of TTLCache can be used, including one shared between worker processes.
+    By default an in-process TTLCache sized from USER_CACHE_MAX_ENTRIES and USER_CACHE_TTL_SECONDS is used.
+
+    On a cache hit, load() returns a detached User object built from the cached values. It supports the role
+    checks and attributes used in views and templates, but is not tracked by the session: views that modify
+    the logged-in user or check its password must load the row from the database
+    (e.g. db.session.get(User, current_user.id)): the password hash is not cached.
+    Any change to a user row must be followed by invalidate(user_id).
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or TTLCache()
+
+    def init_app(self, app, backend=None):
+        if backend is not None:
+            self.backend = backend
+        elif isinstance(self.backend, TTLCache):
+            self.backend.configure(max_entries=app.config.get('USER_CACHE_MAX_ENTRIES', 1024),
+                                   ttl_seconds=app.config.get('USER_CACHE_TTL_SECONDS', 60))
+
+    def load(self, user_id):
+        """
+        Returns the User with the given id, or None if there is no such user.
+        """
+        from app.models import User, UserRole  # Import here to avoid circular dependencies
+
+        values = self.backend.get(user_id)
+        if values is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                values = {column: getattr(user, column) for column in CACHED_COLUMNS}
+                values['role'] = user.role.name if user.role else None
+                self.backend.set(user_id, values)
+            return user
+
+        values = dict(values)
+        values['role'] = UserRole[values['role']] if values['role'] else None
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def invalidate(self, user_id):
+        """
+        Removes a user from the cache. To be called whenever a user row is changed or deleted.
+        """
+        self.backend.delete(user_id)
+
+
+# identities of logged-in users; configured from the app config in create_app
+user_cache = UserCache()
@@ -0,0 +1,143 @@
+# benchmark of compressed sync API bodies: transfer size and sync time of /api/bulk_update (compressed request)
+# and /api/purchases/ (compressed response), uncompressed vs. each supported content coding.
+# the sync time is the server time (Flask test client, no network) plus the transfer time at the given link speed.
+# start with:
+# py benchmarks/bench_api_compression.py [link Mbit/s] [sizes...]     e.g. py benchmarks/bench_api_compression.py 100 10000 100000
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy import insert, update
+from app import create_app, db
+from app.models import APIToken, Purchases, SalesItem
+from app.utilities.http_compression import supported_encodings, zstandard
+from app.utilities.token_utilities import generate_token
+from config import Config
+
+DEFAULT_LINK_MBITS = 100
+DEFAULT_SIZES = [10000, 100000]
+BATCH_SIZE = 10000
+
+
+def make_payload(number_of_items):
+    """
+    Generate a /api/bulk_update payload in the shape the warehouse sends.
+    """
+    return json.dumps({'stock_updates': [{'code': f"BENCH-{i:07d}",
+                                          'name': f"Benchmark item {i}",
+                                          'description': "Item generated by the API compression benchmark.",
+                                          'vendor.name': f"Vendor {i % 50}",
+                                          'price_per_unit': round(1 + (i % 1000) * 0.25, 2),
+                                          'units_in_stock': i % 100} for i in range(number_of_items)]}).encode('utf-8')
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    if encoding == 'deflate':
+        return zlib.compress(data, 6)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'deflate':
+        return zlib.decompress(data)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def populate_purchases(number_of_purchases):
+    for start in range(0, number_of_purchases, BATCH_SIZE):
+        db.session.execute(insert(Purchases), [
+            {'purchase_code': f"P-{i:08d}", 'salesitem_code': f"BENCH-{i % 1000:07d}",
+             'salesitem_name': f"Benchmark item {i % 1000}", 'salesitem_vendor_name': f"Vendor {i % 50}",
+             'salesitem_item_base_price': 10.0, 'salesitem_purchase_price': 11.5, 'quantity': 1 + i % 3,
+             'total_price': 11.5 * (1 + i % 3), 'requires_sync': True}
+            for i in range(start, min(start + BATCH_SIZE, number_of_purchases))])
+    db.session.commit()
+
+
+def print_row(endpoint, size, encoding, raw_bytes, sent_bytes, server_seconds, link_mbits):
+    transfer_seconds = sent_bytes * 8 / (link_mbits * 1_000_000)
+    print(f"{endpoint:>14} {size:>7} {encoding:>8} {sent_bytes:>11} {raw_bytes / sent_bytes:>6.1f}x "
+          f"{server_seconds:>8.2f} {transfer_seconds:>9.2f} {server_seconds + transfer_seconds:>8.2f}")
+
+
+def main(link_mbits, sizes):
+    encodings = ['identity'] + supported_encodings()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+            token = generate_token(expires_at)
+            db.session.add(APIToken(token=token, expires_at=expires_at.replace(tzinfo=None)))
+            db.session.commit()
+        headers = {'Authorization': f"Bearer {token}"}
+        client = app.test_client()
+
+        print(f"link speed {link_mbits} Mbit/s; codings: {', '.join(encodings)}")
+        print(f"{'endpoint':>14} {'items':>7} {'coding':>8} {'bytes sent':>11} {'ratio':>7} "
+              f"{'server s':>8} {'network s':>9} {'total s':>8}")
+        for size in sizes:
+            payload = make_payload(size)
+            # the first, untimed run leaves the table in the state every timed run starts from (items deleted)
+            for run, encoding in enumerate(['identity'] + encodings):
+                with app.app_context():
+                    db.session.query(SalesItem).delete()
+                    db.session.commit()
+                body = compress(payload, encoding)
+                request_headers = {**headers, 'Content-Type': 'application/json'}
+                if encoding != 'identity':
+                    request_headers['Content-Encoding'] = encoding
+                start = time.perf_counter()
+                response = client.post('/api/bulk_update', data=body, headers=request_headers)
+                elapsed = time.perf_counter() - start
+                assert response.status_code == 200, response.data[:200]
+                assert response.get_json()['stock_updates']['added_count'] == size
+                if run > 0:
+                    print_row('bulk_update', size, encoding, len(payload), len(body), elapsed, link_mbits)
+
+            with app.app_context():
+                db.session.query(Purchases).delete()
+                db.session.commit()
+                populate_purchases(size)
+            for encoding in encodings:
+                with app.app_context():
+                    # every run exports all purchases
+                    db.session.execute(update(Purchases).values(requires_sync=True))
+                    db.session.commit()
+                start = time.perf_counter()
+                response = client.get('/api/purchases/', headers={**headers, 'Accept-Encoding': encoding})
+                data = response.get_data()
+                elapsed = time.perf_counter() - start
+                assert response.status_code == 200
+                assert response.headers.get('Content-Encoding', 'identity') == encoding
+                raw = decompress(data, encoding)
+                assert len(json.loads(raw)) == size
+                print_row('purchases', size, encoding, len(raw), len(data), elapsed, link_mbits)
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(float(args[0]) if args else DEFAULT_LINK_MBITS, [int(arg) for arg in args[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,128 @@
+# benchmark of the /api/bulk_update payload formats: records vs. columns, JSON (streamed or in memory) vs. MessagePack.
+# for each format: payload size, parse time alone, and parse + apply time of a full catalog push, once into an empty
+# store ("insert") and once unchanged ("resend", where parsing dominates).
+# start with:
+# py benchmarks/bench_bulk_formats.py [sizes...]     e.g. py benchmarks/bench_bulk_formats.py 10000 100000
+
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app import create_app, db
+from app.models import APIToken, SalesItem
+from app.utilities.json_stream import iter_json_object
+from app.utilities.token_utilities import generate_token
+from config import Config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_SIZES = [10000, 100000]
+
+FIELDS = ['code', 'name', 'description', 'vendor.name', 'price_per_unit', 'units_in_stock']
+
+
+def make_columns(number_of_items):
+    """
+    Generate the stock updates of a full catalog push, one list of values per field.
+    """
+    return {'code': [f"BENCH-{i:07d}" for i in range(number_of_items)],
+            'name': [f"Benchmark item {i}" for i in range(number_of_items)],
+            'description': ["Item generated by the bulk format benchmark."] * number_of_items,
+            'vendor.name': [f"Vendor {i % 50}" for i in range(number_of_items)],
+            'price_per_unit': [round(1 + (i % 1000) * 0.25, 2) for i in range(number_of_items)],
+            'units_in_stock': [i % 100 for i in range(number_of_items)]}
+
+
+def make_records(columns):
+    return [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+
+
+def formats(columns):
+    """
+    Returns (name, content type, streamed, body) of each payload format.
+    """
+    records = {'stock_updates': make_records(columns)}
+    columnar = {'stock_updates': columns}
+    payloads = [('json records', 'application/json', True, json.dumps(records).encode('utf-8')),
+                ('json records', 'application/json', False, json.dumps(records).encode('utf-8')),
+                ('json columns', 'application/json', True, json.dumps(columnar).encode('utf-8')),
+                ('json columns', 'application/json', False, json.dumps(columnar).encode('utf-8'))]
+    if msgpack is not None:
+        payloads += [('msgpack records', 'application/msgpack', False, msgpack.packb(records)),
+                     ('msgpack columns', 'application/msgpack', False, msgpack.packb(columnar))]
+    return payloads
+
+
+def parse(content_type, streamed, body):
+    # the decoding step of each format as done by bulk_update, without applying the data
+    if content_type == 'application/msgpack':
+        return msgpack.unpackb(body, raw=False)
+    if streamed:
+        return sum(1 for _ in iter_json_object(io.BytesIO(body)))
+    return json.loads(body)
+
+
+def post(client, headers, content_type, body):
+    start = time.perf_counter()
+    response = client.post('/api/bulk_update', data=body, headers={**headers, 'Content-Type': content_type})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.data[:200]
+    return elapsed, response.get_json()['stock_updates']
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+            token = generate_token(expires_at)
+            db.session.add(APIToken(token=token, expires_at=expires_at.replace(tzinfo=None)))
+            db.session.commit()
+        headers = {'Authorization': f"Bearer {token}"}
+        client = app.test_client()
+
+        if msgpack is None:
+            print("msgpack not installed, MessagePack formats skipped")
+        print(f"{'items':>7} {'format':>16} {'mode':>9} {'bytes':>10} {'parse s':>8} {'insert s':>9} {'resend s':>9}"
+              f"  added/unchanged")
+        for size in sizes:
+            columns = make_columns(size)
+            payloads = formats(columns)
+            # the first, untimed run leaves the table in the state every timed run starts from (items deleted)
+            for run, (name, content_type, streamed, body) in enumerate(payloads[:1] + payloads):
+                app.config['BULK_UPDATE_STREAMING'] = streamed
+                with app.app_context():
+                    db.session.query(SalesItem).delete()
+                    db.session.commit()
+
+                start = time.perf_counter()
+                parse(content_type, streamed, body)
+                parse_seconds = time.perf_counter() - start
+                insert_seconds, inserted = post(client, headers, content_type, body)
+                resend_seconds, resent = post(client, headers, content_type, body)
+                assert inserted['added_count'] == size and resent['unchanged_count'] == size
+                if run > 0:
+                    print(f"{size:>7} {name:>16} {'streamed' if streamed else 'memory':>9} {len(body):>10} "
+                          f"{parse_seconds:>8.3f} {insert_seconds:>9.3f} {resend_seconds:>9.3f}  "
+                          f"{inserted['added_count']}/{resent['unchanged_count']}")
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,125 @@
+# benchmark of the catalog search: query latency of the FTS5 table and the in-process index vs. a LIKE '%term%' scan.
+# start with:
+# py benchmarks/bench_catalog_search.py [items] [queries]     e.g. py benchmarks/bench_catalog_search.py 100000 200
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy import insert, or_, and_
+from app import create_app, db
+from app.models import SalesItem
+from app.utilities.catalog_search import catalog_search, search_terms
+from config import Config
+
+DEFAULT_ITEMS = 100000
+DEFAULT_QUERIES = 200
+PAGE_SIZE = 10
+VOCABULARY_SIZE = 20000
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'bra', 'cor', 'den', 'fil', 'gan', 'hur', 'jun']
+VENDORS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay', 'Soylent', 'Stark', 'Wayne', 'Tyrell']
+BATCH_SIZE = 10000
+
+
+def vocabulary():
+    # synthetic words with a Zipf-like frequency distribution, as in real item texts: few common, many rare words
+    words = sorted({''.join(random.choices(SYLLABLES, k=random.randint(2, 4))) for _ in range(VOCABULARY_SIZE)})
+    random.shuffle(words)
+    cumulative_weights = []
+    total = 0.0
+    for rank in range(len(words)):
+        total += 1 / (rank + 1)
+        cumulative_weights.append(total)
+    return words, cumulative_weights
+
+
+def populate(number_of_items, words, cumulative_weights):
+    def some_words(k):
+        return random.choices(words, cum_weights=cumulative_weights, k=k)
+
+    for start in range(0, number_of_items, BATCH_SIZE):
+        db.session.execute(insert(SalesItem), [
+            {'code': f'SR-{i:06d}', 'name': ' '.join(some_words(3)).title(),
+             'description': ' '.join(some_words(12)) + f' model {random.randrange(1000)}',
+             'vendor_name': random.choice(VENDORS), 'price_per_unit': 1.0, 'units_in_stock': 10, 'units_purchased': 0}
+            for i in range(start, min(start + BATCH_SIZE, number_of_items))])
+    db.session.commit()
+
+
+def sample_queries(number_of_queries, words, cumulative_weights):
+    # one or two words, or a word prefix, or an item code prefix
+    queries = []
+    for _ in range(number_of_queries):
+        kind = random.randrange(4)
+        some_words = random.choices(words, cum_weights=cumulative_weights, k=2)
+        if kind == 0:
+            queries.append(some_words[0])
+        elif kind == 1:
+            queries.append(' '.join(some_words))
+        elif kind == 2:
+            queries.append(some_words[0][:4])
+        else:
+            queries.append(f'SR-{random.randrange(1000):03d}')
+    return queries
+
+
+def like_search(query_text):
+    # the naive alternative: every term must occur in one of the fields, no ranking
+    conditions = [or_(*(field.ilike(f'%{term}%') for field in (SalesItem.code, SalesItem.name, SalesItem.description,
+                                                                 SalesItem.vendor_name)))
+                  for term in search_terms(query_text)]
+    return SalesItem.query.filter(and_(*conditions)).order_by(SalesItem.id).limit(PAGE_SIZE).all()
+
+
+def measure(label, search_function, queries):
+    latencies = []
+    for query_text in queries:
+        start = time.perf_counter()
+        search_function(query_text)
+        latencies.append(time.perf_counter() - start)
+        db.session.rollback()
+    latencies.sort()
+    print(f"{label:>14} {len(queries):>8} {statistics.median(latencies) * 1000:>9.2f} "
+          f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:>9.2f} "
+          f"{max(latencies) * 1000:>9.2f}")
+
+
+def main(number_of_items, number_of_queries):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+            SEARCH_BACKEND = 'fts5'
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            start = time.perf_counter()
+            words, cumulative_weights = vocabulary()
+            populate(number_of_items, words, cumulative_weights)
+            print(f"{number_of_items} items inserted and indexed in {time.perf_counter() - start:.1f} s")
+            queries = sample_queries(number_of_queries, words, cumulative_weights)
+
+            print(f"{'backend':>14} {'queries':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+            measure('fts5', lambda query_text: catalog_search.search(query_text, 1, PAGE_SIZE), queries)
+
+            catalog_search.backend = 'memory'
+            start = time.perf_counter()
+            catalog_search.search('warmup', 1, PAGE_SIZE)        # builds the in-process index
+            build_seconds = time.perf_counter() - start
+            measure('memory', lambda query_text: catalog_search.search(query_text, 1, PAGE_SIZE), queries)
+            print(f"{'':>14} in-process index built in {build_seconds:.1f} s")
+
+            measure('LIKE scan', like_search, queries)
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else DEFAULT_ITEMS,
+         int(args[1]) if len(args) > 1 else DEFAULT_QUERIES)
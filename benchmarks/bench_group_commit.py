@@ -0,0 +1,102 @@
+# benchmark of purchase group commit: purchases/sec and request latency, one commit per purchase vs. batch windows.
+# start with:
+# py benchmarks/bench_group_commit.py [threads] [purchases] [batch windows in ms...]     e.g. py benchmarks/bench_group_commit.py 32 2000 1 5 20
+
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app import create_app, db
+from app.models import SalesItem, Purchases, User, UserRole
+from app.utilities.purchase_queue import purchase_queue
+from config import Config
+
+DEFAULT_THREADS = 32
+DEFAULT_PURCHASES = 2000
+DEFAULT_WINDOWS_MS = [1, 5, 20]
+NUMBER_OF_ITEMS = 20
+
+
+def buyer(app, item_ids, user_id, purchases, latencies, start_barrier):
+    """
+    Buys one unit of the items in turn, recording the latency of each purchase.
+    """
+    with app.app_context():
+        start_barrier.wait()
+        for i in range(purchases):
+            start = time.perf_counter()
+            purchase_queue.submit(item_ids[i % len(item_ids)], user_id, 1)
+            latencies.append(time.perf_counter() - start)
+        db.session.remove()
+
+
+def run(app, threads, purchases, window_ms):
+    purchase_queue.enabled = window_ms is not None
+    purchase_queue.batch_window_seconds = (window_ms or 0) / 1000
+
+    with app.app_context():
+        db.session.query(Purchases).delete()
+        db.session.query(SalesItem).delete()
+        items = [SalesItem(code=f'GC-{i}', name=f'Item {i}', vendor_name='Vendor', price_per_unit=1.5,
+                           units_in_stock=purchases, units_purchased=0) for i in range(NUMBER_OF_ITEMS)]
+        db.session.add_all(items)
+        db.session.commit()
+        item_ids = [item.id for item in items]
+        user_id = User.query.filter_by(username='bench').one().id
+
+    latencies = []
+    start_barrier = threading.Barrier(threads + 1)
+    per_thread = purchases // threads
+    workers = [threading.Thread(target=buyer, args=(app, item_ids, user_id, per_thread, latencies, start_barrier))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        recorded = Purchases.query.count()
+        db.session.remove()
+    assert recorded == per_thread * threads, f"{recorded} purchases recorded, {per_thread * threads} made"
+
+    latencies.sort()
+    mode = 'per-purchase' if window_ms is None else f'group {window_ms} ms'
+    print(f"{mode:>13} {threads:>7} {len(latencies):>9} {elapsed:>8.2f} {len(latencies) / elapsed:>10.0f} "
+          f"{statistics.median(latencies) * 1000:>9.1f} {latencies[int(len(latencies) * 0.99) - 1] * 1000:>9.1f}")
+
+
+def main(threads, purchases, windows_ms):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+            SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            user = User(username='bench', role=UserRole.CUSTOMER, given_name='Bench', surname='Mark')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+
+        print(f"{'mode':>13} {'threads':>7} {'purchases':>9} {'seconds':>8} {'buys/sec':>10} {'p50 ms':>9} {'p99 ms':>9}")
+        for window_ms in [None] + windows_ms:
+            run(app, threads, purchases, window_ms)
+
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else DEFAULT_THREADS,
+         int(args[1]) if len(args) > 1 else DEFAULT_PURCHASES,
+         [int(arg) for arg in args[2:]] or DEFAULT_WINDOWS_MS)
@@ -0,0 +1,123 @@
+# stress benchmark of concurrent purchases of one hot item: checks that the stock is never oversold.
+# "atomic" runs make_purchase (conditional UPDATE), "legacy" the former read-modify-write of finalize_purchase.
+# start with:
+# py benchmarks/bench_purchase_contention.py [threads] [units_in_stock] [mode...]     e.g. py benchmarks/bench_purchase_contention.py 16 2000 atomic legacy
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.models import SalesItem, Purchases, User, UserRole
+from app.utilities.purchase_utilities import make_purchase, SoldOut
+from config import Config
+
+DEFAULT_THREADS = 16
+DEFAULT_UNITS_IN_STOCK = 2000
+DEFAULT_MODES = ['atomic', 'legacy']
+
+
+def legacy_purchase(item_id, user_id, quantity):
+    """
+    finalize_purchase before the conditional UPDATE: read the item, check and decrement the stock in Python.
+    """
+    item = db.session.get(SalesItem, item_id)
+    if item.units_in_stock < quantity:
+        db.session.rollback()
+        raise SoldOut(item_id, quantity, item.units_in_stock)
+    item.units_in_stock -= quantity
+    item.units_purchased += quantity
+    db.session.add(Purchases(salesitem_id=item.id, purchase_code=item.code, salesitem_code=item.code,
+                             salesitem_name=item.name, salesitem_vendor_name=item.vendor_name, user_id=user_id,
+                             quantity=quantity, salesitem_purchase_price=item.price_per_unit,
+                             total_price=item.price_per_unit * quantity))
+    db.session.commit()
+
+
+def buyer(app, purchase, item_id, user_id, counters, start_barrier):
+    """
+    Buys one unit at a time until the item is sold out.
+    """
+    with app.app_context():
+        start_barrier.wait()
+        while True:
+            try:
+                purchase(item_id, user_id, 1)
+                counters['purchases'] += 1
+            except SoldOut:
+                break
+            except OperationalError:     # e.g. database is locked
+                db.session.rollback()
+                counters['errors'] += 1
+        db.session.remove()
+
+
+def run(app, mode, threads, units_in_stock):
+    purchase = make_purchase if mode == 'atomic' else legacy_purchase
+    with app.app_context():
+        db.session.query(Purchases).delete()
+        db.session.query(SalesItem).delete()
+        item = SalesItem(code='HOT-1', name='Hot item', vendor_name='Vendor', price_per_unit=9.99,
+                         units_in_stock=units_in_stock, units_purchased=0)
+        db.session.add(item)
+        db.session.commit()
+        item_id = item.id
+        user_id = User.query.filter_by(username='bench').one().id
+
+    counters = {'purchases': 0, 'errors': 0}    # updated under the GIL, += on dict items is good enough here
+    start_barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=buyer, args=(app, purchase, item_id, user_id, counters, start_barrier))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        item = db.session.get(SalesItem, item_id)
+        recorded_units = db.session.query(db.func.coalesce(db.func.sum(Purchases.quantity), 0)).scalar()
+        oversold = recorded_units - units_in_stock
+        print(f"{mode:>7} {threads:>7} {units_in_stock:>6} {elapsed:>9.3f} {counters['purchases'] / elapsed:>10.0f} "
+              f"{recorded_units:>9} {item.units_in_stock:>9} {item.units_purchased:>9} {counters['errors']:>7} {oversold:>8}")
+        db.session.remove()
+    return oversold
+
+
+def main(threads, units_in_stock, modes):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+            SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            user = User(username='bench', role=UserRole.CUSTOMER, given_name='Bench', surname='Mark')
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+
+        print(f"{'mode':>7} {'threads':>7} {'stock':>6} {'seconds':>9} {'buys/sec':>10} "
+              f"{'purchased':>9} {'left':>9} {'counter':>9} {'errors':>7} {'oversold':>8}")
+        results = {mode: run(app, mode, threads, units_in_stock) for mode in modes}
+
+        with app.app_context():
+            db.engine.dispose()
+
+    if results.get('atomic', 0) != 0:
+        sys.exit("atomic purchases oversold the item")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else DEFAULT_THREADS,
+         int(args[1]) if len(args) > 1 else DEFAULT_UNITS_IN_STOCK,
+         args[2:] or DEFAULT_MODES)
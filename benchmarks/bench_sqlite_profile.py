@@ -0,0 +1,107 @@
+# benchmark of the SQLite profile: concurrent catalog reads and purchases with the SQLite defaults vs. the tuned pragmas.
+# start with:
+# py benchmarks/bench_sqlite_profile.py [seconds] [readers] [writers]     e.g. py benchmarks/bench_sqlite_profile.py 10 8 4
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.models import SalesItem, User, UserRole
+from app.utilities.purchase_utilities import make_purchase
+from config import Config
+
+DEFAULT_SECONDS = 10
+DEFAULT_READERS = 8
+DEFAULT_WRITERS = 4
+NUMBER_OF_ITEMS = 2000
+PAGE_SIZE = 10
+
+
+def reader(app, stop, counters):
+    """
+    Reads random catalog pages, as main.index does without the page cache.
+    """
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                start_id = random.randrange(NUMBER_OF_ITEMS)
+                SalesItem.query.filter(SalesItem.id > start_id).order_by(SalesItem.id).limit(PAGE_SIZE).all()
+                db.session.rollback()
+                counters['reads'] += 1
+            except OperationalError:
+                db.session.rollback()
+                counters['errors'] += 1
+        db.session.remove()
+
+
+def writer(app, user_id, stop, counters):
+    """
+    Purchases one unit of random items.
+    """
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                make_purchase(random.randrange(NUMBER_OF_ITEMS) + 1, user_id, 1)
+                counters['writes'] += 1
+            except OperationalError:
+                counters['errors'] += 1
+        db.session.remove()
+
+
+def run(label, tmp_dir, seconds, readers, writers, tuning):
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, f'bench-{label}.db')
+        SQLITE_TUNING = tuning
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        user = User(username='bench', role=UserRole.CUSTOMER, given_name='Bench', surname='Mark')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.add_all([SalesItem(code=f'SQ-{i}', name=f'Item {i}', vendor_name='Vendor', price_per_unit=2.5,
+                                      units_in_stock=1000000, units_purchased=0) for i in range(NUMBER_OF_ITEMS)])
+        db.session.commit()
+        user_id = user.id
+        journal_mode = db.session.execute(text("PRAGMA journal_mode")).scalar()
+        synchronous = db.session.execute(text("PRAGMA synchronous")).scalar()
+        db.session.remove()
+
+    counters = {'reads': 0, 'writes': 0, 'errors': 0}     # updated under the GIL, += on dict items is good enough here
+    stop = threading.Event()
+    threads = [threading.Thread(target=reader, args=(app, stop, counters)) for _ in range(readers)] + \
+              [threading.Thread(target=writer, args=(app, user_id, stop, counters)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{label:>8} {journal_mode:>8} {synchronous:>5} {counters['reads'] / seconds:>10.0f} "
+          f"{counters['writes'] / seconds:>11.0f} {counters['errors']:>7}")
+    with app.app_context():
+        db.engine.dispose()
+
+
+def main(seconds, readers, writers):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{readers} reader and {writers} writer threads, {seconds} s per run")
+        print(f"{'profile':>8} {'journal':>8} {'sync':>5} {'reads/sec':>10} {'writes/sec':>11} {'errors':>7}")
+        run('default', tmp_dir, seconds, readers, writers, tuning=False)
+        run('tuned', tmp_dir, seconds, readers, writers, tuning=True)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else DEFAULT_SECONDS,
+         int(args[1]) if len(args) > 1 else DEFAULT_READERS,
+         int(args[2]) if len(args) > 2 else DEFAULT_WRITERS)
@@ -0,0 +1,93 @@
+# benchmark of update_items: row-by-row ORM loop vs. set-based bulk upsert.
+# stages: insert, full update, resend of the same records (no-op), delta of the stock of 10% of the items.
+# start with:
+# py benchmarks/bench_update_items.py [sizes...]     e.g. py benchmarks/bench_update_items.py 1000 10000 100000
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app import create_app, db
+from app.models import SalesItem
+from app.utilities.sync_utilities import update_items
+from config import Config
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+FIELD_MAPPING = {'code': 'code',
+                 'name': 'name',
+                 'description': 'description',
+                 'vendor.name': 'vendor_name',
+                 'price_per_unit': 'price_per_unit',
+                 'units_in_stock': 'units_in_stock',
+                 }
+
+
+def make_items(number_of_items, revision=0):
+    """
+    Generate warehouse stock updates in the same shape as /api/bulk_update receives them.
+    """
+    return [{'code': f"BENCH-{i:07d}",
+             'name': f"Benchmark item {i} rev {revision}",
+             'description': "Item generated by the update_items benchmark.",
+             'vendor.name': f"Vendor {i % 50}",
+             'price_per_unit': round(1 + (i % 1000) * 0.25, 2),
+             'units_in_stock': (i + revision) % 100} for i in range(number_of_items)]
+
+
+def make_delta(number_of_items, revision):
+    """
+    Generate delta stock updates: only the code and the new stock of every 10th item.
+    """
+    return [{'code': f"BENCH-{i:07d}", 'units_in_stock': (i + revision) % 100} for i in range(0, number_of_items, 10)]
+
+
+def run_update(items, bulk):
+    db.session.query(SalesItem).delete()
+    db.session.commit()
+
+    results = []
+    stages = (("insert", items),
+              ("update", make_items(len(items), 1)),
+              ("resend", make_items(len(items), 1)),
+              ("delta", make_delta(len(items), 2)))
+    for stage, incoming_data in stages:
+        start = time.perf_counter()
+        result = update_items(target_model=SalesItem,
+                              key_col_target='code',
+                              incoming_data=incoming_data,
+                              key_col_incoming='code',
+                              field_mapping=FIELD_MAPPING,
+                              timestamp_col='last_updated',
+                              bulk=bulk)
+        elapsed = time.perf_counter() - start
+        assert result.operation_success(), result.result_message
+        results.append((stage, len(incoming_data), elapsed, result))
+    return results
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'bench.db')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            print(f"{'items':>8} {'mode':>5} {'stage':>7} {'seconds':>9} {'rows/sec':>10}  added/updated/unchanged/erroneous")
+            for size in sizes:
+                items = make_items(size)
+                for bulk in (False, True):
+                    for stage, records, elapsed, result in run_update(items, bulk):
+                        print(f"{size:>8} {'bulk' if bulk else 'orm':>5} {stage:>7} {elapsed:>9.3f} {records / elapsed:>10.0f}  "
+                              f"{result.added_count}/{result.updated_count}/{result.unchanged_count}/"
+                              f"{result.erroneous_count}")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
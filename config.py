@@ -27,4 +27,51 @@ class Config:
     # DEFAULT_PROTOCOL = "http"   # "https"
     USE_HTTPS = True                # determines if to use HTTP or HTTPS
     PROD_ENV = False      # If False, SSL certificates will not be verified. Set to True for production.
-    USE_PORT = 5050     # port number that the system will run on    
\ No newline at end of file
+    USE_PORT = 5050     # port number that the system will run on
+    SYNC_BULK_OPERATIONS = True     # if True, warehouse sync applies set-based (bulk) SQL instead of per-row ORM operations
+    SYNC_CHUNK_SIZE = 500           # max number of keys per IN (...) list, keeps well below SQLite's bound parameter limit
+    BULK_UPDATE_STREAMING = True    # if True, /api/bulk_update parses the request body incrementally and applies it in batches
+    BULK_UPDATE_BATCH_SIZE = 1000   # number of items per batch applied by the streaming /api/bulk_update
+    BULK_UPDATE_MAX_VALUE_CHARS = 64 * 1024 * 1024  # streaming /api/bulk_update: max length (characters of JSON) of one record or columnar dataset (400 beyond)
+    PURCHASES_EXPORT_BATCH_SIZE = 500   # number of purchases read and serialized at once by the streamed /api/purchases/ export
+    PURCHASES_EXPORT_MAX_PAGE_SIZE = 5000   # max number of purchases per page of the paged /api/purchases/?limit=... export
+    TOKEN_CACHE_TTL_SECONDS = 60    # max time a validated API token is trusted without checking the database again
+    TOKEN_CACHE_MAX_ENTRIES = 256   # max number of validated API tokens kept in the cache of each worker
+    TOKEN_USAGE_FLUSH_SECONDS = 30  # API token last-used timestamps are buffered and written to the database at this interval
+    USER_CACHE_TTL_SECONDS = 60     # max time a logged-in user's identity and role are served from cache without checking the database
+    USER_CACHE_MAX_ENTRIES = 1024   # max number of users kept in the cache of each worker
+    CATALOG_CACHE_TTL_SECONDS = 30  # max age of a cached catalog page; bounds staleness across worker processes
+    CATALOG_CACHE_MAX_ENTRIES = 512 # max number of rendered catalog pages kept per worker
+    PAGINATION_MODE = 'keyset'      # list views: 'keyset' (previous/next by cursor, constant cost per page) or 'offset' (numbered pages)
+    PAGINATION_COUNT_TTL_SECONDS = 60   # how long the approximate row totals shown with keyset pagination are cached
+    RESERVATION_TTL_SECONDS = 600   # how long units are held for a customer between purchase verification and finalization
+    RESERVATION_SWEEP_SECONDS = 60  # interval of the background job releasing expired reservations; 0 disables it
+    IDEMPOTENCY_KEY_TTL_SECONDS = 86400 # how long repeated purchase submissions (same idempotency key) are recognized
+    IDEMPOTENCY_PURGE_SECONDS = 3600    # interval of the background job deleting expired idempotency keys; 0 disables it
+    PURCHASE_GROUP_COMMIT = False   # commit concurrent purchases in batches (one transaction per batch) instead of one transaction each
+    PURCHASE_BATCH_WINDOW_MS = 5    # group commit: how long purchases are collected into a batch
+    PURCHASE_BATCH_MAX_SIZE = 100   # group commit: max number of purchases per batch
+    PURCHASE_QUEUE_TIMEOUT_SECONDS = 30 # group commit: max wait of a request for the commit of its purchase, which fails beyond
+    SQLITE_TUNING = True            # apply the SQLITE_* pragmas below to each SQLite connection; keys set to None keep the SQLite default
+    SQLITE_JOURNAL_MODE = 'WAL'     # readers are not blocked by a writer, commits append to the write-ahead log
+    SQLITE_SYNCHRONOUS = 'NORMAL'   # with WAL: fsync at checkpoints only; the last commits may be lost on power loss, never corrupted
+    SQLITE_BUSY_TIMEOUT_MS = 5000   # how long a connection waits for a lock before 'database is locked'
+    SQLITE_CACHE_SIZE_KIB = 65536   # page cache per connection
+    SQLITE_MMAP_SIZE = 268435456    # bytes of the database file read through memory mapping
+    SQLITE_TEMP_STORE = 'MEMORY'    # temporary tables and indices (sorting, grouping) are kept in memory
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('REPLICA_DATABASE_URIS', '').split(',') if uri]  # read replicas; reads of GET requests are spread over them
+    REPLICA_STICKY_SECONDS = 10     # after a write, the user's requests read from the primary for this long (read-your-writes)
+    SQLALCHEMY_POOL_SIZE = 5        # connections kept open in the pool of each worker (per database)
+    SQLALCHEMY_MAX_OVERFLOW = 10    # extra connections opened under burst load beyond the pool size, closed when returned
+    SQLALCHEMY_POOL_TIMEOUT = 30    # max seconds a request waits for a free connection before failing
+    SQLALCHEMY_POOL_RECYCLE = 1800  # connections older than this (seconds) are replaced on checkout
+    SQLALCHEMY_POOL_PRE_PING = True # connections are tested on checkout, stale ones are replaced transparently
+    SQLALCHEMY_POOL_METRICS = True  # if True, pool checkout wait times, timeouts and overflow are recorded for /api/metrics
+    SEARCH_BACKEND = 'auto'         # catalog search: 'fts5' (SQLite FTS5 table), 'memory' (in-process index), 'auto' (FTS5 if available)
+    SEARCH_INDEX_TTL_SECONDS = 300  # max age of the in-process search index of each worker ('memory' backend)
+    CATALOG_PRICE_BUCKETS = [10, 25, 50, 100, 250]   # boundaries of the price ranges offered as catalog filter, with item counts
+    API_COMPRESSION = True          # API accepts gzip/deflate (and zstd, if the optional zstandard is installed, see requirements.txt) request bodies and compresses responses as negotiated
+    API_COMPRESSION_MIN_BYTES = 1024    # API responses shorter than this are sent uncompressed
+    API_GZIP_LEVEL = 6              # compression level of gzip/deflate API responses (1 fastest - 9 smallest)
+    API_ZSTD_LEVEL = 3              # compression level of zstd API responses
+    API_MAX_DECOMPRESSED_BYTES = 512 * 1024 * 1024  # max size of a compressed API request body once decompressed (413 beyond)
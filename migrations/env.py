@@ -94,6 +94,14 @@ def run_migrations_online():
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
 
+    # the catalog search table (FTS5) and its shadow tables are not part of the models,
+    # keep autogenerate from dropping them
+    def include_name(name, type_, parent_names):
+        return not (type_ == 'table' and name.startswith('sales_items_fts'))
+
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
+
     connectable = get_engine()
 
     with connectable.connect() as connection:
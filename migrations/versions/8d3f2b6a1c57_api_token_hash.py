@@ -0,0 +1,42 @@
+"""api token hash
+
+Revision ID: 8d3f2b6a1c57
+Revises: bbba3767947d
+Create Date: 2026-10-18 11:02:15.904127
+
+"""
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f2b6a1c57'
+down_revision = 'bbba3767947d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('api_tokens', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_hash', sa.String(length=64), nullable=True))
+
+    # fill in the digest of the existing tokens
+    api_tokens = sa.table('api_tokens',
+                          sa.column('id', sa.Integer),
+                          sa.column('token', sa.String),
+                          sa.column('token_hash', sa.String))
+    connection = op.get_bind()
+    for token_id, token in connection.execute(sa.select(api_tokens.c.id, api_tokens.c.token)).all():
+        connection.execute(api_tokens.update()
+                           .where(api_tokens.c.id == token_id)
+                           .values(token_hash=hashlib.sha256(token.encode('utf-8')).hexdigest()))
+
+    with op.batch_alter_table('api_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_api_tokens_token_hash'), ['token_hash'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('api_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_tokens_token_hash'))
+        batch_op.drop_column('token_hash')
@@ -0,0 +1,29 @@
+"""sales items content hash and version for delta sync
+
+Revision ID: 9b2e6f4d8a31
+Revises: f3b7d92a6c15
+Create Date: 2026-10-18 22:41:09.518273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e6f4d8a31'
+down_revision = 'f3b7d92a6c15'
+branch_labels = None
+depends_on = None
+
+
+# existing items get version 1 and no hash; the hash is filled in by the first sync that includes the item
+def upgrade():
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.drop_column('version')
+        batch_op.drop_column('content_hash')
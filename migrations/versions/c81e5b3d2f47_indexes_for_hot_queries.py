@@ -0,0 +1,45 @@
+"""indexes for hot queries
+
+Revision ID: c81e5b3d2f47
+Revises: a7d4e1f09c63
+Create Date: 2026-10-18 17:42:10.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e5b3d2f47'
+down_revision = 'a7d4e1f09c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('purchase_history', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_purchase_history_salesitem_id'), ['salesitem_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_purchase_history_purchase_time'), ['purchase_time'], unique=False)
+        batch_op.create_index('ix_purchase_history_user_time', ['user_id', 'purchase_time'], unique=False)
+        batch_op.create_index('ix_purchase_history_requires_sync', ['id'], unique=False,
+                              sqlite_where=sa.text('requires_sync = 1'), postgresql_where=sa.text('requires_sync'))
+
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sales_items_last_updated'), ['last_updated'], unique=False)
+
+    with op.batch_alter_table('sync_history', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sync_history_timestamp_start'), ['timestamp_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sync_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sync_history_timestamp_start'))
+
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sales_items_last_updated'))
+
+    with op.batch_alter_table('purchase_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_purchase_history_requires_sync')
+        batch_op.drop_index('ix_purchase_history_user_time')
+        batch_op.drop_index(batch_op.f('ix_purchase_history_purchase_time'))
+        batch_op.drop_index(batch_op.f('ix_purchase_history_salesitem_id'))
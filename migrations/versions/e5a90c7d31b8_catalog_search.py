@@ -0,0 +1,39 @@
+"""catalog search (FTS5)
+
+Revision ID: e5a90c7d31b8
+Revises: c81e5b3d2f47
+Create Date: 2026-10-18 19:12:33.804117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utilities.catalog_search import FTS_SCHEMA
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a90c7d31b8'
+down_revision = 'c81e5b3d2f47'
+branch_labels = None
+depends_on = None
+
+
+# FTS5 external-content table over sales_items, kept in sync by triggers: FTS_SCHEMA of app/utilities/catalog_search.py.
+# SQLite only; on other databases the catalog search uses an in-process index.
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for statement in FTS_SCHEMA:
+        op.execute(statement)
+    # index the existing items
+    op.execute("INSERT INTO sales_items_fts(sales_items_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS sales_items_fts_after_update")
+    op.execute("DROP TRIGGER IF EXISTS sales_items_fts_after_delete")
+    op.execute("DROP TRIGGER IF EXISTS sales_items_fts_after_insert")
+    op.execute("DROP TABLE IF EXISTS sales_items_fts")
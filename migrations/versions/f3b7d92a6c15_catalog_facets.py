@@ -0,0 +1,63 @@
+"""catalog facets and sort indexes
+
+Revision ID: f3b7d92a6c15
+Revises: e5a90c7d31b8
+Create Date: 2026-10-18 21:03:57.412906
+
+"""
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+from app.utilities.catalog_facets import FACET_TRIGGERS, facet_rebuild
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d92a6c15'
+down_revision = 'e5a90c7d31b8'
+branch_labels = None
+depends_on = None
+
+
+# the triggers maintaining catalog_facets (SQLite only) depend on CATALOG_PRICE_BUCKETS; they are built with the
+# configured boundaries, which are kept in catalog_facet_settings - the app rebuilds them at startup if they change
+def upgrade():
+    op.create_table('catalog_facets',
+    sa.Column('facet', sa.String(length=16), nullable=False),
+    sa.Column('value', sa.String(length=128), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('in_stock_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('facet', 'value')
+    )
+    op.create_table('catalog_facet_settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('price_buckets', sa.String(length=1024), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.create_index('ix_sales_items_price', ['price_per_unit'], unique=False)
+        batch_op.create_index('ix_sales_items_name', ['name'], unique=False)
+        batch_op.create_index('ix_sales_items_stock', ['units_in_stock'], unique=False)
+        batch_op.create_index('ix_sales_items_vendor', ['vendor_name'], unique=False)
+        batch_op.create_index('ix_sales_items_vendor_price', ['vendor_name', 'price_per_unit'], unique=False)
+        batch_op.create_index('ix_sales_items_vendor_name', ['vendor_name', 'name'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in facet_rebuild(current_app.config.get('CATALOG_PRICE_BUCKETS', [])):
+            op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in FACET_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    with op.batch_alter_table('sales_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_items_vendor_name')
+        batch_op.drop_index('ix_sales_items_vendor_price')
+        batch_op.drop_index('ix_sales_items_vendor')
+        batch_op.drop_index('ix_sales_items_stock')
+        batch_op.drop_index('ix_sales_items_name')
+        batch_op.drop_index('ix_sales_items_price')
+
+    op.drop_table('catalog_facet_settings')
+    op.drop_table('catalog_facets')
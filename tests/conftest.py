@@ -0,0 +1,104 @@
+# fixtures of the test suite: an app on a fresh SQLite database per test, API token, users and sales items
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import create_app, db
+from app.models import APIToken, SalesItem, User, UserRole
+from app.utilities.catalog_cache import catalog_cache
+from app.utilities.pagination import row_count_cache
+from app.utilities.token_utilities import generate_token, validated_token_cache
+from app.utilities.user_cache import user_cache
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)         # the app writes its log files to ./logs
+
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'storefront.db')
+        SQLALCHEMY_REPLICA_URIS = []
+
+    # the caches are module level singletons, shared by the apps of all tests
+    catalog_cache.invalidate_all()
+    row_count_cache.clear()
+    validated_token_cache.clear()
+    user_cache.backend.clear()
+
+    app = create_app(TestConfig)
+    yield app
+    dispose(app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def api_headers(app):
+    """
+    Authorization header of a valid API token.
+    """
+    with app.app_context():
+        return {'Authorization': f"Bearer {add_token()}"}
+
+
+@pytest.fixture
+def customer_id(app):
+    with app.app_context():
+        user = User(username='customer', email='customer@example.com', role=UserRole.CUSTOMER)
+        user.set_password('customer-password')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def add_item(code='ITEM-1', units_in_stock=10, price_per_unit=20.0, vendor_name='Vendor A', **values):
+    """
+    Adds a sales item (within an app context) and returns its id.
+    """
+    item = SalesItem(code=code, name=values.pop('name', f"Item {code}"), vendor_name=vendor_name,
+                     price_per_unit=price_per_unit, units_in_stock=units_in_stock, **values)
+    db.session.add(item)
+    db.session.commit()
+    return item.id
+
+
+def add_token(expires_at=None, db_expires_at=None):
+    """
+    Adds an API token (within an app context) and returns it. Its 'exp' claim is expires_at (default: in a day),
+    its database expiration db_expires_at (default: the same).
+    """
+    expires_at = expires_at or datetime.now(timezone.utc) + timedelta(days=1)
+    token = generate_token(expires_at)
+    db.session.add(APIToken(token=token, expires_at=(db_expires_at or expires_at).replace(tzinfo=None)))
+    db.session.commit()
+    return token
+
+
+def log_in(client, username='customer', password='customer-password'):
+    return client.post('/auth/login', data={'username': username, 'password': password})
+
+
+def replica_app(tmp_path, replica_path):
+    """
+    Creates a second app on the database of the app fixture, reading from the replica database file given.
+    """
+    class ReplicaConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'storefront.db')
+        SQLALCHEMY_REPLICA_URIS = ['sqlite:///' + str(replica_path)]
+    return create_app(ReplicaConfig)
+
+
+def dispose(app):
+    """
+    Closes the database connections of an app, e.g. before its database file is copied.
+    """
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
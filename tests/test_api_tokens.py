@@ -0,0 +1,113 @@
+# API tokens: validation cache, lookup by token hash, revocation and write-behind of last use
+
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import event, update
+from app import db
+from app import decorators
+from app.models import APIToken, User, UserRole
+from app.utilities.token_utilities import get_valid_token_id, token_digest, validated_token_cache, \
+    TokenUsageRecorder
+from tests.conftest import add_token, log_in
+
+
+def api_get(client, token):
+    return client.get('/api/purchases/', headers={'Authorization': f"Bearer {token}"}, query_string={'limit': 1})
+
+
+class StatementLog:
+    """
+    Records the SQL statements executed on the primary database, with their number of parameter sets.
+    """
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, len(parameters) if executemany else 1))
+
+    def matching(self, text):
+        return [entry for entry in self.statements if text in entry[0]]
+
+
+@pytest.fixture
+def statement_log(app):
+    log = StatementLog()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', log)
+    yield log
+    event.remove(engine, 'before_cursor_execute', log)
+
+
+@pytest.fixture
+def admin_client(app):
+    with app.app_context():
+        user = User(username='admin', email='admin@example.com', role=UserRole.ADMIN)
+        user.set_password('admin-password')
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    log_in(client, 'admin', 'admin-password')
+    return client
+
+
+@pytest.mark.parametrize('revoke', ['toggle', 'delete'])
+def test_revoked_token_stops_working_at_once(app, client, admin_client, revoke):
+    with app.app_context():
+        token = add_token()
+        token_id = db.session.scalar(db.select(APIToken.id))
+    assert api_get(client, token).status_code == 200        # validation cached from now on
+
+    if revoke == 'toggle':
+        admin_client.get(f'/sync/token_status_togle/{token_id}')
+    else:
+        admin_client.post(f'/sync/delete_token/{token_id}')
+    assert api_get(client, token).status_code == 401
+
+
+@pytest.mark.parametrize('claim_days, db_days', [(1, 2), (2, 1)])
+def test_cached_validation_expires_with_the_token(app, monkeypatch, claim_days, db_days):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    expiries = []
+    cache_set = validated_token_cache.set
+    monkeypatch.setattr(validated_token_cache, 'set',
+                        lambda key, value, **options: expiries.append(options['expires_at']) or cache_set(key, value, **options))
+    with app.app_context():
+        token = add_token(now + timedelta(days=claim_days), db_expires_at=now + timedelta(days=db_days))
+        assert get_valid_token_id(token) is not None
+    assert expiries == [(now + timedelta(days=min(claim_days, db_days))).timestamp()]
+
+
+def test_token_is_looked_up_by_hash(app, statement_log):
+    with app.app_context():
+        token = add_token()
+        statement_log.statements.clear()
+        assert get_valid_token_id(token) is not None
+        lookups = statement_log.matching('FROM api_tokens')
+        assert len(lookups) == 1 and 'api_tokens.token_hash = ?' in lookups[0][0]
+
+        # a token whose hash does not match is not found, although the token itself is stored
+        validated_token_cache.clear()
+        db.session.execute(update(APIToken).values(token_hash=token_digest('other token')))
+        db.session.commit()
+        assert get_valid_token_id(token) is None
+
+
+def test_last_use_is_written_in_one_batch(app, client, statement_log, monkeypatch):
+    recorder = TokenUsageRecorder(flush_interval_seconds=0.5)
+    monkeypatch.setattr(decorators, 'token_usage_recorder', recorder)
+    with app.app_context():
+        tokens = [add_token(), add_token(datetime.now(timezone.utc) + timedelta(days=2))]
+
+    for token in tokens * 2:
+        assert api_get(client, token).status_code == 200
+    with app.app_context():
+        assert db.session.scalars(db.select(APIToken.last_used_at)).all() == [None, None]
+    assert statement_log.matching('UPDATE api_tokens') == []
+
+    time.sleep(0.5)
+    assert api_get(client, tokens[0]).status_code == 200
+    assert [parameter_sets for _, parameter_sets in statement_log.matching('UPDATE api_tokens')] == [2]
+    with app.app_context():
+        assert None not in db.session.scalars(db.select(APIToken.last_used_at)).all()
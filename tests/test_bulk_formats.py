@@ -0,0 +1,59 @@
+# bulk update payload formats: columnar datasets and MessagePack
+
+import json
+import pytest
+from app import db
+from app.api import routes
+from app.models import SalesItem
+from tests.conftest import add_item
+
+COLUMNS = {'code': ['ITEM-1', 'ITEM-2'], 'name': ["Item 1", "Item 2"], 'description': ["Test item"] * 2,
+           'vendor.name': ['Vendor A', 'Vendor B'], 'price_per_unit': [10.0, 20.0], 'units_in_stock': [5, 0]}
+
+
+def stock_by_code(app):
+    with app.app_context():
+        return dict(db.session.execute(db.select(SalesItem.code, SalesItem.units_in_stock)).all())
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_columnar_dataset(app, client, api_headers, streaming):
+    app.config.update(BULK_UPDATE_STREAMING=streaming, BULK_UPDATE_BATCH_SIZE=1)
+    with app.app_context():
+        add_item(code='ITEM-3')
+    response = client.post('/api/bulk_update', headers=api_headers,
+                           json={'stock_updates': COLUMNS, 'deleted': {'code': ['ITEM-3', 'ITEM-4']}})
+    assert response.status_code == 200
+    results = json.loads(response.data)
+    assert (results['stock_updates']['added_count'], results['deleted']['deleted_count'],
+            results['deleted']['not_found_count']) == (2, 1, 1)
+    assert stock_by_code(app) == {'ITEM-1': 5, 'ITEM-2': 0}
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+@pytest.mark.parametrize('columns', [{**COLUMNS, 'units_in_stock': [5]}, {'code': 'ITEM-1'}])
+def test_malformed_columnar_dataset(app, client, api_headers, streaming, columns):
+    app.config['BULK_UPDATE_STREAMING'] = streaming
+    response = client.post('/api/bulk_update', headers=api_headers, json={'stock_updates': columns})
+    assert response.status_code == 400
+    assert stock_by_code(app) == {}
+
+
+def test_msgpack_payload(app, client, api_headers):
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.packb({'stock_updates': COLUMNS})
+    response = client.post('/api/bulk_update', data=body,
+                           headers={**api_headers, 'Content-Type': 'application/msgpack'})
+    assert response.status_code == 200
+    assert stock_by_code(app) == {'ITEM-1': 5, 'ITEM-2': 0}
+
+    response = client.post('/api/bulk_update', data=msgpack.packb([1, 2]),
+                           headers={**api_headers, 'Content-Type': 'application/msgpack'})
+    assert response.status_code == 400
+
+
+def test_msgpack_payload_without_msgpack(app, client, api_headers, monkeypatch):
+    monkeypatch.setattr(routes, 'msgpack', None)
+    response = client.post('/api/bulk_update', data=b'\x81\xa1a\x01',
+                           headers={**api_headers, 'Content-Type': 'application/msgpack'})
+    assert response.status_code == 415
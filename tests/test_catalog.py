@@ -0,0 +1,127 @@
+# catalog: facet counts and cached catalog pages
+
+from sqlalchemy import update
+from app import db
+from app.models import CatalogFacet, CatalogFacetSettings
+from app.utilities.catalog_facets import catalog_facets, FACET_VENDOR
+from tests.conftest import add_item, log_in
+
+
+def vendor_counts(in_stock=False):
+    vendors, _ = catalog_facets.counts(in_stock=in_stock)
+    return {vendor.value: vendor.count for vendor in vendors}
+
+
+def price_counts():
+    _, prices = catalog_facets.counts()
+    return {price.label: price.count for price in prices}
+
+
+def test_facet_counts_are_cached_until_invalidated(app):
+    with app.app_context():
+        add_item(code='ITEM-1', vendor_name='Vendor A')
+        add_item(code='ITEM-2', vendor_name='Vendor A')
+        catalog_facets.invalidate()
+        assert vendor_counts() == {'Vendor A': 2}
+
+        db.session.execute(update(CatalogFacet).where(CatalogFacet.facet == FACET_VENDOR).values(item_count=5))
+        db.session.commit()
+        assert vendor_counts() == {'Vendor A': 2}
+        catalog_facets.invalidate()
+        assert vendor_counts() == {'Vendor A': 5}
+
+
+def test_facets_are_rebuilt_at_startup_only_for_new_price_buckets(app):
+    with app.app_context():
+        add_item(code='ITEM-1', price_per_unit=20.0)
+        add_item(code='ITEM-2', price_per_unit=60.0)
+
+        # same buckets: the counts maintained by the triggers are kept
+        db.session.execute(update(CatalogFacet).where(CatalogFacet.facet == FACET_VENDOR).values(item_count=5))
+        db.session.commit()
+        catalog_facets.init_app(app)
+        assert vendor_counts() == {'Vendor A': 5}
+
+        app.config['CATALOG_PRICE_BUCKETS'] = [50]
+        catalog_facets.init_app(app)
+        assert vendor_counts() == {'Vendor A': 2}
+        assert price_counts() == {'under 50': 1, '50 and up': 1}
+        assert db.session.get(CatalogFacetSettings, 1).price_buckets == '[50.0]'
+
+        # the triggers count in the new buckets
+        add_item(code='ITEM-3', price_per_unit=30.0)
+        catalog_facets.invalidate()
+        assert price_counts() == {'under 50': 2, '50 and up': 1}
+
+
+def test_purchase_updates_facet_counts(app, client, customer_id):
+    with app.app_context():
+        item_id = add_item(code='ITEM-1', vendor_name='Vendor A', units_in_stock=2)
+        add_item(code='ITEM-2', vendor_name='Vendor A', units_in_stock=2)
+        catalog_facets.invalidate()
+        assert vendor_counts(in_stock=True) == {'Vendor A': 2}
+
+    log_in(client)
+    client.post(f'/finalize_purchase/{item_id}', data={'quantity': '2'})
+    with app.app_context():
+        assert vendor_counts(in_stock=True) == {'Vendor A': 1}
+
+
+def test_sync_updates_facet_counts(app, client, api_headers):
+    with app.app_context():
+        add_item(code='ITEM-1', vendor_name='Vendor A')
+        catalog_facets.invalidate()
+        assert vendor_counts() == {'Vendor A': 1}
+
+    response = client.post('/api/bulk_update', headers=api_headers,
+                           json={'stock_updates': [{'code': 'ITEM-1', 'vendor.name': 'Vendor B'}]})
+    assert response.status_code == 200
+    with app.app_context():
+        assert vendor_counts() == {'Vendor B': 1}
+
+
+def test_etag_changes_with_facet_counts(app, client, customer_id):
+    with app.app_context():
+        add_item(code='ITEM-1', vendor_name='Vendor A', units_in_stock=2)
+        add_item(code='ITEM-2', vendor_name='Vendor B', units_in_stock=2)
+        item_id = add_item(code='ITEM-3', vendor_name='Vendor C', units_in_stock=2)
+    app.config['ITEMS_PER_PAGE'] = 1
+    etag = client.get('/', query_string={'in_stock': '1'}).headers['ETag']
+    assert client.get('/', query_string={'in_stock': '1'}, headers={'If-None-Match': etag}).status_code == 304
+
+    # selling out an item of another page leaves the item table alone, but not the in-stock facet counts
+    other_client = app.test_client()
+    log_in(other_client)
+    other_client.post(f'/finalize_purchase/{item_id}', data={'quantity': '2'})
+
+    response = client.get('/', query_string={'in_stock': '1'}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_purchase_invalidates_pages_sorted_by_stock(app, client, customer_id):
+    with app.app_context():
+        add_item(code='ITEM-1', units_in_stock=3)
+        second_id = add_item(code='ITEM-2', units_in_stock=5)
+    app.config['ITEMS_PER_PAGE'] = 1
+    page = client.get('/', query_string={'sort': 'stock'}).data
+    assert b'ITEM-1' in page and b'ITEM-2' not in page
+
+    other_client = app.test_client()
+    log_in(other_client)
+    other_client.post(f'/finalize_purchase/{second_id}', data={'quantity': '4'})
+
+    # the purchased item was not shown, but now comes first
+    page = client.get('/', query_string={'sort': 'stock'}).data
+    assert b'ITEM-2' in page and b'ITEM-1' not in page
+
+
+def test_no_validators_while_a_message_is_flashed(app, client):
+    with app.app_context():
+        add_item(code='ITEM-1')
+    etag = client.get('/').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('info', "A message")]
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
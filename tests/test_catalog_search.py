@@ -0,0 +1,69 @@
+# catalog search (/search): ranking, prefix matches and query syntax in the user input, on both search backends
+
+import re
+import pytest
+from app.utilities.catalog_search import catalog_search
+from tests.conftest import add_item
+
+
+@pytest.fixture(params=['fts5', 'memory'])
+def backend(app, request):
+    with app.app_context():
+        app.config['SEARCH_BACKEND'] = request.param
+        catalog_search.init_app(app)
+        assert catalog_search.backend == request.param
+    return request.param
+
+
+@pytest.fixture
+def items(app, backend):
+    with app.app_context():
+        add_item(code='MUG-1', name='Blue mug', description='Stoneware coffee mug, dishwasher safe')
+        add_item(code='MUG-2', name='Red mug', description='Enamel camping mug')
+        add_item(code='PLATE-1', name='Dinner plate', description='Goes with the blue mug')
+        add_item(code='LAMP-1', name='Desk lamp', description='Adjustable arm', vendor_name='Bluebird Lighting')
+        catalog_search.invalidate()
+
+
+def found_codes(client, query_text, page=1):
+    response = client.get('/search', query_string={'q': query_text, 'page': page})
+    assert response.status_code == 200
+    return re.findall(r'<td>([A-Z]+-\d+)</td>', response.get_data(as_text=True))
+
+
+def test_search_ranks_by_field_weight(client, items):
+    # a match in the code or name ranks above a match in the vendor name, which ranks above the description
+    assert found_codes(client, 'blue') == ['MUG-1', 'LAMP-1', 'PLATE-1']
+    assert found_codes(client, 'mug')[2:] == ['PLATE-1']
+    assert found_codes(client, 'lamp') == ['LAMP-1']
+
+
+def test_search_matches_term_prefixes(client, items):
+    assert sorted(found_codes(client, 'mu')) == ['MUG-1', 'MUG-2', 'PLATE-1']
+    assert found_codes(client, 'dishw') == ['MUG-1']
+    assert found_codes(client, 'Blu Mu') == ['MUG-1', 'PLATE-1']
+    assert found_codes(client, 'bluebird') == ['LAMP-1']
+    assert found_codes(client, 'teapot') == []
+
+
+def test_search_ignores_query_syntax(client, items):
+    assert found_codes(client, '"blue mug"') == ['MUG-1', 'PLATE-1']
+    assert found_codes(client, '"blue') == ['MUG-1', 'LAMP-1', 'PLATE-1']
+    assert found_codes(client, 'NEAR(blue mug)') == ['MUG-1', 'PLATE-1']
+    assert found_codes(client, 'blue AND camp*') == []
+    assert found_codes(client, 'red mug NOT') == ['MUG-2']
+    assert found_codes(client, 'name:lamp') == ['LAMP-1']
+    # nothing left to search for
+    assert found_codes(client, '"') == []
+    assert found_codes(client, 'NEAR(') == []
+
+
+def test_search_pages(app, client, backend):
+    with app.app_context():
+        for number in range(1, 13):
+            add_item(code=f'CUP-{number}', name=f'Cup {number}')
+        catalog_search.invalidate()
+    per_page = app.config['ITEMS_PER_PAGE']
+    first_page, second_page = found_codes(client, 'cup'), found_codes(client, 'cup', page=2)
+    assert len(first_page) == per_page and len(second_page) == 12 - per_page
+    assert sorted(first_page + second_page) == sorted(f'CUP-{number}' for number in range(1, 13))
@@ -0,0 +1,47 @@
+# read replica routing: GET reads on replicas, textual SQL and stale replicas on the primary
+
+import shutil
+from flask import g
+from sqlalchemy import select, text
+from app import db
+from app.models import SalesItem
+from app.utilities.catalog_facets import catalog_facets
+from app.utilities.db_routing import REPLICA_KEYS_EXTENSION
+from tests.conftest import add_item, dispose, replica_app
+
+
+def test_replica_without_schema_is_not_used(app, tmp_path):
+    # the primary (of the app fixture) has its schema, the replica file is empty
+    other = replica_app(tmp_path, tmp_path / 'replica.db')
+    assert other.extensions[REPLICA_KEYS_EXTENSION] == []
+    with other.test_request_context('/', method='GET'):
+        assert db.session.get_bind() is db.engines[None]
+    dispose(other)
+
+
+def test_reads_of_get_requests_on_replica_textual_sql_on_primary(app, tmp_path):
+    with app.app_context():
+        add_item(code='ITEM-1')
+    dispose(app)
+    shutil.copy(tmp_path / 'storefront.db', tmp_path / 'replica.db')
+
+    other = replica_app(tmp_path, tmp_path / 'replica.db')
+    assert other.extensions[REPLICA_KEYS_EXTENSION] == ['replica_0']
+    with other.app_context():
+        add_item(code='ITEM-2', vendor_name='Vendor B')       # not replicated yet
+
+    with other.test_request_context('/', method='GET'):
+        assert db.session.scalars(select(SalesItem.code).order_by(SalesItem.code)).all() == ['ITEM-1']
+        assert db.session.scalar(text("SELECT count(*) FROM sales_items")) == 2
+        catalog_facets.invalidate()
+        vendors, _ = catalog_facets.counts()
+        assert [vendor.value for vendor in vendors] == ['Vendor A', 'Vendor B']
+    dispose(other)
+
+
+def test_textual_write_keeps_request_on_primary(app):
+    with app.test_request_context('/', method='GET'):
+        db.session.execute(text("SELECT 1"))
+        assert not g.get('db_wrote')
+        db.session.execute(text("UPDATE sales_items SET units_reserved = 0"))
+        assert g.db_wrote
@@ -0,0 +1,76 @@
+# compressed API request and response bodies
+
+import gzip
+import json
+import zlib
+import pytest
+from app import db
+from app.models import SalesItem
+from tests.test_purchase_export import make_purchases
+from tests.test_sync import record
+
+
+def bulk_update(client, api_headers, body, encoding):
+    return client.post('/api/bulk_update', data=body,
+                       headers={**api_headers, 'Content-Type': 'application/json', 'Content-Encoding': encoding})
+
+
+def payload(number_of_items=3):
+    return json.dumps({'stock_updates': [record(f"ITEM-{number}") for number in range(number_of_items)]}).encode()
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+@pytest.mark.parametrize('encoding, compress', [('gzip', gzip.compress), ('deflate', zlib.compress),
+                                                ('deflate', raw_deflate)])
+def test_compressed_request_body_is_decoded(app, client, api_headers, streaming, encoding, compress):
+    app.config['BULK_UPDATE_STREAMING'] = streaming
+    response = bulk_update(client, api_headers, compress(payload()), encoding)
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.query(SalesItem).count() == 3
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+def test_decompressed_body_beyond_limit(app, client, api_headers, streaming):
+    app.config.update(BULK_UPDATE_STREAMING=streaming, API_MAX_DECOMPRESSED_BYTES=1000)
+    body = payload(number_of_items=50)
+    assert len(gzip.compress(body)) < 1000 < len(body)
+    assert bulk_update(client, api_headers, gzip.compress(body), 'gzip').status_code == 413
+
+
+@pytest.mark.parametrize('body', [b'{"stock_updates": []}', gzip.compress(payload())[:40]])
+def test_invalid_compressed_body(client, api_headers, body):
+    assert bulk_update(client, api_headers, body, 'gzip').status_code == 400
+
+
+def test_unsupported_content_encoding(client, api_headers):
+    response = bulk_update(client, api_headers, payload(), 'br')
+    assert response.status_code == 415
+    assert 'gzip' in response.headers['Accept-Encoding']
+
+
+def test_small_response_is_not_compressed(client, api_headers):
+    response = client.get('/api/purchases/', headers={**api_headers, 'Accept-Encoding': 'gzip'},
+                          query_string={'limit': 10})
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data) == []
+
+
+def test_streamed_export_is_compressed_chunk_by_chunk(app, client, api_headers, customer_id):
+    app.config['PURCHASES_EXPORT_BATCH_SIZE'] = 1
+    make_purchases(app, customer_id, 3)
+    response = client.get('/api/purchases/', headers={**api_headers, 'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+
+    # each chunk decodes on arrival, without waiting for the end of the stream
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    decoded_chunks = [decompressor.decompress(chunk) for chunk in response.iter_encoded()]
+    response.close()
+    assert len([chunk for chunk in decoded_chunks if chunk]) >= 3
+    assert len(json.loads(b''.join(decoded_chunks))) == 3
@@ -0,0 +1,57 @@
+# incremental JSON reader of the streamed bulk update
+
+import io
+import json
+import pytest
+from app.utilities.json_stream import iter_json_object, JSONStreamError, ARRAY_ITEM, VALUE
+from tests.conftest import add_item
+
+
+def events(payload, **options):
+    return list(iter_json_object(io.BytesIO(json.dumps(payload).encode('utf-8')), read_size=16, **options))
+
+
+def test_array_elements_and_values():
+    payload = {'stock_updates': [{'code': f"ITEM-{number}"} for number in range(5)], 'columns': {'code': ['A', 'B']}}
+    parsed = events(payload, max_value_size=64)
+    assert [value for event, _, value in parsed if event == ARRAY_ITEM] == payload['stock_updates']
+    assert [value for event, _, value in parsed if event == VALUE] == [payload['columns']]
+
+
+def test_value_beyond_max_size_is_rejected():
+    payload = {'stock_updates': [{'code': 'ITEM-1', 'description': 'x' * 1000}]}
+    assert len(events(payload, max_value_size=2000)) == 3
+    with pytest.raises(JSONStreamError):
+        events(payload, max_value_size=500)
+
+
+def test_unterminated_value_is_not_read_to_the_end():
+    class EndlessStream:
+        bytes_read = 0
+
+        def read(self, size):
+            self.bytes_read += size
+            return b'{"stock_updates": "' if self.bytes_read == size else b'x' * size
+
+    stream = EndlessStream()
+    with pytest.raises(JSONStreamError):
+        list(iter_json_object(stream, read_size=1024, max_value_size=100000))
+    assert stream.bytes_read < 300000
+
+
+def test_bulk_update_with_oversized_record(app, client, api_headers):
+    app.config['BULK_UPDATE_MAX_VALUE_CHARS'] = 1000
+    response = client.post('/api/bulk_update', headers=api_headers,
+                           json={'stock_updates': [{'code': 'ITEM-1', 'description': 'x' * 2000}]})
+    assert response.status_code == 400
+
+
+def test_bulk_update_value_limit_counts_characters(app, client, api_headers):
+    # a record of 600 characters but 1200 bytes of UTF-8 is within a limit of 1000 characters
+    app.config['BULK_UPDATE_MAX_VALUE_CHARS'] = 1000
+    with app.app_context():
+        add_item(code='ITEM-1')
+    body = json.dumps({'stock_updates': [{'code': 'ITEM-1', 'description': 'é' * 560}]}, ensure_ascii=False)
+    response = client.post('/api/bulk_update', headers=api_headers, data=body.encode('utf-8'),
+                           content_type='application/json')
+    assert response.status_code == 200
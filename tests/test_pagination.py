@@ -0,0 +1,41 @@
+# keyset pagination: cursor encoding and decoding
+
+import base64
+import json
+from datetime import datetime
+import pytest
+from app.utilities.pagination import encode_cursor, decode_cursor, InvalidCursor
+from tests.conftest import add_item
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def test_cursor_round_trip():
+    values = ['name', 12, 2.5, True, None, datetime(2024, 5, 1, 12, 30, 15, 250)]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 !',
+    base64.urlsafe_b64encode(b'\xff\xfe').decode('ascii'),
+    raw_cursor({'id': 1}),
+    raw_cursor([{'x': 1}]),
+    raw_cursor([{'$dt': 'nope'}]),
+    raw_cursor([{'$dt': 5}]),
+    raw_cursor([{'$dt': '2024-05-01T12:00:00', 'x': 1}]),
+    raw_cursor([[1, 2]]),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('cursor', [raw_cursor([{'x': 1}]), raw_cursor([{'$dt': 'nope'}]), raw_cursor([[1, 2]])])
+def test_catalog_ignores_malformed_cursor(app, client, cursor):
+    with app.app_context():
+        add_item(code='ITEM-1')
+    response = client.get('/', query_string={'after': cursor})
+    assert response.status_code == 200
+    assert b'ITEM-1' in response.data
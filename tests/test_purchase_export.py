@@ -0,0 +1,131 @@
+# /api/purchases/ export: full (streamed) and paged, purchases acknowledged by id
+
+import json
+import shutil
+import pytest
+from sqlalchemy import delete, func, insert, select
+from app import db
+from app.models import Purchases, SyncHistory
+from app.utilities.purchase_utilities import make_purchase
+from tests.conftest import add_item, dispose, replica_app
+
+
+def make_purchases(app, customer_id, number_of_purchases, code='ITEM-1'):
+    with app.app_context():
+        item_id = add_item(code=code, units_in_stock=100)
+        for _ in range(number_of_purchases):
+            make_purchase(item_id, customer_id, 1)
+
+
+def export(client, api_headers, **args):
+    response = client.get('/api/purchases/', headers=api_headers, query_string=args)
+    assert response.status_code == 200
+    return response, json.loads(response.data)
+
+
+def updates_sent(app):
+    with app.app_context():
+        return db.session.scalar(select(func.sum(SyncHistory.updates_sent)))
+
+
+def test_full_export_sends_each_purchase_once(app, client, api_headers, customer_id):
+    make_purchases(app, customer_id, 3)
+    assert len(export(client, api_headers)[1]) == 3
+    assert export(client, api_headers)[1] == []
+    make_purchases(app, customer_id, 2, code='ITEM-2')
+    assert len(export(client, api_headers)[1]) == 2
+    assert updates_sent(app) == 5
+
+
+def test_paged_export_acknowledges_last_page(app, client, api_headers, customer_id):
+    make_purchases(app, customer_id, 5)
+    pages = []
+    cursor = None
+    while True:
+        response, purchases = export(client, api_headers, limit=2, **({'cursor': cursor} if cursor else {}))
+        pages.append(len(purchases))
+        cursor = response.headers['X-Next-Cursor']
+        if response.headers['X-Has-More'] == 'false':
+            break
+    assert pages == [2, 2, 1]
+
+    # nothing is sent twice, by a later full export or by continuing with the last token
+    assert export(client, api_headers)[1] == []
+    assert export(client, api_headers, cursor=cursor)[1] == []
+    assert updates_sent(app) == 5
+
+
+def test_paged_export_page_can_be_retried(app, client, api_headers, customer_id):
+    make_purchases(app, customer_id, 5)
+    response, first_page = export(client, api_headers, limit=2)
+    cursor = response.headers['X-Next-Cursor']
+    response, second_page = export(client, api_headers, limit=2, cursor=cursor)
+    assert response.headers['X-Has-More'] == 'true'
+    assert export(client, api_headers, limit=2, cursor=cursor)[1] == second_page
+    assert first_page != second_page
+
+
+def test_invalid_export_cursor(client, api_headers):
+    response = client.get('/api/purchases/', headers=api_headers, query_string={'cursor': 'forged'})
+    assert response.status_code == 400
+
+
+def hide_purchase(app, purchase_id):
+    """
+    Removes a purchase and returns a function putting it back: a purchase committed after the export ran,
+    although its id is lower than the ids exported (ids are assigned before commit).
+    """
+    with app.app_context():
+        values = dict(db.session.execute(select(Purchases.__table__).where(Purchases.id == purchase_id)).mappings().one())
+        db.session.execute(delete(Purchases).where(Purchases.id == purchase_id))
+        db.session.commit()
+
+    def commit_late():
+        with app.app_context():
+            db.session.execute(insert(Purchases), [values])
+            db.session.commit()
+    return commit_late
+
+
+def purchase_codes(purchases):
+    return sorted(purchase['purchase_code'] for purchase in purchases)
+
+
+def test_late_committed_purchase_is_exported(app, client, api_headers, customer_id):
+    make_purchases(app, customer_id, 3)
+    commit_late = hide_purchase(app, 2)
+    assert len(export(client, api_headers)[1]) == 2
+    commit_late()
+    assert len(export(client, api_headers)[1]) == 1
+    assert export(client, api_headers)[1] == []
+    assert updates_sent(app) == 3
+
+
+def test_late_committed_purchase_is_exported_by_paged_export(app, client, api_headers, customer_id):
+    make_purchases(app, customer_id, 5)
+    with app.app_context():
+        all_codes = sorted(db.session.scalars(select(Purchases.purchase_code)))
+    commit_late = hide_purchase(app, 2)
+    pages = []
+    response, purchases = export(client, api_headers, limit=2)
+    pages.append(purchases)
+    commit_late()
+    while response.headers['X-Has-More'] == 'true':
+        response, purchases = export(client, api_headers, limit=2, cursor=response.headers['X-Next-Cursor'])
+        pages.append(purchases)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert purchase_codes(sum(pages, [])) == all_codes
+    assert export(client, api_headers)[1] == []
+
+
+@pytest.mark.parametrize('args', [{}, {'limit': 10}])
+def test_export_ignores_stale_replica(app, tmp_path, api_headers, customer_id, args):
+    make_purchases(app, customer_id, 3)
+    dispose(app)
+    shutil.copy(tmp_path / 'storefront.db', tmp_path / 'replica.db')     # still flags the purchases pending
+
+    # the warehouse client keeps no browser session, which would stick to the primary after a write
+    other = replica_app(tmp_path, tmp_path / 'replica.db')
+    assert len(export(other.test_client(), api_headers, **args)[1]) == 3
+    assert export(other.test_client(), api_headers, **args)[1] == []
+    dispose(other)
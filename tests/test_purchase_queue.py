@@ -0,0 +1,56 @@
+# group commit of purchases: batches, waiting requests and the worker thread
+
+import threading
+import pytest
+from app import db
+from app.models import Purchases, SalesItem
+from app.utilities.purchase_queue import purchase_queue, PurchaseTimeout
+from tests.conftest import add_item
+
+
+@pytest.fixture
+def queue_app(app):
+    app.config.update(PURCHASE_GROUP_COMMIT=True, PURCHASE_QUEUE_TIMEOUT_SECONDS=0.2)
+    purchase_queue.init_app(app)
+    yield app
+    purchase_queue.init_app(app)
+
+
+def test_group_commit_purchase(queue_app, customer_id):
+    with queue_app.app_context():
+        item_id = add_item(units_in_stock=10)
+        assert purchase_queue.submit(item_id, customer_id, 3)['purchases'] == 1
+        db.session.expire_all()
+        assert db.session.get(SalesItem, item_id).units_in_stock == 7
+
+
+def test_purchase_not_committed_in_time_is_withdrawn(queue_app, customer_id, monkeypatch):
+    blocked = threading.Event()
+    commit_batch = purchase_queue._commit_batch
+    monkeypatch.setattr(purchase_queue, '_commit_batch', lambda batch: blocked.wait() and commit_batch(batch))
+    with queue_app.app_context():
+        item_id = add_item(units_in_stock=10)
+        with pytest.raises(PurchaseTimeout) as timeout:
+            purchase_queue.submit(item_id, customer_id, 3)
+        assert timeout.value.made is False
+        blocked.set()
+        assert purchase_queue.submit(item_id, customer_id, 1)['purchases'] == 1
+        assert Purchases.query.count() == 1
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')   # the failing worker
+def test_dead_worker_is_restarted(queue_app, customer_id, monkeypatch):
+    def die(batch):
+        raise RuntimeError("worker failure")
+
+    with queue_app.app_context():
+        item_id = add_item(units_in_stock=10)
+        with monkeypatch.context() as patch:
+            patch.setattr(purchase_queue, '_commit_batch', die)
+            with pytest.raises(PurchaseTimeout) as timeout:
+                purchase_queue.submit(item_id, customer_id, 3)
+        assert timeout.value.made is False
+        assert purchase_queue._worker.is_alive()
+        assert purchase_queue.submit(item_id, customer_id, 1)['purchases'] == 1
+        db.session.expire_all()
+        assert db.session.get(SalesItem, item_id).units_in_stock == 9
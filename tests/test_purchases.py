@@ -0,0 +1,167 @@
+# purchases: conditional stock decrement, reservations and idempotent submission
+
+import pytest
+from app import db
+from app.models import Purchases, SalesItem, StockReservation, User, UserRole
+from app.utilities.purchase_utilities import (make_purchase, checkout, reserve_stock, DuplicateRequest,
+                                              InsufficientStock, ItemNotFound, SoldOut)
+from app.utilities.sync_utilities import delete_items
+from tests.conftest import add_item, log_in
+
+
+def stock(item_id):
+    db.session.expire_all()
+    item = db.session.get(SalesItem, item_id)
+    return item.units_in_stock, item.units_reserved, item.units_purchased
+
+
+def test_purchase_decrements_stock(app, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+        result = make_purchase(item_id, customer_id, 3)
+        assert result['purchases'] == 1
+        assert stock(item_id) == (7, 0, 3)
+        assert Purchases.query.count() == 1
+
+
+def test_purchase_beyond_stock_changes_nothing(app, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=2)
+        with pytest.raises(SoldOut) as sold_out:
+            make_purchase(item_id, customer_id, 3)
+        assert sold_out.value.units_available == 2
+        assert stock(item_id) == (2, 0, 0)
+        assert Purchases.query.count() == 0
+
+
+def test_purchase_of_unknown_item(app, customer_id):
+    with app.app_context():
+        with pytest.raises(ItemNotFound):
+            make_purchase(12345, customer_id, 1)
+
+
+@pytest.mark.parametrize('quantity', [0, -1])
+def test_purchase_of_invalid_quantity(app, customer_id, quantity):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+        with pytest.raises(ValueError):
+            make_purchase(item_id, customer_id, quantity)
+        assert stock(item_id) == (10, 0, 0)
+
+
+def test_reserved_units_are_not_available_to_others(app, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=5)
+        reservation = reserve_stock(item_id, customer_id, 4, ttl_seconds=600)
+        assert stock(item_id) == (5, 4, 0)
+        with pytest.raises(SoldOut):
+            make_purchase(item_id, customer_id, 2)
+        make_purchase(item_id, customer_id, 4, reservation_id=reservation.id)
+        assert stock(item_id) == (1, 0, 4)
+
+
+def test_checkout_is_all_or_nothing(app, customer_id):
+    with app.app_context():
+        first_id = add_item(code='ITEM-1', units_in_stock=5)
+        second_id = add_item(code='ITEM-2', units_in_stock=1)
+        with pytest.raises(InsufficientStock) as insufficient:
+            checkout(customer_id, {first_id: 2, second_id: 2})
+        assert insufficient.value.shortages == {second_id: 1}
+        assert stock(first_id) == (5, 0, 0)
+        assert Purchases.query.count() == 0
+
+        result = checkout(customer_id, {first_id: 2, second_id: 1})
+        assert result['purchases'] == 2
+        assert stock(first_id) == (3, 0, 2)
+        assert stock(second_id) == (0, 0, 1)
+
+
+def test_checkout_releases_own_reservations(app, customer_id):
+    with app.app_context():
+        other = User(username='other', email='other@example.com', role=UserRole.CUSTOMER)
+        db.session.add(other)
+        db.session.commit()
+        first_id = add_item(code='ITEM-1', units_in_stock=5)
+        second_id = add_item(code='ITEM-2', units_in_stock=5)
+        reserve_stock(first_id, customer_id, 4, ttl_seconds=600)
+        reserve_stock(second_id, customer_id, 3, ttl_seconds=600)
+        reserve_stock(second_id, other.id, 1, ttl_seconds=600)
+
+        # the units held for the customer are available to their checkout, those held for others are not
+        with pytest.raises(InsufficientStock) as insufficient:
+            checkout(customer_id, {first_id: 5, second_id: 5})
+        assert insufficient.value.shortages == {second_id: 4}
+        assert stock(second_id) == (5, 4, 0)
+        assert StockReservation.query.count() == 3
+
+        checkout(customer_id, {first_id: 5, second_id: 2})
+        assert stock(first_id) == (0, 0, 5)
+        assert stock(second_id) == (3, 1, 2)
+        assert [(reservation.user_id, reservation.salesitem_id) for reservation in StockReservation.query] == \
+            [(other.id, second_id)]
+
+
+def test_repeated_idempotency_key_purchases_once(app, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+        result = make_purchase(item_id, customer_id, 2, idempotency_key='key-1')
+        with pytest.raises(DuplicateRequest) as duplicate:
+            make_purchase(item_id, customer_id, 2, idempotency_key='key-1')
+        assert duplicate.value.result == result
+        assert stock(item_id) == (8, 0, 2)
+        assert Purchases.query.count() == 1
+
+        make_purchase(item_id, customer_id, 2, idempotency_key='key-2')
+        assert stock(item_id) == (6, 0, 4)
+
+
+def test_repeated_checkout_reports_first_result(app, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+        result = checkout(customer_id, {item_id: 3}, idempotency_key='cart-1')
+        with pytest.raises(DuplicateRequest) as duplicate:
+            checkout(customer_id, {item_id: 3}, idempotency_key='cart-1')
+        assert duplicate.value.result == result
+        assert stock(item_id) == (7, 0, 3)
+
+
+def test_repeated_form_submission_purchases_once(app, client, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+    log_in(client)
+    for _ in range(2):
+        response = client.post(f'/finalize_purchase/{item_id}', data={'quantity': '2', 'idempotency_key': 'form-1'})
+        assert response.status_code == 302
+    with app.app_context():
+        assert stock(item_id) == (8, 0, 2)
+
+
+def test_purchase_verification_reserves_on_post_only(app, client, customer_id):
+    with app.app_context():
+        item_id = add_item(units_in_stock=10)
+    log_in(client)
+    assert client.get(f'/purchase_verification/{item_id}', query_string={'quantity': 3}).status_code == 405
+    with app.app_context():
+        assert stock(item_id) == (10, 0, 0)
+
+    for _ in range(2):      # a repeated post replaces the reservation
+        response = client.post(f'/purchase_verification/{item_id}', data={'quantity': '3'})
+        assert response.status_code == 200
+    with app.app_context():
+        assert stock(item_id) == (10, 3, 0)
+        reservation_id = db.session.scalar(db.select(StockReservation.id))
+    client.post(f'/finalize_purchase/{item_id}', data={'quantity': '3', 'reservation_id': str(reservation_id)})
+    with app.app_context():
+        assert stock(item_id) == (7, 0, 3)
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_deleted_item_leaves_no_reservations(app, customer_id, bulk):
+    with app.app_context():
+        item_id = add_item(code='ITEM-1', units_in_stock=5)
+        other_id = add_item(code='ITEM-2', units_in_stock=5)
+        reserve_stock(item_id, customer_id, 2, ttl_seconds=600)
+        reserve_stock(other_id, customer_id, 1, ttl_seconds=600)
+        result = delete_items(SalesItem, 'code', [{'code': 'ITEM-1'}], 'code', bulk=bulk)
+        assert result.deleted_count == 1
+        assert db.session.scalars(db.select(StockReservation.salesitem_id)).all() == [other_id]
@@ -0,0 +1,123 @@
+# regression test of the query plans of the hot queries: each must be answered through its index,
+# not a full table scan or a temporary sort, on a database populated with planner statistics
+
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, insert, text, tuple_
+from app import db
+from app.models import SalesItem, Purchases, SyncHistory, User, UserRole, ConnectionType
+
+NUMBER_OF_PURCHASES = 5000
+NUMBER_OF_USERS = 200
+NUMBER_OF_ITEMS = 500
+PENDING_SYNC_SHARE = 0.01       # share of purchases not yet synced
+
+
+def hot_queries():
+    """
+    Returns (description, statement, expected index) of the hot queries, as issued by the app.
+    """
+    since = datetime(2026, 1, 1)
+    return [
+        ("purchases pending sync (purchase export)",
+         select(Purchases).where(Purchases.requires_sync == True, Purchases.id <= 10**9).order_by(Purchases.id),
+         'ix_purchase_history_requires_sync'),
+        ("User.purchase_history",
+         select(Purchases).where(Purchases.user_id == 1),
+         'ix_purchase_history_user_time'),
+        ("customer's purchases by time",
+         select(Purchases).where(Purchases.user_id == 1).order_by(Purchases.purchase_time.desc()).limit(10),
+         'ix_purchase_history_user_time'),
+        ("SalesItem.purchase_history",
+         select(Purchases).where(Purchases.salesitem_id == 1),
+         'ix_purchase_history_salesitem_id'),
+        ("purchases in a time range",
+         select(Purchases).where(Purchases.purchase_time >= since).order_by(Purchases.purchase_time).limit(10),
+         'ix_purchase_history_purchase_time'),
+        ("sync history by time",
+         select(SyncHistory).where(SyncHistory.timestamp_start >= since).order_by(SyncHistory.timestamp_start.desc()),
+         'ix_sync_history_timestamp_start'),
+        ("sales items changed since",
+         select(SalesItem).where(SalesItem.last_updated > since),
+         'ix_sales_items_last_updated'),
+        ("catalog by price, next page",
+         select(SalesItem).where(tuple_(SalesItem.price_per_unit, SalesItem.id) > (10.0, 5))
+                          .order_by(SalesItem.price_per_unit, SalesItem.id).limit(11),
+         'ix_sales_items_price'),
+        ("catalog by name, descending",
+         select(SalesItem).order_by(SalesItem.name.desc(), SalesItem.id.desc()).limit(11),
+         'ix_sales_items_name'),
+        ("catalog by stock",
+         select(SalesItem).order_by(SalesItem.units_in_stock, SalesItem.id).limit(11),
+         'ix_sales_items_stock'),
+        ("catalog of a vendor",
+         select(SalesItem).where(SalesItem.vendor_name == 'Vendor 1', SalesItem.id > 5).order_by(SalesItem.id).limit(11),
+         'ix_sales_items_vendor'),
+        ("catalog of a vendor by price, in a price range",
+         select(SalesItem).where(SalesItem.vendor_name == 'Vendor 1', SalesItem.price_per_unit >= 10.0,
+                                 SalesItem.price_per_unit < 50.0)
+                          .order_by(SalesItem.price_per_unit, SalesItem.id).limit(11),
+         'ix_sales_items_vendor_price'),
+        ("catalog of a vendor by name",
+         select(SalesItem).where(SalesItem.vendor_name == 'Vendor 1').order_by(SalesItem.name, SalesItem.id).limit(11),
+         'ix_sales_items_vendor_name'),
+    ]
+
+
+def query_plan(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled),
+                                      tuple(params[name] for name in compiled.positiontup)).all()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan, expected_index):
+    problems = []
+    if not any(expected_index in step for step in plan):
+        problems.append(f"does not use {expected_index}")
+    problems += [f"full scan: {step}" for step in plan if step.startswith('SCAN ') and ' INDEX ' not in step]
+    problems += [f"sort: {step}" for step in plan if 'TEMP B-TREE' in step]
+    return problems
+
+
+def populate(number_of_purchases):
+    # users, items, purchases and sync history; within an app context
+    users = [{'username': f'customer-{i}', 'role': UserRole.CUSTOMER, 'given_name': 'Plan', 'surname': 'Check'}
+             for i in range(NUMBER_OF_USERS)]
+    db.session.execute(insert(User), users)
+    db.session.execute(insert(SalesItem), [{'code': f'QP-{i}', 'name': f'Item {i}', 'vendor_name': f'Vendor {i % 20}',
+                                            'price_per_unit': random.randrange(1, 500) / 2,
+                                            'units_in_stock': random.randrange(100), 'units_purchased': 0,
+                                            'last_updated': datetime(2025, 1, 1) + timedelta(minutes=i)}
+                                           for i in range(NUMBER_OF_ITEMS)])
+    start = datetime(2025, 1, 1)
+    db.session.execute(insert(Purchases), [{'user_id': random.randrange(NUMBER_OF_USERS) + 1,
+                                            'salesitem_id': random.randrange(NUMBER_OF_ITEMS) + 1,
+                                            'salesitem_code': 'QP', 'salesitem_name': 'Item',
+                                            'salesitem_vendor_name': 'Vendor', 'quantity': 1, 'total_price': 1.0,
+                                            'purchase_time': start + timedelta(minutes=i),
+                                            'requires_sync': random.random() < PENDING_SYNC_SHARE}
+                                           for i in range(number_of_purchases)])
+    db.session.execute(insert(SyncHistory), [{'remote_name': 'Warehouse', 'connection_type': ConnectionType.SYNC,
+                                              'timestamp_start': start + timedelta(hours=i),
+                                              'timestamp_end': start + timedelta(hours=i)}
+                                             for i in range(number_of_purchases // 10)])
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))     # planner statistics, as on a database that has been in use
+
+
+@pytest.fixture
+def connection(app):
+    with app.app_context():
+        random.seed(1)
+        populate(NUMBER_OF_PURCHASES)
+        yield db.session.connection()
+
+
+@pytest.mark.parametrize('description, statement, expected_index', hot_queries(),
+                         ids=[query[0] for query in hot_queries()])
+def test_hot_query_uses_index(connection, description, statement, expected_index):
+    plan = query_plan(connection, statement)
+    assert plan_problems(plan, expected_index) == [], f"{description}: {' / '.join(plan)}"
@@ -0,0 +1,104 @@
+# warehouse sync: delta updates with content hash, bulk and row-by-row variants
+
+import pytest
+from app import db
+from app.api.routes import STOCK_UPDATES_FIELD_MAPPING
+from app.models import SalesItem
+from app.utilities.purchase_utilities import make_purchase, checkout
+from app.utilities.sync_utilities import update_items, ColumnarData
+
+
+def record(code='ITEM-1', units_in_stock=10, price_per_unit=20.0, **values):
+    return {'code': code, 'name': f"Item {code}", 'description': "Test item", 'vendor.name': 'Vendor A',
+            'price_per_unit': price_per_unit, 'units_in_stock': units_in_stock, **values}
+
+
+def sync(records, bulk):
+    result = update_items(SalesItem, 'code', records, 'code', STOCK_UPDATES_FIELD_MAPPING,
+                          timestamp_col='last_updated', bulk=bulk)
+    return result.updated_count, result.added_count, result.unchanged_count, result.erroneous_count
+
+
+def item(code='ITEM-1'):
+    db.session.expire_all()
+    return SalesItem.query.filter_by(code=code).one()
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_unchanged_full_record_is_skipped(app, bulk):
+    with app.app_context():
+        assert sync([record()], bulk) == (0, 1, 0, 0)
+        version = item().version
+        assert sync([record()], bulk) == (0, 0, 1, 0)
+        assert item().version == version
+        assert sync([record(price_per_unit=25.0)], bulk) == (1, 0, 0, 0)
+        assert item().price_per_unit == 25.0
+        assert item().version == version + 1
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_partial_record_updates_only_its_fields(app, bulk):
+    with app.app_context():
+        sync([record()], bulk)
+        assert sync([{'code': 'ITEM-1', 'units_in_stock': 4}], bulk) == (1, 0, 0, 0)
+        assert (item().units_in_stock, item().price_per_unit) == (4, 20.0)
+        assert sync([{'code': 'ITEM-2', 'units_in_stock': 4}], bulk) == (0, 0, 0, 1)
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_resync_after_purchase_restores_stock(app, customer_id, bulk):
+    with app.app_context():
+        sync([record(units_in_stock=10)], bulk)
+        make_purchase(item().id, customer_id, 3)
+        assert item().units_in_stock == 7
+
+        # the warehouse still reports 10 units: the stored content hash must not hide the difference
+        assert sync([record(units_in_stock=10)], bulk) == (1, 0, 0, 0)
+        assert item().units_in_stock == 10
+
+
+def test_resync_after_checkout_restores_stock(app, customer_id):
+    with app.app_context():
+        sync([record(units_in_stock=10)], True)
+        checkout(customer_id, {item().id: 4})
+        assert sync(ColumnarData({field: [value] for field, value in record(units_in_stock=10).items()}),
+                    True) == (1, 0, 0, 0)
+        assert item().units_in_stock == 10
+
+
+REPEATED_KEYS = [record('ITEM-1', units_in_stock=1), record('ITEM-2'), record('ITEM-1', units_in_stock=2),
+                 {'code': 'ITEM-1', 'units_in_stock': 3}, {'code': 'ITEM-3', 'units_in_stock': 1},
+                 {'code': 'ITEM-3', 'units_in_stock': 2}, {'name': "no key"}]
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_repeated_keys_are_merged_and_counted_once(app, bulk):
+    with app.app_context():
+        # ITEM-1 added once with the last stock, ITEM-3 is new but incomplete, the record without key is erroneous
+        assert sync(REPEATED_KEYS, bulk) == (0, 2, 0, 2)
+        assert item('ITEM-1').units_in_stock == 3
+        sync([record('ITEM-3')], bulk)
+
+        assert sync(REPEATED_KEYS, bulk) == (1, 0, 2, 1)
+        assert (item('ITEM-1').units_in_stock, item('ITEM-3').units_in_stock) == (3, 2)
+
+
+def test_bulk_and_row_by_row_counts_match(app):
+    updates = [record(f"ITEM-{number % 4}", units_in_stock=number) for number in range(10)] \
+        + [{'code': 'ITEM-1', 'price_per_unit': 30.0}, {'code': 'ITEM-9', 'units_in_stock': 1}, {}]
+    counts = {}
+    with app.app_context():
+        for bulk in (True, False):
+            db.session.query(SalesItem).delete()
+            db.session.commit()
+            counts[bulk] = [sync(updates, bulk), sync(updates, bulk)]
+            db.session.commit()
+    assert counts[True] == counts[False]
+
+
+def test_repeated_keys_in_columns_are_counted_once(app):
+    columns = {'code': ['ITEM-1', 'ITEM-2', 'ITEM-1'], 'units_in_stock': [1, 2, 3]}
+    with app.app_context():
+        sync([record('ITEM-1'), record('ITEM-2', units_in_stock=2)], True)
+        assert sync(ColumnarData(columns), True) == (1, 0, 1, 0)
+        assert item('ITEM-1').units_in_stock == 3
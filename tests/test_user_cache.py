@@ -0,0 +1,31 @@
+# user cache: identities of logged-in users, without password hashes
+
+from app import db
+from app.models import User
+from app.utilities.user_cache import user_cache
+from tests.conftest import log_in
+
+
+def test_cached_user_has_no_password_hash(app, customer_id):
+    with app.app_context():
+        assert user_cache.load(customer_id).username == 'customer'
+        assert 'password_hash' not in user_cache.backend.get(customer_id)
+        cached_user = user_cache.load(customer_id)
+        assert cached_user.username == 'customer' and cached_user.is_customer()
+        assert 'password_hash' not in vars(cached_user)
+
+
+def test_password_change_of_cached_user(app, client, customer_id):
+    log_in(client)
+    client.get('/')     # the logged-in user is served from the cache from now on
+    data = {'old_password': 'customer-password', 'new_password': 'new-password-1',
+            'new_password2': 'new-password-1'}
+    assert client.post('/users/change_password', data=data).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, customer_id).check_password('new-password-1')
+
+    # a wrong current password is rejected, not compared with a missing hash
+    data['old_password'] = 'wrong-password'
+    assert client.post('/users/change_password', data=data).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, customer_id).check_password('new-password-1')